@@ -0,0 +1,240 @@
+"""Live conversation analytics from the unmixed agent and customer channels.
+
+Each channel's PCM is viewed with ``np.frombuffer`` (no copy) as fixed
+analysis frames and classified as speech or not in one vectorized pass: RMS
+level against an adaptive noise floor, with a hangover that bridges short
+gaps between words. Per-frame decisions land in a small ring of time slots per
+channel; a slot is finalized once both channels have reached it (or one runs
+too far ahead, in which case the silent channel counts as not talking), and
+finalized slots update:
+
+- talk time per speaker and talk ratio (agent share of talk time);
+- overtalk (both talking) and interruptions (a speaker starts while the
+  other is already talking);
+- dead air (neither talking), dead-air events longer than ``dead_air_ms``
+  and the longest silence;
+- speaking rate, from recognized words per minute of talk time.
+
+Totals cover the whole call and ``window`` the last completed fixed window.
+Memory per call is constant: the ring, a partial-frame remainder per channel
+and a handful of counters.
+"""
+import copy
+import time
+
+import numpy as np
+
+from metrics import ANALYTICS_FRAMES, ANALYTICS_LATENCY
+from vad import frame_levels_db, pcm16_frames
+
+SPEAKERS = ("agent", "customer")
+
+
+class _Channel:
+    def __init__(self, sample_rate, frame_ms, ring_slots, threshold_db, noise_margin_db, hangover_frames):
+        self.frame_samples = max(int(sample_rate * frame_ms / 1000), 1)
+        self.frame_bytes = self.frame_samples * 2
+        self.ring = np.zeros(ring_slots, dtype=bool)
+        self.next_slot = 0
+        self.remainder = b""
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.noise_floor_db = -90.0
+        self.noise_rise_db = 3.0 * frame_ms / 1000
+        self.hangover_frames = hangover_frames
+        self.frames_since_speech = hangover_frames + 1
+
+    def classify(self, chunk):
+        """Speech mask for the whole frames in chunk; a partial frame waits for the next chunk."""
+        data = self.remainder + chunk if self.remainder else chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self.remainder = data[usable:]
+        if not usable:
+            return np.zeros(0, dtype=bool)
+        levels = frame_levels_db(pcm16_frames(memoryview(data)[:usable], self.frame_samples))
+        threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+        self.noise_floor_db = min(float(levels.min()), self.noise_floor_db + self.noise_rise_db * len(levels))
+        speech = levels > threshold
+        # Hangover: a frame counts as talking if speech was seen within hangover_frames before it
+        index = np.arange(len(speech))
+        last_speech = np.maximum.accumulate(np.where(speech, index, -1 - self.frames_since_speech))
+        talking = index - last_speech <= self.hangover_frames
+        self.frames_since_speech = int(len(speech) - 1 - last_speech[-1])
+        return talking
+
+
+class CallAnalytics:
+    def __init__(self, call_id, frame_ms=20, window_seconds=10, dead_air_ms=3000, threshold_db=-45.0,
+                 noise_margin_db=10.0, hangover_ms=200, ring_seconds=4, batch_ms=200):
+        self.call_id = call_id
+        self.frame_ms = frame_ms
+        self.frame_seconds = frame_ms / 1000
+        self.window_slots = max(int(window_seconds * 1000 / frame_ms), 1)
+        self.dead_air_slots = max(int(dead_air_ms / frame_ms), 1)
+        self.ring_slots = max(int(ring_seconds * 1000 / frame_ms), 8)
+        # Slots are accounted in batches; per-call numpy overhead dominates single 20 ms frames
+        self.batch_slots = min(max(int(batch_ms / frame_ms), 1), self.ring_slots // 4)
+        self._channel_options = (threshold_db, noise_margin_db, max(int(hangover_ms / frame_ms), 0))
+        self.channels = {}
+        self.finalized = 0
+        self._prev = np.zeros(2, dtype=bool)  # agent, customer activity in the last finalized slot
+        self._silence_run = 0
+        self.words = dict.fromkeys(SPEAKERS, 0)
+        self.totals = self._new_counters()
+        self.current = self._new_counters()
+        self.window = None
+        self.frames_processed = 0
+
+    @staticmethod
+    def _new_counters():
+        return {"slots": 0, "agent": 0, "customer": 0, "overtalk": 0, "deadAir": 0,
+                "interruptions": dict.fromkeys(SPEAKERS, 0), "deadAirEvents": 0, "longestDeadAir": 0}
+
+    def set_sample_rate(self, speaker, sample_rate):
+        previous = self.channels.get(speaker)
+        if previous is None or previous.frame_samples != int(sample_rate * self.frame_ms / 1000):
+            channel = _Channel(sample_rate, self.frame_ms, self.ring_slots, *self._channel_options)
+            # A channel that joins late starts at the current position, not at the start of the call
+            channel.next_slot = previous.next_slot if previous else self.finalized
+            self.channels[speaker] = channel
+
+    def process(self, speaker, chunk, sample_rate=24000):
+        """Feed 16-bit PCM for one speaker."""
+        started = time.perf_counter()
+        if speaker not in self.channels:
+            self.set_sample_rate(speaker, sample_rate)
+        channel = self.channels[speaker]
+        talking = channel.classify(chunk)
+        if not len(talking):
+            return
+        self.frames_processed += len(talking)
+        ANALYTICS_FRAMES.labels(speaker).inc(len(talking))
+        # Never overwrite slots the other channel hasn't caught up on yet
+        self._finalize(force_before=channel.next_slot + len(talking) - self.ring_slots)
+        slots = np.arange(channel.next_slot, channel.next_slot + len(talking)) % self.ring_slots
+        channel.ring[slots] = talking
+        channel.next_slot += len(talking)
+        self._finalize()
+        ANALYTICS_LATENCY.observe(time.perf_counter() - started)
+
+    def add_words(self, speaker, count):
+        self.words[speaker] = self.words.get(speaker, 0) + count
+
+    def export(self):
+        """Counters as plain data for a checkpoint; buffered slots are accounted first."""
+        if self.channels:
+            self._finalize(flush=True)
+        return copy.deepcopy({"totals": self.totals, "current": self.current, "window": self.window,
+                              "words": self.words})
+
+    def restore(self, state):
+        """Carry on from exported counters, e.g. for a call moved from a draining pod."""
+        self.totals = state["totals"]
+        self.current = state["current"]
+        self.window = state["window"]
+        self.words = dict(self.words, **state["words"])
+
+    def _finalize(self, force_before=None, flush=False):
+        known = [channel.next_slot for channel in self.channels.values()]
+        ready = min(known)
+        ahead = max(known)
+        # A channel that stalls (e.g. the agent browser is not streaming) counts as silent
+        if force_before is not None:
+            ready = max(ready, min(force_before, ahead))
+        elif ahead - ready > self.ring_slots // 2:
+            ready = ahead - self.ring_slots // 2
+        elif ready - self.finalized < self.batch_slots and not flush:
+            return
+        while self.finalized < ready:
+            end = min(ready, self.finalized + self.window_slots - self.current["slots"])
+            self._account(self.finalized, end)
+            self.finalized = end
+            if self.current["slots"] >= self.window_slots:
+                self.window = self.current
+                self.current = self._new_counters()
+
+    def _activity(self, speaker, start, end):
+        channel = self.channels.get(speaker)
+        activity = np.zeros(end - start, dtype=bool)
+        if channel is None:
+            return activity
+        available = min(end, channel.next_slot) - start
+        if available > 0:
+            activity[:available] = channel.ring[np.arange(start, start + available) % self.ring_slots]
+        if channel.next_slot < end:
+            # Fill the slots it skipped so its ring stays aligned with the other channel
+            channel.ring[np.arange(max(channel.next_slot, start), end) % self.ring_slots] = False
+            channel.next_slot = end
+        return activity
+
+    def _account(self, start, end):
+        agent = self._activity("agent", start, end)
+        customer = self._activity("customer", start, end)
+        prev_agent = np.concatenate(([self._prev[0]], agent[:-1]))
+        prev_customer = np.concatenate(([self._prev[1]], customer[:-1]))
+        both = agent & customer
+        silent = ~(agent | customer)
+        # An interruption: a speaker starts while the other was already talking
+        agent_interrupts = int(np.count_nonzero(agent & ~prev_agent & prev_customer & customer))
+        customer_interrupts = int(np.count_nonzero(customer & ~prev_customer & prev_agent & agent))
+
+        # Dead-air runs; a run still open at the end carries over to the next slots
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], silent, [False])).astype(np.int8)))
+        starts, ends = edges[::2], edges[1::2]
+        lengths = ends - starts
+        closed = []
+        if len(starts) and starts[0] == 0:
+            lengths[0] += self._silence_run
+        elif self._silence_run:
+            closed.append(self._silence_run)  # the carried run ended with the previous slots
+        open_run = 0
+        if len(ends) and ends[-1] == len(silent):
+            open_run, lengths = int(lengths[-1]), lengths[:-1]
+        closed = np.concatenate((closed, lengths))
+        events = int(np.count_nonzero(closed >= self.dead_air_slots))
+        longest = int(max(closed.max(initial=0), open_run))
+        self._silence_run = open_run
+
+        agent_talk, customer_talk = int(np.count_nonzero(agent)), int(np.count_nonzero(customer))
+        overtalk, dead_air = int(np.count_nonzero(both)), int(np.count_nonzero(silent))
+        for counters in (self.totals, self.current):
+            counters["slots"] += end - start
+            counters["agent"] += agent_talk
+            counters["customer"] += customer_talk
+            counters["overtalk"] += overtalk
+            counters["deadAir"] += dead_air
+            counters["interruptions"]["agent"] += agent_interrupts
+            counters["interruptions"]["customer"] += customer_interrupts
+            counters["deadAirEvents"] += events
+            counters["longestDeadAir"] = max(counters["longestDeadAir"], longest)
+        self._prev = np.array([agent[-1], customer[-1]])
+
+    def _summarize(self, counters):
+        seconds = lambda slots: round(slots * self.frame_seconds, 2)
+        talk = counters["agent"] + counters["customer"]
+        return {
+            "seconds": seconds(counters["slots"]),
+            "agentTalkSec": seconds(counters["agent"]),
+            "customerTalkSec": seconds(counters["customer"]),
+            "talkRatio": round(counters["agent"] / talk, 3) if talk else None,
+            "overtalkSec": seconds(counters["overtalk"]),
+            "interruptions": dict(counters["interruptions"]),
+            "deadAirSec": seconds(counters["deadAir"]),
+            "deadAirEvents": counters["deadAirEvents"],
+            "longestDeadAirSec": seconds(counters["longestDeadAir"]),
+        }
+
+    def snapshot(self):
+        if self.channels:
+            self._finalize(flush=True)
+        totals = self._summarize(self.totals)
+        rate = {}
+        for speaker in SPEAKERS:
+            minutes = totals[f"{speaker}TalkSec"] / 60
+            rate[f"{speaker}Wpm"] = round(self.words[speaker] / minutes, 1) if minutes > 0 else None
+        return {
+            "callId": self.call_id,
+            "total": totals,
+            "window": self._summarize(self.window) if self.window else None,
+            "speakingRate": rate,
+        }
@@ -38,9 +38,15 @@ API Endpoints:
 - WebSocket /ws/agent/{client_id}: Agent UI connection endpoint
 - WebSocket /ws/audio/{call_id}: Audio streaming endpoint
 - POST /api/sentiment: Analyzes text sentiment
+- GET /api/calls/{call_id}/stats: Per-call audio pipeline statistics
+- GET /api/calls/{call_id}/summary: Post-call summary, disposition and sentiment arc
+- GET /metrics: Prometheus-style operational metrics
+- GET /healthz, GET /readyz: Liveness and readiness probes
+- POST /api/drain, GET /api/drain: Start a graceful drain and report its progress
 Author: [Your Name]
 Version: 1.0"""
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Response
+from __future__ import annotations
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Response, Query, Header
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
@@ -50,46 +56,89 @@ import asyncio
 import json
 import os
 import base64
+import hmac
 import threading
-from queue import Queue
+import functools
 from urllib.parse import urljoin, urlencode
-import numpy as np
+from contextlib import asynccontextmanager
 import wave
-import struct
 from io import BytesIO
 from dotenv import load_dotenv
 import time
 load_dotenv()
-from openai import AzureOpenAI, OpenAI
-import numpy as np
-from scipy import signal
-from azure.ai.textanalytics import TextAnalyticsClient
-from azure.core.credentials import AzureKeyCredential
-
-with open("system_prompt.txt", "r") as f:
-    system_prompt = f.read()
+
+# Heavy SDKs (numpy, the Speech SDK, Azure and OpenAI clients) are imported on
+# first use or by initialize_services() after the server is already listening.
+# See benchmarks/bench_startup.py for the import-time budget.
 tools = []
-from azure.communication.callautomation import (
-    MediaStreamingOptions,
-    AudioFormat,
-    MediaStreamingTransportType,
-    MediaStreamingContentType,
-    MediaStreamingAudioChannelType,
+
+from metrics import (
+    REGISTRY as metrics_registry,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    ACTIVE_CALLS,
+    ACTIVE_SOCKETS,
+    AUDIO_FRAMES,
+    AUDIO_BYTES,
+    RECOGNIZER_EVENTS,
+    MESSAGE_QUEUE_DEPTH,
+    DRAINING,
+    MESSAGE_QUEUE_DWELL,
+    WS_SEND_LATENCY,
+    WS_SEND_FAILURES,
+    SENTIMENT_CALLS,
 )
-from azure.communication.callautomation.aio import CallAutomationClient
-from azure.communication.callautomation import PhoneNumberIdentifier
+from jitter import JitterBuffer, parse_media_timestamp
+from ingest import IngestPipeline, AdmissionController, LoopLagMonitor, TranscriptQueue
+from interim import InterimStreamer
+from prefetch import ToolPrefetcher
+from scheduler import LLMScheduler, prompt_key
+from prompts import PromptBuilder
+from events import CallbackDispatcher, AsyncTTLCache
+from drain import DrainController
 
-# Azure Speech imports
-import azure.cognitiveservices.speech as speechsdk
+# Configure logging: queue-based, sampled per category, optionally JSON and redacted
+from logconfig import configure_logging, shutdown_logging
+configure_logging()
+transcript_logger = logging.getLogger("transcript")
+interim_logger = logging.getLogger("transcript.interim")
+llm_logger = logging.getLogger("llm")
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_session_checkpoints()
+    message_thread = threading.Thread(target=asyncio.run, args=(process_message_queue(),), daemon=True)
+    message_thread.start()
+    background_tasks = [
+        asyncio.create_task(loop_lag_monitor.run()),
+        asyncio.create_task(manager.interim.run()),
+        asyncio.create_task(initialize_services()),
+    ]
+    if WRAPUP_ENABLED:
+        await start_wrapup_worker()
+    yield
+    # Without a drain beforehand, still checkpoint live calls and flush pending messages
+    if not drain_controller.draining:
+        start_drain("shutdown", deadline=DRAIN_SHUTDOWN_SECONDS)
+    try:
+        await asyncio.wait_for(drain_controller.wait(), timeout=DRAIN_SHUTDOWN_SECONDS)
+    except asyncio.TimeoutError:
+        logging.warning(f"Drain still running after {DRAIN_SHUTDOWN_SECONDS}s at shutdown: {drain_controller.progress()}")
+    for task in background_tasks:
+        task.cancel()
+    await callback_dispatcher.stop()
+    if wrapup_worker is not None:
+        await wrapup_worker.stop()
+        wrapup_queue.close()
+    if acs_client is not None:
+        await acs_client.close()
+    if session_checkpoints is not None:
+        session_checkpoints.close()
+    manager.prefetcher.shutdown()
+    shutdown_logging()
 
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -105,15 +154,106 @@ ACS_CONNECTION_STRING = os.getenv("ACS_CONNECTION_STRING")
 SPEECH_KEY = os.getenv("SPEECH_KEY")
 SPEECH_REGION = os.getenv("SPEECH_REGION")
 WEBSOCKET_URL = os.getenv("WEBSOCKET_URL")
+SYSTEM_PROMPT_PATH = os.getenv("SYSTEM_PROMPT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt"))
+
+# Voice activity detection in front of the recognizer push streams
+VAD_MODE = os.getenv("VAD_MODE", "compress")
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "400"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))
+
+# Jitter buffer for inbound ACS media frames
+JITTER_TARGET_MS = int(os.getenv("JITTER_TARGET_MS", "60"))
+JITTER_MAX_DELAY_MS = int(os.getenv("JITTER_MAX_DELAY_MS", "400"))
+JITTER_LATE_POLICY = os.getenv("JITTER_LATE_POLICY", "drop")
+JITTER_GAP_POLICY = os.getenv("JITTER_GAP_POLICY", "silence")
+JITTER_TICK_MS = int(os.getenv("JITTER_TICK_MS", "20"))
+
+# Ingest budgets and admission control
+INGEST_RECOGNIZER_QUEUE_SIZE = int(os.getenv("INGEST_RECOGNIZER_QUEUE_SIZE", "200"))
+INGEST_FANOUT_QUEUE_SIZE = int(os.getenv("INGEST_FANOUT_QUEUE_SIZE", "100"))
+TRANSCRIPT_QUEUE_SIZE = int(os.getenv("TRANSCRIPT_QUEUE_SIZE", "1000"))
+MAX_ACTIVE_CALLS = int(os.getenv("MAX_ACTIVE_CALLS", "50"))
+MAX_EVENT_LOOP_LAG_MS = int(os.getenv("MAX_EVENT_LOOP_LAG_MS", "250"))
+MAX_CONSECUTIVE_AUDIO_ERRORS = int(os.getenv("MAX_CONSECUTIVE_AUDIO_ERRORS", "20"))
+
+# Interim (partial) transcripts streamed to agents, per speaker
+INTERIM_RATE_HZ = float(os.getenv("INTERIM_RATE_HZ", "4"))
+INTERIM_SEND_TIMEOUT_MS = int(os.getenv("INTERIM_SEND_TIMEOUT_MS", "1000"))
+
+# Speculative prefetch of read-only tools from identifiers heard in the call
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1").lower() in ("1", "true", "yes")
+PREFETCH_TTL_SECONDS = int(os.getenv("PREFETCH_TTL_SECONDS", "300"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
 
-# Initialize Azure Communication Services client
-acs_client = CallAutomationClient.from_connection_string(ACS_CONNECTION_STRING)
+# Azure OpenAI budgets shared by all completions (see scheduler.py)
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "60000"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "300"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_BACKGROUND_RESERVE = float(os.getenv("LLM_BACKGROUND_RESERVE", "0.2"))
+# Transcript turns kept in a recommendation prompt before the oldest half is dropped
+PROMPT_MAX_TURNS = int(os.getenv("PROMPT_MAX_TURNS", "200"))
+
+# Post-call wrap-up jobs (summary, disposition, sentiment arc), see wrapup.py
+WRAPUP_ENABLED = os.getenv("WRAPUP_ENABLED", "1").lower() in ("1", "true", "yes")
+WRAPUP_DB_PATH = os.getenv("WRAPUP_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "wrapup.db"))
+WRAPUP_CONCURRENCY = int(os.getenv("WRAPUP_CONCURRENCY", "1"))
+WRAPUP_MAX_ATTEMPTS = int(os.getenv("WRAPUP_MAX_ATTEMPTS", "5"))
+# Wrap-up steps wait while the event loop lags more than this
+WRAPUP_MAX_LOOP_LAG_MS = int(os.getenv("WRAPUP_MAX_LOOP_LAG_MS", "50"))
+
+# ACS callback processing: acknowledged at once, handled per call in order (see events.py)
+CALLBACK_DEDUPE_SIZE = int(os.getenv("CALLBACK_DEDUPE_SIZE", "10000"))
+CALLBACK_IDLE_SECONDS = float(os.getenv("CALLBACK_IDLE_SECONDS", "30"))
+ACS_PROPERTIES_CACHE_SECONDS = float(os.getenv("ACS_PROPERTIES_CACHE_SECONDS", "30"))
+# A UI socket slower than this is skipped for the message rather than holding up the others
+BROADCAST_SEND_TIMEOUT_MS = int(os.getenv("BROADCAST_SEND_TIMEOUT_MS", "1000"))
+
+# Graceful drain for rolling deployments (see drain.py)
+DRAIN_DEADLINE_SECONDS = float(os.getenv("DRAIN_DEADLINE_SECONDS", "300"))
+DRAIN_CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("DRAIN_CHECKPOINT_INTERVAL_SECONDS", "10"))
+# Time allowed to checkpoint and flush when the process stops without a drain first
+DRAIN_SHUTDOWN_SECONDS = float(os.getenv("DRAIN_SHUTDOWN_SECONDS", "10"))
+# Bearer token for POST /api/drain; unset disables the endpoint (shutdown still drains)
+DRAIN_TOKEN = os.getenv("DRAIN_TOKEN", "")
+SESSION_CHECKPOINT_DB_PATH = os.getenv("SESSION_CHECKPOINT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db"))
+
+# Live conversation analytics from the unmixed channels (see analytics.py)
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1").lower() in ("1", "true", "yes")
+ANALYTICS_SNAPSHOT_MS = int(os.getenv("ANALYTICS_SNAPSHOT_MS", "2000"))
+ANALYTICS_WINDOW_SECONDS = int(os.getenv("ANALYTICS_WINDOW_SECONDS", "30"))
+ANALYTICS_DEAD_AIR_MS = int(os.getenv("ANALYTICS_DEAD_AIR_MS", "3000"))
+ANALYTICS_THRESHOLD_DB = float(os.getenv("ANALYTICS_THRESHOLD_DB", "-45"))
+
+# Upstream encodings accepted from the agent microphone, in order of preference
+AGENT_AUDIO_ENCODINGS = [e.strip() for e in os.getenv("AGENT_AUDIO_ENCODINGS", "mulaw,alaw,adpcm,pcm16").split(",") if e.strip()]
+
+# Service clients are built by initialize_services() during startup
+acs_client = None
+text_analytics_client = None
+system_prompt = None
+started_at = time.time()
+# Components that must be ready before the pod takes traffic
+REQUIRED_SERVICES = ("system_prompt", "acs", "chat", "speech")
+service_status = {name: "pending" for name in REQUIRED_SERVICES + ("text_analytics", "audio_dsp", "knowledge")}
 
 # Store active connections and call data
 call_connection_id = None
-message_queue = Queue()
+message_queue = TranscriptQueue(maxsize=TRANSCRIPT_QUEUE_SIZE)
+MESSAGE_QUEUE_DEPTH.set_function(message_queue.qsize)
+loop_lag_monitor = LoopLagMonitor()
+admission = AdmissionController(max_calls=MAX_ACTIVE_CALLS, max_loop_lag_ms=MAX_EVENT_LOOP_LAG_MS, lag_monitor=loop_lag_monitor)
+ACTIVE_CALLS.set_function(lambda: len(admission.calls))
+llm_scheduler = LLMScheduler(
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    background_reserve=LLM_BACKGROUND_RESERVE,
+)
+prompt_builder = PromptBuilder(max_turns=PROMPT_MAX_TURNS)  # system prompt set by initialize_services()
+wrapup_queue = None
+wrapup_worker = None
 transcription_results = {}
-from oai import ChatClient
 # Enhanced WebSocket connections manager
 class ConnectionManager:
     def __init__(self):
@@ -125,19 +265,43 @@ class ConnectionManager:
         self.customer_audio_streams = {}
         self.agent_recognizers = {}
         self.customer_recognizers = {}
-        self.chat_client = ChatClient(language = "en-IN",out_queue =  None, tools=tools)
+        self.agent_vads = {}
+        self.customer_vads = {}
+        self.customer_jitter_buffers = {}
+        self.ingest_pipelines = {}
+        self.interim = InterimStreamer(self.send_interim, rate_hz=INTERIM_RATE_HZ,
+                                       send_timeout=INTERIM_SEND_TIMEOUT_MS / 1000)
+        self.prefetcher = ToolPrefetcher(ttl=PREFETCH_TTL_SECONDS, workers=PREFETCH_WORKERS)
+        self.call_analytics = {}
+        self.analytics_tasks = {}
+        self.restored_agents = {}  # client_id -> (call_id, transcript, prompt state) until the agent connects
+        self.chat_client = None  # built by initialize_services()
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
         if not client_id.startswith("audio_"):
             self.transcriptions[client_id] = []
+            if client_id in self.restored_agents:
+                _, transcript, prompt_state = self.restored_agents.pop(client_id)
+                self.restore_agent_state(client_id, transcript, prompt_state)
+
+    def restore_agent_state(self, client_id, transcript, prompt_state, call_id=None):
+        """Reinstate an agent's transcript and prompt turns checkpointed by another pod."""
+        if self.transcriptions.get(client_id):
+            return  # the agent already has history on this pod
+        if client_id not in self.active_connections:
+            self.restored_agents[client_id] = (call_id, transcript, prompt_state)
+            return
+        self.transcriptions[client_id] = transcript
+        prompt_builder.restore(client_id, prompt_state, transcript)
 
     def disconnect(self, client_id: str):
         if client_id in self.active_connections:
             del self.active_connections[client_id]
         if client_id in self.transcriptions:
             del self.transcriptions[client_id]
+            prompt_builder.discard(client_id)
         if client_id.startswith("audio_") and client_id[6:] in self.speech_recognizers:
             call_id = client_id[6:]
             if self.speech_recognizers.get(call_id):
@@ -147,15 +311,36 @@ class ConnectionManager:
                 del self.audio_streams[call_id]
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections.values():
+        """Send a message to every connection concurrently; a slow socket only delays itself."""
+        async def send(connection):
+            started = time.perf_counter()
             try:
-                await connection.send_text(message)
+                await asyncio.wait_for(connection.send_text(message), timeout=BROADCAST_SEND_TIMEOUT_MS / 1000)
+                WS_SEND_LATENCY.labels("broadcast").observe(time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                WS_SEND_FAILURES.labels("broadcast", "timeout").inc()
+                logging.debug(f"Timed out broadcasting message after {BROADCAST_SEND_TIMEOUT_MS} ms")
             except WebSocketDisconnect:
+                WS_SEND_FAILURES.labels("broadcast", "disconnected").inc()
                 logging.info("Client disconnected")
             except Exception as e:
-                #logging.error(traceback.format_exc())
-                #logging.error(f"Error broadcasting message: {str(e)} message: {message}")
-                pass
+                WS_SEND_FAILURES.labels("broadcast", type(e).__name__).inc()
+                logging.debug(f"Error broadcasting message: {str(e)}")
+        await asyncio.gather(*(send(connection) for connection in list(self.active_connections.values())))
+
+    async def send_to_agents(self, message: str, path: str):
+        """Send a message to every agent connection concurrently."""
+        async def send(connection):
+            started = time.perf_counter()
+            try:
+                await connection.send_text(message)
+                WS_SEND_LATENCY.labels(path).observe(time.perf_counter() - started)
+            except Exception as e:
+                WS_SEND_FAILURES.labels(path, type(e).__name__).inc()
+        await asyncio.gather(*(send(connection) for connection in self.get_connections_for_broadcast()))
+
+    async def send_interim(self, message: str):
+        await self.send_to_agents(message, "interim")
 
     async def send_personal_message(self, message: str, client_id: str):
         if client_id in self.active_connections:
@@ -178,7 +363,8 @@ class ConnectionManager:
                 self.transcriptions[client_id].append({
                     "text": transcription,
                     "speaker": speaker,
-                    "timestamp": int(time.time() * 1000)
+                    "timestamp": int(time.time() * 1000),
+                    "callId": call_id
                 })
 
     def get_transcriptions(self, client_id: str):
@@ -189,6 +375,7 @@ class ConnectionManager:
                 if not client_id.startswith("audio_")]
 
     def setup_speech_recognizer(self, call_id, samples_per_second=16000, bits_per_sample=16, channels=1):
+        import azure.cognitiveservices.speech as speechsdk
         speech_config = speechsdk.SpeechConfig(subscription=SPEECH_KEY, region=SPEECH_REGION)
         stream_format = speechsdk.audio.AudioStreamFormat(
             samples_per_second=samples_per_second,
@@ -211,7 +398,9 @@ class ConnectionManager:
         
         return speech_recognizer, audio_input_stream
 
-    def setup_dual_speech_recognizers(self, call_id, samples_per_second=16000, bits_per_sample=16, channels=1):
+    def setup_dual_speech_recognizers(self, call_id, samples_per_second=16000, bits_per_sample=16, channels=1,
+                                      vad_sample_rate=24000):
+        import azure.cognitiveservices.speech as speechsdk
         # Create agent recognizer
         agent_speech_config = speechsdk.SpeechConfig(subscription=SPEECH_KEY, region=SPEECH_REGION)
         agent_stream_format = speechsdk.audio.AudioStreamFormat(
@@ -254,6 +443,9 @@ class ConnectionManager:
         self.customer_recognizers[call_id] = customer_recognizer
         self.agent_audio_streams[call_id] = agent_input_stream
         self.customer_audio_streams[call_id] = customer_input_stream
+        # The VADs see the socket audio, not the recognizer format; set_vad_sample_rate corrects the rate
+        self.agent_vads[call_id] = self.create_vad(vad_sample_rate)
+        self.customer_vads[call_id] = self.create_vad(vad_sample_rate)
         
         # Start continuous recognition for both
         agent_recognizer.start_continuous_recognition()
@@ -261,18 +453,168 @@ class ConnectionManager:
         
         return (agent_recognizer, agent_input_stream), (customer_recognizer, customer_input_stream)
 
+    def create_vad(self, sample_rate):
+        from vad import VoiceActivityDetector
+        return VoiceActivityDetector(
+            sample_rate=sample_rate,
+            mode=VAD_MODE,
+            threshold_db=VAD_THRESHOLD_DB,
+            hangover_ms=VAD_HANGOVER_MS,
+            preroll_ms=VAD_PREROLL_MS,
+        )
+
+    def set_vad_sample_rate(self, call_id, speaker, sample_rate):
+        """Rebuild a speaker's VAD when AudioMetadata announces a different rate."""
+        vads = self.agent_vads if speaker == "agent" else self.customer_vads
+        vad = vads.get(call_id)
+        if vad is not None and vad.sample_rate != sample_rate:
+            vads[call_id] = self.create_vad(sample_rate)
+
+    def create_jitter_buffer(self, call_id, sample_rate):
+        jitter_buffer = JitterBuffer(
+            sample_rate=sample_rate,
+            target_delay_ms=JITTER_TARGET_MS,
+            max_delay_ms=JITTER_MAX_DELAY_MS,
+            late_policy=JITTER_LATE_POLICY,
+            gap_policy=JITTER_GAP_POLICY,
+        )
+        self.customer_jitter_buffers[call_id] = jitter_buffer
+        return jitter_buffer
+
+    def create_ingest_pipeline(self, call_id):
+        pipeline = IngestPipeline(
+            call_id,
+            self.broadcast,
+            recognizer_queue_size=INGEST_RECOGNIZER_QUEUE_SIZE,
+            fanout_queue_size=INGEST_FANOUT_QUEUE_SIZE,
+        )
+        # The agent browser and ACS each open a socket for the same call
+        self.ingest_pipelines.setdefault(call_id, []).append(pipeline)
+        pipeline.start()
+        return pipeline
+
+    async def remove_ingest_pipeline(self, call_id, pipeline):
+        """Stop a socket's pipeline (None if its setup failed) and clean up after the call's last one."""
+        if pipeline is not None:
+            await pipeline.stop()
+        pipelines = self.ingest_pipelines.get(call_id, [])
+        if pipeline in pipelines:
+            pipelines.remove(pipeline)
+        if not pipelines:
+            self.ingest_pipelines.pop(call_id, None)
+            self.interim.discard_call(call_id)
+            self.prefetcher.discard_call(call_id)
+            for speaker, vads in (("agent", self.agent_vads), ("customer", self.customer_vads)):
+                vad = vads.pop(call_id, None)
+                if vad is not None:
+                    logging.info(f"VAD for call {call_id} ({speaker}): {json.dumps(vad.stats())}")
+            self.customer_jitter_buffers.pop(call_id, None)
+            self.stop_call_analytics(call_id)
+            for client_id, restored in list(self.restored_agents.items()):
+                if restored[0] == call_id:
+                    del self.restored_agents[client_id]
+
+    def allows_interim(self, call_id):
+        if not message_queue.allows_interim():
+            return False
+        return all(pipeline.allows_interim() for pipeline in self.ingest_pipelines.get(call_id, []))
+
+    def start_call_analytics(self, call_id):
+        # The agent browser and ACS sockets share one engine per call
+        if call_id in self.call_analytics:
+            return self.call_analytics[call_id]
+        from analytics import CallAnalytics
+        analytics = CallAnalytics(
+            call_id,
+            window_seconds=ANALYTICS_WINDOW_SECONDS,
+            dead_air_ms=ANALYTICS_DEAD_AIR_MS,
+            threshold_db=ANALYTICS_THRESHOLD_DB,
+        )
+        self.call_analytics[call_id] = analytics
+        self.analytics_tasks[call_id] = asyncio.create_task(self.publish_analytics(call_id))
+        return analytics
+
+    async def publish_analytics(self, call_id):
+        """Push the call's analytics snapshot to agent connections at a fixed interval."""
+        while True:
+            await asyncio.sleep(ANALYTICS_SNAPSHOT_MS / 1000)
+            analytics = self.call_analytics.get(call_id)
+            if analytics is None:
+                return
+            message = dict(analytics.snapshot(), type="callAnalytics")
+            await self.send_to_agents(json.dumps(message), "analytics")
+
+    def stop_call_analytics(self, call_id):
+        task = self.analytics_tasks.pop(call_id, None)
+        if task:
+            task.cancel()
+        analytics = self.call_analytics.pop(call_id, None)
+        if analytics is not None:
+            logging.info(f"Conversation analytics for call {call_id}: {json.dumps(analytics.snapshot()['total'])}")
+
+    def buffer_customer_audio(self, call_id, jitter_buffer, media_ts, chunk, silent, arrival):
+        for frame in jitter_buffer.push(media_ts, chunk, silent=silent, arrival=arrival):
+            self.write_audio(call_id, "customer", frame)
+
+    async def run_playout(self, call_id, jitter_buffer):
+        """Release jitter-buffered customer audio to the recognizer at a steady cadence."""
+        interval = JITTER_TICK_MS / 1000
+        next_tick = time.monotonic()
+        try:
+            while True:
+                for frame in jitter_buffer.pop_due(time.monotonic()):
+                    self.write_audio(call_id, "customer", frame)
+                next_tick += interval
+                await asyncio.sleep(max(next_tick - time.monotonic(), 0))
+        finally:
+            for frame in jitter_buffer.flush():
+                self.write_audio(call_id, "customer", frame)
+
+    def write_audio(self, call_id, speaker, chunk):
+        """Pass a PCM chunk through the speaker's VAD and push what remains to the recognizer."""
+        if speaker == "agent":
+            vad, stream = self.agent_vads.get(call_id), self.agent_audio_streams[call_id]
+        else:
+            vad, stream = self.customer_vads.get(call_id), self.customer_audio_streams[call_id]
+        # Analytics need the silences too, so they see the chunk before the VAD
+        analytics = self.call_analytics.get(call_id)
+        if analytics is not None:
+            analytics.process(speaker, chunk)
+        if vad is not None:
+            chunk = vad.process(chunk)
+        if chunk:
+            AUDIO_BYTES.labels(speaker, "recognizer").inc(len(chunk))
+            stream.write(chunk)
+
+    def get_call_stats(self, call_id):
+        vad_stats = {}
+        if call_id in self.agent_vads:
+            vad_stats["agent"] = self.agent_vads[call_id].stats()
+        if call_id in self.customer_vads:
+            vad_stats["customer"] = self.customer_vads[call_id].stats()
+        stats = {"callId": call_id, "vad": vad_stats}
+        if call_id in self.customer_jitter_buffers:
+            stats["jitter"] = self.customer_jitter_buffers[call_id].stats()
+        if call_id in self.ingest_pipelines:
+            stats["ingest"] = [pipeline.stats() for pipeline in self.ingest_pipelines[call_id]]
+        if call_id in self.call_analytics:
+            stats["analytics"] = self.call_analytics[call_id].snapshot()
+        stats["prefetch"] = self.prefetcher.stats(call_id)
+        stats["llm"] = llm_scheduler.stats()
+        return stats
+
     def on_recognizing(self, args: speechsdk.SpeechRecognitionEventArgs, call_id):
-        logging.info(f"Recognizing for call {call_id}: {args.result.text}")
+        interim_logger.info("Recognizing", extra={"call_id": call_id, "transcript": args.result.text})
 
     def on_speech_started(self, args: speechsdk.SpeechRecognitionEventArgs, call_id):
-        logging.info(f"Speech started for call {call_id}: {args}")
+        transcript_logger.debug("Speech started", extra={"call_id": call_id})
 
     def on_recognized(self, args: speechsdk.SpeechRecognitionEventArgs, call_id):
         transcription = args.result.text
         if not transcription:
             return
             
-        logging.info(f"Recognized for call {call_id}: {transcription}")
+        transcript_logger.info("Recognized", extra={"call_id": call_id, "transcript": transcription})
         self.add_transcription(call_id, transcription)
         
         message = json.dumps({
@@ -280,30 +622,49 @@ class ConnectionManager:
             "callId": call_id,
             "text": transcription
         })
-        message_queue.put((message, self.get_connections_for_broadcast()))
+        message_queue.offer((message, self.get_connections_for_broadcast(), time.perf_counter()))
 
     def on_speech_started(self, args: speechsdk.SpeechRecognitionEventArgs, call_id, speaker):
-        logging.info(f"{speaker.capitalize()} speech started for call {call_id}")
+        RECOGNIZER_EVENTS.labels(speaker, "speech_started").inc()
+        transcript_logger.debug("Speech started", extra={"call_id": call_id, "speaker": speaker})
 
     def on_recognizing(self, args: speechsdk.SpeechRecognitionEventArgs, call_id, speaker):
-        logging.info(f"Recognizing {speaker} speech for call {call_id}: {args.result.text}")
+        RECOGNIZER_EVENTS.labels(speaker, "recognizing").inc()
+        if not self.allows_interim(call_id):
+            return
+        interim_logger.info("Recognizing", extra={"call_id": call_id, "speaker": speaker, "transcript": args.result.text})
+        self.interim.offer(call_id, speaker, args.result.text)
 
     def on_recognized(self, args: speechsdk.SpeechRecognitionEventArgs, call_id, speaker):
         transcription = args.result.text
+        # Close the segment even when empty so a stale partial is never sent for it
+        segment_id = self.interim.finalize(call_id, speaker)
         if not transcription:
+            RECOGNIZER_EVENTS.labels(speaker, "recognized_empty").inc()
             return
+        RECOGNIZER_EVENTS.labels(speaker, "recognized").inc()
             
-        logging.info(f"Recognized {speaker} speech for call {call_id}: {transcription}")
+        transcript_logger.info("Recognized", extra={"call_id": call_id, "speaker": speaker, "transcript": transcription})
         self.add_transcription(call_id, transcription, speaker)
+        analytics = self.call_analytics.get(call_id)
+        if analytics is not None:
+            analytics.add_words(speaker, len(transcription.split()))
         
         message = json.dumps({
             "type": "transcription",
             "callId": call_id,
             "text": transcription,
-            "speaker": speaker
+            "speaker": speaker,
+            "segmentId": segment_id
         })
-        logging.info(f"Adding message to queue: {message}")
-        message_queue.put((message, self.get_connections_for_broadcast()))
+        transcript_logger.debug("Queued transcription message", extra={"call_id": call_id, "speaker": speaker})
+        message_queue.offer((message, self.get_connections_for_broadcast(), time.perf_counter()))
+        # After the broadcast is queued; this runs on the Speech SDK's callback thread
+        if PREFETCH_ENABLED:
+            try:
+                self.prefetcher.observe(call_id, transcription)
+            except Exception as e:
+                logging.error(f"Prefetch failed for call {call_id}: {str(e)}")
 
 manager = ConnectionManager()
 
@@ -318,103 +679,208 @@ def pcm_to_wav(pcm_data, sample_rate=16000, channels=1):
         return wav_file.getvalue()
 
 def pcm_to_numpy(pcm_data, sample_width=2):
+    import numpy as np
     if not pcm_data:
         return np.array([])
     
     if sample_width == 2:
-        format_char = 'h'  # 16-bit signed short
+        dtype = '<i2'  # 16-bit signed short
     elif sample_width == 1:
-        format_char = 'b'  # 8-bit signed char
+        dtype = 'i1'  # 8-bit signed char
     else:
         raise ValueError(f"Unsupported sample width: {sample_width}")
     
-    num_samples = len(pcm_data) // sample_width
-    return np.array(struct.unpack(f"{num_samples}{format_char}", pcm_data))
+    # Zero-copy, read-only view over the incoming buffer
+    return np.frombuffer(pcm_data, dtype=dtype, count=len(pcm_data) // sample_width)
 
 # Callback endpoints
 @app.post('/api/callbacks/{context_id}')
 async def callbacks(request: Request, context_id: str):
     events = await request.json()
-    for event in events:
-        global call_connection_id
-        event_data = event['data']
-        call_connection_id = event_data.get("callConnectionId")
-        logging.info(f"Received Event: {event['type']}, Correlation Id: {event_data.get('correlationId')}, CallConnectionId: {call_connection_id}")
-        
-        if event['type'] == "Microsoft.Communication.CallConnected":
-            call_connection_properties = await acs_client.get_call_connection(call_connection_id).get_call_properties()
-            media_streaming_subscription = call_connection_properties.media_streaming_subscription
-            logging.info(f"MediaStreamingSubscription: {media_streaming_subscription}")
-            
-            await manager.broadcast(json.dumps({
-                "type": "callStatus",
-                "status": "connected",
-                "callId": call_connection_id
-            }))
-            
-        elif event['type'] == "Microsoft.Communication.MediaStreamingStarted":
-            logging.info(f"Media streaming started for content type: {event_data['mediaStreamingUpdate']['contentType']}")
-            
-            await manager.broadcast(json.dumps({
-                "type": "mediaStatus",
-                "status": "started",
-                "callId": call_connection_id
-            }))
-            
-        elif event['type'] == "Microsoft.Communication.MediaStreamingStopped":
-            logging.info(f"Media streaming stopped for content type: {event_data['mediaStreamingUpdate']['contentType']}")
-            
-            await manager.broadcast(json.dumps({
-                "type": "mediaStatus",
-                "status": "stopped",
-                "callId": call_connection_id
-            }))
-            
-        elif event['type'] == "Microsoft.Communication.MediaStreamingFailed":
-            logging.error(f"Media streaming failed: {event_data['resultInformation']['message']}")
-            
-            await manager.broadcast(json.dumps({
-                "type": "mediaStatus",
-                "status": "failed",
-                "callId": call_connection_id,
-                "error": event_data['resultInformation']['message']
-            }))
-            
-        elif event['type'] == "Microsoft.Communication.CallDisconnected":
-            logging.info(f"Call disconnected: {call_connection_id}")
-            
-            await manager.broadcast(json.dumps({
-                "type": "callStatus",
-                "status": "disconnected",
-                "callId": call_connection_id
-            }))
-    
+    # Acknowledge at once: ACS retries slow webhooks, which would redeliver the events
+    queued = callback_dispatcher.submit(context_id, events)
+    logging.debug(f"Queued {queued} of {len(events)} callback events for {context_id}")
     return Response(status_code=200)
 
 
+async def get_call_properties(connection_id):
+    return await call_properties_cache.get(
+        connection_id, lambda: acs_client.get_call_connection(connection_id).get_call_properties())
+
+
+async def handle_callback_event(context_id, event):
+    """Handle one ACS callback event; events of the same call arrive here one at a time, in order."""
+    global call_connection_id
+    event_data = event['data']
+    # Local: events of other calls are handled concurrently and would overwrite a global
+    connection_id = event_data.get("callConnectionId")
+    logging.info(f"Received Event: {event['type']}, Correlation Id: {event_data.get('correlationId')}, CallConnectionId: {connection_id}")
+    
+    if event['type'] == "Microsoft.Communication.CallConnected" and acs_client is not None:
+        call_connection_properties = await get_call_properties(connection_id)
+        media_streaming_subscription = call_connection_properties.media_streaming_subscription
+        logging.info(f"MediaStreamingSubscription: {media_streaming_subscription}")
+        # The agent UI's endCall hangs up the most recently connected call
+        call_connection_id = connection_id
+        
+        await manager.broadcast(json.dumps({
+            "type": "callStatus",
+            "status": "connected",
+            "callId": connection_id
+        }))
+        
+    elif event['type'] == "Microsoft.Communication.MediaStreamingStarted":
+        logging.info(f"Media streaming started for content type: {event_data['mediaStreamingUpdate']['contentType']}")
+        
+        await manager.broadcast(json.dumps({
+            "type": "mediaStatus",
+            "status": "started",
+            "callId": connection_id
+        }))
+        
+    elif event['type'] == "Microsoft.Communication.MediaStreamingStopped":
+        logging.info(f"Media streaming stopped for content type: {event_data['mediaStreamingUpdate']['contentType']}")
+        
+        await manager.broadcast(json.dumps({
+            "type": "mediaStatus",
+            "status": "stopped",
+            "callId": connection_id
+        }))
+        
+    elif event['type'] == "Microsoft.Communication.MediaStreamingFailed":
+        logging.error(f"Media streaming failed: {event_data['resultInformation']['message']}")
+        
+        await manager.broadcast(json.dumps({
+            "type": "mediaStatus",
+            "status": "failed",
+            "callId": connection_id,
+            "error": event_data['resultInformation']['message']
+        }))
+        
+    elif event['type'] == "Microsoft.Communication.CallDisconnected":
+        logging.info(f"Call disconnected: {connection_id}")
+        call_properties_cache.invalidate(connection_id)
+        if call_connection_id == connection_id:
+            call_connection_id = None
+        
+        await manager.broadcast(json.dumps({
+            "type": "callStatus",
+            "status": "disconnected",
+            "callId": connection_id
+        }))
+        # The callback context id is the call id used for the audio socket and transcripts
+        await enqueue_wrapup(context_id)
+        await discard_call_checkpoint(context_id)
+
+
+callback_dispatcher = CallbackDispatcher(handle_callback_event, seen_size=CALLBACK_DEDUPE_SIZE,
+                                         idle_timeout=CALLBACK_IDLE_SECONDS)
+call_properties_cache = AsyncTTLCache(ttl=ACS_PROPERTIES_CACHE_SECONDS)
+
+
+async def start_wrapup_worker():
+    global wrapup_queue, wrapup_worker
+    from wrapup import JobQueue, WrapUpWorker
+    wrapup_queue = await asyncio.to_thread(JobQueue, WRAPUP_DB_PATH)
+
+    def live_path_busy():
+        return loop_lag_monitor.lag * 1000 > WRAPUP_MAX_LOOP_LAG_MS or llm_scheduler.queued("live") > 0
+
+    async def publish(result):
+        await manager.broadcast(json.dumps({"type": "callSummary", **result}))
+
+    wrapup_worker = WrapUpWorker(
+        wrapup_queue,
+        get_chat_client=lambda: manager.chat_client,
+        get_text_analytics_client=lambda: text_analytics_client,
+        system_prompt=lambda: system_prompt or "",
+        concurrency=WRAPUP_CONCURRENCY,
+        busy=live_path_busy,
+        on_complete=publish,
+    )
+    wrapup_worker.start()
+
+async def enqueue_wrapup(call_id):
+    transcript = list(transcription_results.get(call_id, []))
+    if wrapup_queue is None or not transcript:
+        return
+    try:
+        if await asyncio.to_thread(wrapup_queue.enqueue, "wrapup", call_id, {"transcript": transcript}, WRAPUP_MAX_ATTEMPTS):
+            wrapup_worker.notify()
+    except Exception as e:
+        logging.error(f"Failed to queue wrap-up for call {call_id}: {str(e)}")
+
+@app.get("/api/calls/{call_id}/summary")
+async def get_call_summary(call_id: str):
+    if wrapup_queue is None:
+        return JSONResponse(content={"error": "Wrap-up is disabled"}, status_code=503)
+    job = await asyncio.to_thread(wrapup_queue.get, "wrapup", call_id)
+    if job is None:
+        return JSONResponse(content={"error": "No wrap-up for this call"}, status_code=404)
+    return JSONResponse(content={
+        "callId": call_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "result": job["result"],
+    }, status_code=200)
+
+
+@app.get("/api/calls/{call_id}/stats")
+async def get_call_stats(call_id: str):
+    return JSONResponse(content=manager.get_call_stats(call_id), status_code=200)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def prefetched_context(call_id):
+    """Lookups already warmed from identifiers heard in the call, as prompt context."""
+    if not (PREFETCH_ENABLED and call_id):
+        return None
+    results = manager.prefetcher.ready_results(call_id)
+    if not results:
+        return None
+    sections = [f"{tool}({json.dumps(arguments)}):\n{result}" for tool, arguments, result in results]
+    return "Results of lookups for identifiers mentioned in this call:\n\n" + "\n\n".join(sections)
+
+
 @app.get("/api/recommendation/{client_id}")
 async def get_recommendation(client_id: str):
+    if manager.chat_client is None:
+        return JSONResponse(content={"error": "Chat client is not ready"}, status_code=503)
     conversation = manager.get_transcriptions(client_id)
     if not conversation:
         return JSONResponse(content={"recommendation": "No conversation context available."}, status_code=200)
 
     conversation_text = "\n".join([f"{t['speaker']}: {t['text']}" for t in conversation])
-    logging.info(f"Conversation: {conversation_text}")
-    
-    prompt = f"""Given the following conversation between an agent and a customer, provide a concise and helpful recommendation for the customer:
-
-{conversation_text}
+    # Tool results prefetched from this call's transcript are keyed by its call id
+    call_id = conversation[-1].get("callId")
+    llm_logger.info("Recommendation requested", extra={"client_id": client_id, "turns": len(conversation), "conversation": conversation_text})
 
-Recommendation:
-    """
+    # Fixed system prefix + one message per transcript turn + fixed instruction (see prompts.py)
+    messages = prompt_builder.messages(client_id, conversation, context=prefetched_context(call_id))
 
-    try:
+    async def generate():
         collected_messages = []
-        async for chunk in manager.chat_client.generate_response(human_input = prompt, system_prompt = system_prompt, language = "english"):
+        usage = {}
+        async for chunk in manager.chat_client.stream_completion(messages, temperature = 0.7, call_id = call_id,
+                                                                 priority = "live", usage = usage):
             collected_messages.append(chunk)
-        recommendation = "".join([msg for msg in collected_messages if msg is not None])
-        logging.info(f"Recommendation: {recommendation}")
-        return JSONResponse(content={"recommendation": recommendation}, status_code=200)
+        return "".join([msg for msg in collected_messages if msg is not None]), usage
+
+    try:
+        # Agents polling the same conversation share one in-flight completion
+        recommendation, usage = await llm_scheduler.deduplicate(prompt_key(json.dumps(messages)), generate)
+        llm_logger.info("Recommendation generated", extra={
+            "client_id": client_id,
+            "response": recommendation,
+            "prompt_tokens": usage.get("promptTokens"),
+            "cached_tokens": usage.get("cachedTokens"),
+        })
+        return JSONResponse(content={"recommendation": recommendation, "usage": usage}, status_code=200)
     except Exception as e:
         logging.error(f"Error generating recommendation: {str(e)}")
         return JSONResponse(content={"error": "Failed to generate recommendation."}, status_code=500)
@@ -434,16 +900,39 @@ async def outbound_call_handler(request: Request):
         if not deployed_bot_id:
             return JSONResponse(content={"error": "Bot ID is required"}, status_code=400)
         
-        logging.info(f"Initiating outbound call to: {target_phone_number} with bot ID: {deployed_bot_id}")
-        
         call_guid = str(uuid.uuid4())
+        rejection = admission.check(call_guid)
+        if rejection:
+            logging.warning(f"Rejecting outbound call: {rejection}")
+            return JSONResponse(
+                content={"error": "Server is at capacity, try again later", "reason": rejection},
+                status_code=503,
+                headers={"Retry-After": "5"},
+            )
+        
+        if acs_client is None:
+            return JSONResponse(content={"error": "Call automation client is not ready"}, status_code=503)
+        
+        from azure.communication.callautomation import (
+            MediaStreamingOptions,
+            AudioFormat,
+            MediaStreamingTransportType,
+            MediaStreamingContentType,
+            MediaStreamingAudioChannelType,
+            PhoneNumberIdentifier,
+        )
+        
+        # Phone numbers go in extra fields so LOG_REDACT_TRANSCRIPTS can mask them
+        logging.info(f"Initiating outbound call with bot ID: {deployed_bot_id}",
+                     extra={"call_id": call_guid, "phone_number": target_phone_number, "caller_id": source_phone_number})
         
             
         CALLBACK_EVENTS_URI = urljoin(WEBSOCKET_URL.replace("wss://", "https://"), "api/callbacks")
         
         query_parameters = urlencode({"callerId": source_phone_number})
         callback_uri = f"{CALLBACK_EVENTS_URI}/{call_guid}?{query_parameters}"
-        logging.info(f"Callback URL: {callback_uri}")
+        # The query string carries the caller ID
+        logging.info(f"Callback URL: {CALLBACK_EVENTS_URI}/{call_guid}")
         
         transport_url = f"{WEBSOCKET_URL}/ws/audio/{call_guid}"
         logging.info(f"Transport URL: {transport_url}")
@@ -502,6 +991,7 @@ async def outbound_call_handler(request: Request):
 @app.websocket("/ws/agent/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await manager.connect(websocket, client_id)
+    ACTIVE_SOCKETS.labels("agent").inc()
     try:
         while True:
             data = await websocket.receive_text()
@@ -533,7 +1023,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                     }))
             
             elif message["type"] == "endCall":
-                if call_connection_id:
+                if call_connection_id and acs_client is not None:
                     try:
                         await acs_client.get_call_connection(call_connection_id).hang_up(is_for_everyone=True)
                         await manager.broadcast(json.dumps({
@@ -554,15 +1044,39 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             "clientId": client_id
         }))
         #manager.disconnect(client_id)
+    finally:
+        ACTIVE_SOCKETS.labels("agent").dec()
 
 # WebSocket endpoint for audio streaming
 @app.websocket("/ws/audio/{call_id}")
 async def websocket_audio_endpoint(websocket: WebSocket, call_id: str):
     client_id = f"audio_{call_id}"
-    await manager.connect(websocket, client_id)
-    logging.info(f"WebSocket connection established for call {call_id}")
-    (agent_recognizer, agent_stream), (customer_recognizer, customer_stream) = manager.setup_dual_speech_recognizers(call_id)
+    rejection = admission.check(call_id)
+    if rejection:
+        logging.warning(f"Rejecting audio connection for call {call_id}: {rejection}")
+        await websocket.accept()
+        # 1013 = Try Again Later
+        await websocket.close(code=1013, reason=f"Server saturated ({rejection})")
+        return
+    admission.admit(call_id)
+    ACTIVE_SOCKETS.labels("audio").inc()
+    pipeline = None
+    playout_task = None
+    # Anything below may fail (Speech credentials, SDK, checkpoint store); the finally
+    # block must still give back the admission slot
     try:
+        await manager.connect(websocket, client_id)
+        logging.info(f"WebSocket connection established for call {call_id}")
+        from codec import UpstreamDecoder, negotiate_encoding
+        sample_rate = 24000
+        (agent_recognizer, agent_stream), (customer_recognizer, customer_stream) = manager.setup_dual_speech_recognizers(
+            call_id, vad_sample_rate=sample_rate)
+        pipeline = manager.create_ingest_pipeline(call_id)
+        analytics = manager.start_call_analytics(call_id) if ANALYTICS_ENABLED else None
+        await restore_call_checkpoint(call_id)
+        upstream_decoder = UpstreamDecoder()
+        jitter_buffer = None
+        consecutive_errors = 0
         while True:
             # Receive audio chunk
             message = await websocket.receive()
@@ -571,37 +1085,76 @@ async def websocket_audio_endpoint(websocket: WebSocket, call_id: str):
                     try:
                         control = json.loads(message["text"])
                         if control.get("kind") == "AudioMetadata":
-                            logging.info(f"Audio Metadata: {control}")
+                            logging.info("Audio metadata for call %s: %s", call_id, control["audioMetadata"])
                             sample_rate = control["audioMetadata"]["sampleRate"]
+                            speaker = "agent" if "encodings" in control["audioMetadata"] else "customer"
+                            manager.set_vad_sample_rate(call_id, speaker, sample_rate)
+                            if analytics is not None:
+                                analytics.set_sample_rate(speaker, sample_rate)
+                            # Only the agent browser offers encodings; ACS metadata carries none
+                            if "encodings" in control["audioMetadata"]:
+                                encoding = negotiate_encoding(control["audioMetadata"]["encodings"], AGENT_AUDIO_ENCODINGS)
+                                upstream_decoder = UpstreamDecoder(encoding)
+                                logging.info(f"Agent audio encoding for call {call_id}: {encoding}")
+                                await websocket.send_text(json.dumps({
+                                    "kind": "AudioMetadataAck",
+                                    "encoding": encoding
+                                }))
                         elif control.get("kind") == "AudioData":
-                            await manager.broadcast(json.dumps({
+                            chunk = base64.b64decode(control["audioData"]["data"])
+                            AUDIO_FRAMES.labels("customer", "in").inc()
+                            AUDIO_BYTES.labels("customer", "in").inc(len(chunk))
+                            mirrored = pipeline.submit_mirror(json.dumps({
                                 "type": "audioStream",
                                 "callId": call_id,
                                 "sampleRate": sample_rate,
                                 "data": control["audioData"]["data"],
                             }))
-                            chunk = base64.b64decode(control["audioData"]["data"])
-                            manager.customer_audio_streams[call_id].write(chunk)
+                            if mirrored:
+                                AUDIO_FRAMES.labels("customer", "out").inc()
+                                AUDIO_BYTES.labels("customer", "out").inc(len(chunk))
+                            if jitter_buffer is None:
+                                jitter_buffer = manager.create_jitter_buffer(call_id, sample_rate)
+                                playout_task = asyncio.create_task(manager.run_playout(call_id, jitter_buffer))
+                            pipeline.submit_audio(functools.partial(
+                                manager.buffer_customer_audio,
+                                call_id,
+                                jitter_buffer,
+                                parse_media_timestamp(control["audioData"].get("timestamp")),
+                                chunk,
+                                control["audioData"].get("silent", False),
+                                time.monotonic(),
+                            ))
                     except json.JSONDecodeError:
                         logging.warning(f"Received non-JSON data from audio stream: {message['text'][:50]}...")
                 elif "bytes" in message:
-                    chunk = message["bytes"]
-                    manager.agent_audio_streams[call_id].write(chunk)
-                    await manager.broadcast(json.dumps({
+                    AUDIO_FRAMES.labels("agent", "in").inc()
+                    AUDIO_BYTES.labels("agent", "in").inc(len(message["bytes"]))
+                    chunk = upstream_decoder.decode(message["bytes"])
+                    pipeline.submit_audio(functools.partial(manager.write_audio, call_id, "agent", chunk))
+                    mirrored = pipeline.submit_mirror(json.dumps({
                             "Kind": "AudioData",
                             "AudioData": {
                                     "Data":  base64.b64encode(chunk).decode("utf-8")
                             },
                             "StopAudio": None
                         }))
+                    if mirrored:
+                        AUDIO_FRAMES.labels("agent", "out").inc()
+                        AUDIO_BYTES.labels("agent", "out").inc(len(chunk))
                 elif message.get("type") == "websocket.disconnect":
                     logging.info(f"Received disconnect message: {message}")
                     break
                 else:
                     logging.warning(f"Received unknown message type: {message}")
+                consecutive_errors = 0
             except Exception as e:
+                # A single malformed frame shouldn't drop the call; a broken stream should
+                consecutive_errors += 1
                 logging.error(f"Error processing audio message: {str(e)}")
-                break  # Exit the loop on any unhandled exception to ensure proper cleanup
+                if consecutive_errors >= MAX_CONSECUTIVE_AUDIO_ERRORS:
+                    logging.error(f"Giving up on audio for call {call_id} after {consecutive_errors} consecutive errors")
+                    break
     
     except WebSocketDisconnect:
         logging.info(f"WebSocket connection closed for call {call_id}")
@@ -610,37 +1163,241 @@ async def websocket_audio_endpoint(websocket: WebSocket, call_id: str):
         logging.error(traceback.format_exc())
         logging.error(f"Error in WebSocket audio endpoint: {str(e)}")
 
+    finally:
+        try:
+            if playout_task:
+                # Its final flush of the jitter buffer must still pass through the call's VAD
+                playout_task.cancel()
+                await asyncio.gather(playout_task, return_exceptions=True)
+            await manager.remove_ingest_pipeline(call_id, pipeline)
+            if drain_controller.draining:
+                # The call may continue on another pod
+                await checkpoint_call(call_id)
+        finally:
+            admission.release(call_id)
+            ACTIVE_SOCKETS.labels("audio").dec()
+
 # Process queued messages
 async def process_message_queue():
     while True:
         try:
-            message, connections = message_queue.get()
+            message, connections, enqueued_at = message_queue.get()
+            MESSAGE_QUEUE_DWELL.observe(time.perf_counter() - enqueued_at)
             for connection in connections:
+                started = time.perf_counter()
                 try:
                     await connection.send_text(message)
+                    WS_SEND_LATENCY.labels("message_queue").observe(time.perf_counter() - started)
                 except Exception as e:
+                    WS_SEND_FAILURES.labels("message_queue", type(e).__name__).inc()
                     logging.error(f"Error broadcasting transcription: {str(e)}")
             message_queue.task_done()
         except Exception as e:
             logging.error(f"Error processing message queue: {str(e)}")
         await asyncio.sleep(0.01)  # Small sleep to prevent CPU hogging
 
-# Register startup event
-@app.on_event("startup")
-async def startup_event():
-    message_thread = threading.Thread(target=asyncio.run, args=(process_message_queue(),), daemon=True)
-    message_thread.start()
+async def initialize_services():
+    """Build service clients off the request path and record readiness per component."""
+    global acs_client, text_analytics_client, system_prompt
 
-# Initialize the Azure Text Analytics client after other clients
-text_analytics_client = None
-if os.getenv("AZURE_TEXT_ANALYTICS_KEY") and os.getenv("AZURE_TEXT_ANALYTICS_ENDPOINT"):
-    text_analytics_client = TextAnalyticsClient(
-        endpoint=os.getenv("AZURE_TEXT_ANALYTICS_ENDPOINT"),
-        credential=AzureKeyCredential(os.getenv("AZURE_TEXT_ANALYTICS_KEY"))
+    def load_system_prompt():
+        with open(SYSTEM_PROMPT_PATH, "r") as f:
+            return f.read()
+
+    def build_chat_client():
+        from oai import ChatClient
+        chat_client = ChatClient(language = "en-IN",out_queue =  None, tools=tools)
+        chat_client.prefetcher = manager.prefetcher
+        chat_client.scheduler = llm_scheduler
+        return chat_client
+
+    def build_text_analytics_client():
+        if not (os.getenv("AZURE_TEXT_ANALYTICS_KEY") and os.getenv("AZURE_TEXT_ANALYTICS_ENDPOINT")):
+            return None
+        from azure.ai.textanalytics import TextAnalyticsClient
+        from azure.core.credentials import AzureKeyCredential
+        return TextAnalyticsClient(
+            endpoint=os.getenv("AZURE_TEXT_ANALYTICS_ENDPOINT"),
+            credential=AzureKeyCredential(os.getenv("AZURE_TEXT_ANALYTICS_KEY"))
+        )
+
+    def build_acs_client():
+        if not ACS_CONNECTION_STRING:
+            raise RuntimeError("ACS_CONNECTION_STRING is not set")
+        from azure.communication.callautomation.aio import CallAutomationClient
+        return CallAutomationClient.from_connection_string(ACS_CONNECTION_STRING)
+
+    def warm_speech_sdk():
+        if not (SPEECH_KEY and SPEECH_REGION):
+            raise RuntimeError("SPEECH_KEY and SPEECH_REGION must be set")
+        import azure.cognitiveservices.speech  # noqa: F401
+
+    def warm_audio_dsp():
+        import vad  # noqa: F401  (pulls in numpy)
+        import codec  # noqa: F401
+
+    def load_knowledge_index():
+        import tools as tool_handlers
+        if tool_handlers.RETRIEVAL_BACKEND != "local":
+            return "disabled"
+        tool_handlers.get_local_index()
+
+    async def run(name, build):
+        started = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(build)
+            service_status[name] = "ready"
+            logging.info(f"Service {name} initialized in {time.perf_counter() - started:.2f}s")
+            return result
+        except Exception as e:
+            service_status[name] = f"error: {str(e)}"
+            logging.error(f"Failed to initialize {name}: {str(e)}")
+            return None
+
+    system_prompt, acs_client, manager.chat_client, text_analytics_client, _, _, knowledge = await asyncio.gather(
+        run("system_prompt", load_system_prompt),
+        run("acs", build_acs_client),
+        run("chat", build_chat_client),
+        run("text_analytics", build_text_analytics_client),
+        run("speech", warm_speech_sdk),
+        run("audio_dsp", warm_audio_dsp),
+        run("knowledge", load_knowledge_index),
+    )
+    if knowledge == "disabled":
+        service_status["knowledge"] = "disabled"
+    prompt_builder.system_prompt = system_prompt or ""
+    if text_analytics_client:
+        logging.info("Azure Text Analytics client initialized")
+    elif service_status["text_analytics"] == "ready":
+        service_status["text_analytics"] = "disabled"
+        logging.warning("Azure Text Analytics credentials not found, sentiment analysis will not be available")
+
+
+# Graceful drain: checkpoints of live calls, see drain.py
+session_checkpoints = None
+
+
+async def open_session_checkpoints():
+    global session_checkpoints
+    from drain import SessionCheckpoints
+    try:
+        session_checkpoints = await asyncio.to_thread(SessionCheckpoints, SESSION_CHECKPOINT_DB_PATH)
+    except Exception as e:
+        logging.error(f"Failed to open session checkpoints at {SESSION_CHECKPOINT_DB_PATH}: {str(e)}")
+
+
+def call_checkpoint_state(call_id):
+    """Everything needed to resume a call on another pod, as plain data."""
+    analytics = manager.call_analytics.get(call_id)
+    agents = {}
+    # Agents following the call: their transcript and the prompt turns built from it
+    for client_id, transcript in manager.transcriptions.items():
+        if any(entry.get("callId") == call_id for entry in transcript):
+            agents[client_id] = {"transcript": list(transcript), "prompt": prompt_builder.export(client_id)}
+    return {
+        "callId": call_id,
+        "transcript": list(transcription_results.get(call_id, [])),
+        "agents": agents,
+        "analytics": analytics.export() if analytics else None,
+    }
+
+
+async def checkpoint_call(call_id):
+    if session_checkpoints is None:
+        return
+    await asyncio.to_thread(session_checkpoints.save, call_id, call_checkpoint_state(call_id))
+
+
+def restore_call_state(call_id, saved):
+    transcription_results[call_id] = saved["transcript"]
+    for client_id, agent in saved.get("agents", {}).items():
+        manager.restore_agent_state(client_id, agent["transcript"], agent["prompt"], call_id=call_id)
+    analytics = manager.call_analytics.get(call_id)
+    if analytics is not None and saved.get("analytics"):
+        analytics.restore(saved["analytics"])
+
+
+async def restore_call_checkpoint(call_id):
+    """Pick up the state of a call that another pod checkpointed while draining."""
+    if session_checkpoints is None or call_id in transcription_results:
+        return
+    try:
+        saved = await asyncio.to_thread(session_checkpoints.load, call_id)
+    except Exception as e:
+        logging.error(f"Failed to load checkpoint for call {call_id}: {str(e)}")
+        return
+    if saved:
+        restore_call_state(call_id, saved)
+        logging.info(f"Restored {len(saved['transcript'])} transcript entries and {len(saved.get('agents', {}))} "
+                     f"agent histories for call {call_id} from checkpoint")
+
+
+async def discard_call_checkpoint(call_id):
+    if session_checkpoints is not None:
+        try:
+            await asyncio.to_thread(session_checkpoints.delete, call_id)
+        except Exception as e:
+            logging.error(f"Failed to delete checkpoint for call {call_id}: {str(e)}")
+
+
+async def flush_message_queue():
+    # Items are marked done by the message thread once sent
+    while message_queue.unfinished_tasks:
+        await asyncio.sleep(0.05)
+
+
+drain_controller = DrainController(
+    active_calls=lambda: list(admission.calls),
+    checkpoint=checkpoint_call,
+    flushers={
+        "callbacks": callback_dispatcher.join,
+        "messages": flush_message_queue,
+    },
+    deadline=DRAIN_DEADLINE_SECONDS,
+    checkpoint_interval=DRAIN_CHECKPOINT_INTERVAL_SECONDS,
+)
+DRAINING.set_function(lambda: int(drain_controller.draining))
+
+
+def start_drain(reason, deadline=None):
+    admission.draining = True
+    return drain_controller.begin(reason, deadline=deadline)
+
+
+@app.post("/api/drain")
+async def drain(
+    deadline: float | None = Query(None, alias="deadlineSeconds", gt=0, le=3600),
+    reason: str = Query("requested", max_length=100),
+    authorization: str = Header(""),
+):
+    # Draining takes the pod out of rotation, so anyone who can reach it must not be able to
+    if not DRAIN_TOKEN:
+        return JSONResponse(content={"error": "Drain endpoint is disabled"}, status_code=404)
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {DRAIN_TOKEN}".encode()):
+        return JSONResponse(content={"error": "Unauthorized"}, status_code=401,
+                            headers={"WWW-Authenticate": "Bearer"})
+    return JSONResponse(content=start_drain(reason, deadline=deadline), status_code=202)
+
+
+@app.get("/api/drain")
+async def drain_progress():
+    return JSONResponse(content=drain_controller.progress(), status_code=200)
+
+
+@app.get("/healthz")
+async def liveness():
+    return JSONResponse(content={"status": "alive", "uptimeSeconds": round(time.time() - started_at, 1)}, status_code=200)
+
+
+@app.get("/readyz")
+async def readiness():
+    if drain_controller.draining:
+        return JSONResponse(content={"status": "draining", "drain": drain_controller.progress()}, status_code=503)
+    ready = all(service_status[name] == "ready" for name in REQUIRED_SERVICES)
+    return JSONResponse(
+        content={"status": "ready" if ready else "not_ready", "services": service_status},
+        status_code=200 if ready else 503,
     )
-    logging.info("Azure Text Analytics client initialized")
-else:
-    logging.warning("Azure Text Analytics credentials not found, sentiment analysis will not be available")
 
 # Add this endpoint after your other API endpoints
 @app.post("/api/sentiment")
@@ -656,6 +1413,7 @@ async def analyze_sentiment(request: Request):
             # Fallback to simple sentiment analysis if Azure client is not available
             # This is just a placeholder - you should set up Azure Text Analytics
             import random
+            SENTIMENT_CALLS.labels("mock", "ok").inc()
             mock_score = random.uniform(-0.8, 0.8)
             return JSONResponse(content={
                 "sentiment": {
@@ -669,6 +1427,7 @@ async def analyze_sentiment(request: Request):
         documents = [{"id": "1", "language": "en", "text": text}]
         response = text_analytics_client.analyze_sentiment(documents=documents)
         document = response[0]
+        SENTIMENT_CALLS.labels("azure", "error" if document.is_error else "ok").inc()
         
         if not document.is_error:
             # Convert the Azure score (0 to 1) to our scale (-1 to 1)
@@ -697,6 +1456,7 @@ async def analyze_sentiment(request: Request):
             )
     
     except Exception as e:
+        SENTIMENT_CALLS.labels("azure" if text_analytics_client else "mock", "exception").inc()
         logging.error(traceback.format_exc())
         logging.error(f"Error analyzing sentiment: {str(e)}")
         return JSONResponse(
@@ -0,0 +1,76 @@
+"""Conversation analytics cost per audio frame per call.
+
+Run from the backend directory:
+    python benchmarks/bench_analytics.py [--calls 50] [--seconds 60] [--frame-ms 20]
+
+Each simulated call feeds synthetic speech/silence on both channels the way
+the audio socket does: customer audio in 20 ms ACS frames (960 bytes at
+24 kHz) and agent audio in AgentAudioPanel.js chunks of 2048 samples. The
+report gives the processing time per analysis frame, per call second and the
+number of calls one core could keep up with in real time.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import CallAnalytics
+
+SAMPLE_RATE = 24000
+
+
+def synthetic_channel(seconds, seed):
+    """Alternating 0.5-3 s bursts of tone and near-silence."""
+    rng = np.random.default_rng(seed)
+    samples = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    position, talking = 0, bool(seed % 2)
+    while position < len(samples):
+        length = int(rng.uniform(0.5, 3.0) * SAMPLE_RATE)
+        span = samples[position:position + length]
+        span += rng.normal(0, 30, len(span))
+        if talking:
+            span += 6000 * np.sin(2 * np.pi * rng.uniform(120, 300) * np.arange(len(span)) / SAMPLE_RATE)
+        position, talking = position + length, not talking
+    return samples.astype("<i2").tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--frame-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    agent = synthetic_channel(args.seconds, 1)
+    customer = synthetic_channel(args.seconds, 2)
+    agent_chunk, customer_chunk = 2048 * 2, SAMPLE_RATE * 20 // 1000 * 2
+    calls = [CallAnalytics(f"call-{index}", frame_ms=args.frame_ms) for index in range(args.calls)]
+
+    started = time.perf_counter()
+    agent_position = 0
+    for position in range(0, len(customer), customer_chunk):
+        # Interleave calls the way the event loop does: one frame of every call per tick
+        agent_due = position + customer_chunk > agent_position + agent_chunk
+        for analytics in calls:
+            analytics.process("customer", customer[position:position + customer_chunk])
+            if agent_due:
+                analytics.process("agent", agent[agent_position:agent_position + agent_chunk])
+        if agent_due:
+            agent_position += agent_chunk
+    elapsed = time.perf_counter() - started
+
+    frames = sum(analytics.frames_processed for analytics in calls)
+    per_call_second = elapsed / args.calls / args.seconds
+    print(f"{args.calls} calls x {args.seconds:.0f} s, {args.frame_ms} ms frames, {frames} frames analysed")
+    print(f"{elapsed / frames * 1e6:9.2f} us/frame")
+    print(f"{per_call_second * 1e3:9.3f} ms per call-second  ({per_call_second * 100:.3f}% of a core per call)")
+    print(f"{1 / per_call_second:9.0f} calls per core in real time")
+    print(calls[0].snapshot()["total"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Decode cost per agent microphone frame for each upstream encoding.
+
+Run from the backend directory:
+    python benchmarks/bench_codec.py [--frames 5000] [--samples 2048]
+
+The default frame size matches AgentAudioPanel.js (ScriptProcessor buffer of
+2048 samples, about 85 ms at 24 kHz).
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import audioop
+
+from codec import UpstreamDecoder, decode_alaw, decode_ulaw
+
+
+def bench(label, decode, frames):
+    decode(frames[0])  # warm up
+    started = time.perf_counter()
+    for frame in frames:
+        decode(frame)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {elapsed / len(frames) * 1e6:9.2f} us/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=2048)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pcm = [rng.normal(0, 3000, args.samples).clip(-32768, 32767).astype("<i2").tobytes() for _ in range(args.frames)]
+    ulaw = [audioop.lin2ulaw(frame, 2) for frame in pcm]
+    alaw = [audioop.lin2alaw(frame, 2) for frame in pcm]
+    adpcm, state = [], None
+    for frame in pcm:
+        encoded, state = audioop.lin2adpcm(frame, 2, state)
+        adpcm.append(encoded)
+
+    print(f"{args.frames} frames of {args.samples} samples")
+    bench("pcm16 (passthrough)", UpstreamDecoder("pcm16").decode, pcm)
+    bench("mulaw numpy", decode_ulaw, ulaw)
+    bench("mulaw audioop", lambda frame: audioop.ulaw2lin(frame, 2), ulaw)
+    bench("alaw numpy", decode_alaw, alaw)
+    bench("alaw audioop", lambda frame: audioop.alaw2lin(frame, 2), alaw)
+    bench("adpcm audioop", UpstreamDecoder("adpcm").decode, adpcm)
+
+
+if __name__ == "__main__":
+    main()
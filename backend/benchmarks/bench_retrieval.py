@@ -0,0 +1,107 @@
+"""Recall and latency of the local knowledge index against Azure AI Search.
+
+Run from the backend directory:
+    python benchmarks/bench_retrieval.py --docs ./knowledge [--index ./knowledge_index]
+        [--queries queries.jsonl] [--top 5] [--azure]
+
+Queries come from a JSONL file of {"query": ..., "answer": ...} objects, where
+a hit counts as relevant when its content contains ``answer``. Without a file,
+queries are sampled from the documents themselves: a span of ``--span-words``
+words is taken from a random chunk, a few of its words form the query and the
+span is the answer.
+
+--azure also runs each query through the SearchClient configured in tools.py
+(AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_KEY, INDEX_NAME), which must index the
+same documents for the recall numbers to be comparable.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge import KnowledgeIndex, azure_openai_embedder, build_index, tokenize
+
+
+def sample_queries(index, count, span_words, query_words, seed):
+    rng = random.Random(seed)
+    queries = []
+    # Bounded, since the chunks may be too short for the span or the query
+    attempts = count * 20 if index.n_chunks else 0
+    for _ in range(attempts):
+        if len(queries) >= count:
+            break
+        words = index.chunk(rng.randrange(index.n_chunks)).split()
+        if len(words) < span_words:
+            continue
+        start = rng.randrange(len(words) - span_words + 1)
+        span = words[start:start + span_words]
+        terms = [word for word in span if tokenize(word)]
+        if len(terms) < query_words:
+            continue
+        queries.append({"query": " ".join(rng.sample(terms, query_words)), "answer": " ".join(span)})
+    return queries
+
+
+def run(label, search, queries, top):
+    latencies, hits = [], 0
+    for item in queries:
+        started = time.perf_counter()
+        contents = search(item["query"], top)
+        latencies.append(time.perf_counter() - started)
+        hits += any(item["answer"] in content for content in contents)
+    latencies.sort()
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(f"{label:<14} recall@{top} {hits / len(queries):6.3f}   "
+          f"p50 {statistics.median(latencies) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", help="document directory; the index is (re)built from it")
+    parser.add_argument("--index", help="index directory (default: a temporary directory)")
+    parser.add_argument("--queries", help="JSONL file of labelled queries")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--span-words", type=int, default=12)
+    parser.add_argument("--query-words", type=int, default=4)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--azure", action="store_true")
+    args = parser.parse_args()
+    if not args.docs and not args.index:
+        parser.error("pass --docs, --index or both")
+
+    index_dir = args.index or tempfile.mkdtemp(prefix="knowledge_index_")
+    if args.docs:
+        started = time.perf_counter()
+        chunks = build_index(args.docs, index_dir)
+        print(f"built {chunks} chunks in {time.perf_counter() - started:.2f} s")
+    started = time.perf_counter()
+    index = KnowledgeIndex.load(index_dir, embed=azure_openai_embedder())
+    print(f"loaded index in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"({index.n_chunks} chunks, embeddings: {'yes' if index.embed else 'no'})")
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = sample_queries(index, args.count, args.span_words, args.query_words, args.seed)
+    print(f"{len(queries)} queries")
+    if not queries:
+        parser.error("no queries: the chunks are shorter than --span-words, or pass --queries")
+
+    run("local", lambda query, top: [hit["content"] for hit in index.search(query, top=top)], queries, args.top)
+    if args.azure:
+        from tools import get_search_client
+        client = get_search_client()
+        run("azure", lambda query, top: [doc["content"] for doc in client.search(search_text=query, top=top, select="content")],
+            queries, args.top)
+
+
+if __name__ == "__main__":
+    main()
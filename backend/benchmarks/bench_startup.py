@@ -0,0 +1,65 @@
+"""Import-time report for the backend against a startup budget.
+
+Runs ``python -X importtime -c "import app"`` in a fresh interpreter and
+summarizes where the time goes. Heavy SDKs are expected to be absent from
+this report: they load lazily or in initialize_services() after the server
+starts listening.
+
+Run from the backend directory:
+    python benchmarks/bench_startup.py [--module app] [--top 15] [--budget-ms 1000]
+
+Exits non-zero when the module's cumulative import time exceeds the budget.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+HEAVY_PACKAGES = ("numpy", "scipy", "pandas", "openai", "azure")
+
+
+def run_importtime(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    entries = run_importtime(args.module)
+    total_us = next((cumulative for name, _, cumulative, depth in entries if name == args.module and depth == 0), 0)
+
+    print(f"{'module':<48} {'self ms':>9} {'cumul ms':>9}")
+    top_level = sorted((e for e in entries if e[3] <= 1), key=lambda e: e[2], reverse=True)
+    for name, self_us, cumulative_us, depth in top_level[:args.top]:
+        print(f"{'  ' * depth + name:<48} {self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}")
+
+    loaded_heavy = sorted({e[0].split(".")[0] for e in entries if e[0].split(".")[0] in HEAVY_PACKAGES})
+    print(f"\n{len(entries)} modules imported, heavy packages loaded eagerly: {', '.join(loaded_heavy) or 'none'}")
+    print(f"import {args.module}: {total_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_us / 1000 > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Upstream audio codecs for the agent microphone path.
+
+The browser offers a list of encodings in its ``AudioMetadata`` message and the
+server answers with an ``AudioMetadataAck`` naming the one it picked. Binary
+frames on ``/ws/audio/{call_id}`` are then decoded back to 16-bit PCM here
+before they reach VAD and the recognizer.
+
+- "mulaw" / "alaw": G.711, 8 bits per sample. Decoded by ``audioop`` when it
+  is available (stdlib, or audioop-lts on Python 3.13+), otherwise by a numpy
+  gather through a 256-entry lookup table. Both produce identical samples;
+  benchmarks/bench_codec.py measures the two.
+- "adpcm": IMA ADPCM, 4 bits per sample. The decoder is sequential by nature
+  and requires ``audioop``.
+- "pcm16": raw little-endian 16-bit PCM, passed through untouched.
+"""
+import numpy as np
+
+try:
+    import audioop
+except ImportError:
+    audioop = None
+
+SUPPORTED_ENCODINGS = ("mulaw", "alaw", "adpcm", "pcm16")
+
+
+def _build_ulaw_table():
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype("<i2")
+
+
+def _build_alaw_table():
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (codes >> 4) & 0x07
+    mantissa = (codes & 0x0F) << 4
+    magnitude = np.where(exponent == 0, mantissa + 8, (mantissa + 0x108) << np.maximum(exponent - 1, 0))
+    return np.where(codes & 0x80, magnitude, -magnitude).astype("<i2")
+
+
+ULAW_TABLE = _build_ulaw_table()
+ALAW_TABLE = _build_alaw_table()
+
+
+def decode_ulaw(data):
+    return ULAW_TABLE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+def decode_alaw(data):
+    return ALAW_TABLE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+def available_encodings():
+    return tuple(e for e in SUPPORTED_ENCODINGS if e != "adpcm" or audioop is not None)
+
+
+def negotiate_encoding(offered, preferred=SUPPORTED_ENCODINGS):
+    """Pick the first server-preferred encoding the client offered, falling back to pcm16."""
+    offered = [str(encoding).lower() for encoding in offered or []]
+    available = available_encodings()
+    for encoding in preferred:
+        if encoding in offered and encoding in available:
+            return encoding
+    return "pcm16"
+
+
+class UpstreamDecoder:
+    """Stateful per-socket decoder from the negotiated wire format to 16-bit PCM."""
+
+    def __init__(self, encoding="pcm16"):
+        if encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError(f"Unsupported upstream encoding: {encoding}")
+        if encoding == "adpcm" and audioop is None:
+            raise ValueError("adpcm decoding requires audioop (install audioop-lts)")
+        self.encoding = encoding
+        self._adpcm_state = None
+
+    def decode(self, data):
+        if self.encoding == "mulaw":
+            return audioop.ulaw2lin(data, 2) if audioop else decode_ulaw(data)
+        if self.encoding == "alaw":
+            return audioop.alaw2lin(data, 2) if audioop else decode_alaw(data)
+        if self.encoding == "adpcm":
+            pcm, self._adpcm_state = audioop.adpcm2lin(data, 2, self._adpcm_state)
+            return pcm
+        return data
@@ -0,0 +1,174 @@
+"""Graceful drain for rolling deployments.
+
+``DrainController.begin()`` takes the pod out of rotation and runs, within a
+deadline:
+
+1. waiting: no new calls are admitted and readiness reports 503, while calls
+   already in progress carry on. Their transcript, the agents' prompt turns
+   and the conversation analytics are checkpointed every
+   ``checkpoint_interval`` seconds, so a pod killed at the deadline loses at
+   most that much.
+2. checkpointing: calls still active when the deadline approaches are
+   checkpointed one last time; another pod restores them when the call's
+   audio reconnects there.
+3. flushing: pending WebSocket messages and callback events are delivered.
+
+``progress()`` reports the phase and counts for the orchestrator, which
+typically starts the drain from a preStop hook, polls until ``state`` is
+"drained" and only then stops the process.
+
+A finished drain does not exit or signal anything: the pod stays up, out of
+rotation, until it is stopped. In Kubernetes that is the SIGTERM sent once
+the preStop hook returns; uvicorn then runs the application's shutdown,
+which finds the drain already done. Without an orchestrator, stop the
+process yourself after ``state`` turns "drained".
+
+``SessionCheckpoints`` is the SQLite store (WAL mode) for the checkpoints.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import DRAIN_CHECKPOINTS
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCheckpoints:
+    """Latest saved state per call id."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                key TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+
+    def save(self, key, state):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO checkpoints (key, state, updated_at) VALUES (?, ?, ?)",
+                             (key, json.dumps(state, default=str), time.time()))
+
+    def load(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT state FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class DrainController:
+    def __init__(self, active_calls, checkpoint, flushers=None, deadline=300.0, checkpoint_interval=10.0,
+                 flush_reserve=10.0, poll_interval=0.5):
+        self.active_calls = active_calls      # () -> iterable of call ids still in progress
+        self.checkpoint = checkpoint          # async (call_id) -> None
+        self.flushers = flushers or {}        # name -> async () -> None, run in order
+        self.deadline = deadline
+        self.checkpoint_interval = checkpoint_interval
+        self.flush_reserve = flush_reserve    # seconds kept back from the deadline for flushing
+        self.poll_interval = poll_interval
+        self.state = "serving"
+        self.phase = None
+        self.reason = None
+        self.started = None
+        self.finished = None
+        self.calls_at_start = 0
+        self.checkpointed = set()
+        self.flushed = []
+        self.errors = []
+        self._task = None
+
+    @property
+    def draining(self):
+        return self.state != "serving"
+
+    def begin(self, reason="requested", deadline=None):
+        """Start draining (idempotent) and return the progress so far; the process keeps running after it."""
+        if self._task is None:
+            if deadline is not None:
+                self.deadline = deadline
+            self.state, self.reason, self.started = "draining", reason, time.monotonic()
+            self.calls_at_start = len(list(self.active_calls()))
+            logger.warning(f"Draining ({reason}): {self.calls_at_start} active calls, deadline {self.deadline:.0f}s")
+            self._task = asyncio.create_task(self._run())
+        return self.progress()
+
+    async def wait(self):
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def remaining(self):
+        return max(self.started + self.deadline - time.monotonic(), 0.0) if self.started else self.deadline
+
+    async def _checkpoint_all(self):
+        for call_id in list(self.active_calls()):
+            try:
+                await self.checkpoint(call_id)
+                self.checkpointed.add(call_id)
+                DRAIN_CHECKPOINTS.labels("saved").inc()
+            except Exception as e:
+                DRAIN_CHECKPOINTS.labels("failed").inc()
+                self.errors.append(f"checkpoint {call_id}: {str(e)}")
+                logger.error(f"Failed to checkpoint call {call_id}: {str(e)}")
+
+    async def _run(self):
+        try:
+            self.phase = "waiting"
+            last_checkpoint = 0.0
+            while list(self.active_calls()) and self.remaining() > self.flush_reserve:
+                if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    await self._checkpoint_all()
+                    last_checkpoint = time.monotonic()
+                await asyncio.sleep(self.poll_interval)
+
+            self.phase = "checkpointing"
+            await self._checkpoint_all()
+
+            self.phase = "flushing"
+            for name, flush in self.flushers.items():
+                try:
+                    await asyncio.wait_for(flush(), timeout=max(self.remaining(), self.poll_interval))
+                    self.flushed.append(name)
+                except asyncio.TimeoutError:
+                    self.errors.append(f"flush {name}: timed out")
+                    logger.warning(f"Drain deadline reached while flushing {name}")
+                except Exception as e:
+                    self.errors.append(f"flush {name}: {str(e)}")
+                    logger.error(f"Failed to flush {name}: {str(e)}")
+        finally:
+            self.state, self.phase, self.finished = "drained", "done", time.monotonic()
+            logger.warning(f"Drain finished in {self.finished - self.started:.1f}s: "
+                           f"{len(list(self.active_calls()))} calls still active, "
+                           f"{len(self.checkpointed)} checkpointed, {len(self.errors)} errors")
+
+    def progress(self):
+        elapsed = ((self.finished or time.monotonic()) - self.started) if self.started else 0.0
+        return {
+            "state": self.state,
+            "phase": self.phase,
+            "reason": self.reason,
+            "elapsedSeconds": round(elapsed, 1),
+            "deadlineSeconds": self.deadline,
+            "remainingSeconds": round(self.remaining(), 1),
+            "callsAtStart": self.calls_at_start,
+            "activeCalls": len(list(self.active_calls())),
+            "checkpointedCalls": len(self.checkpointed),
+            "flushed": list(self.flushed),
+            "errors": list(self.errors),
+        }
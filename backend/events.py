@@ -0,0 +1,141 @@
+"""Asynchronous, idempotent processing of ACS callback events.
+
+ACS retries a webhook that does not answer quickly, and the retried batch
+carries the same event ids. ``CallbackDispatcher.submit()`` only filters and
+queues events and returns at once, so the endpoint can acknowledge with 200
+straight away:
+
+- events whose id was seen recently (a bounded LRU) are dropped;
+- each call gets its own queue and worker task, so a call's events are
+  handled in arrival order while different calls proceed in parallel;
+- a worker exits once its call has been idle for ``idle_timeout`` seconds.
+
+``AsyncTTLCache`` keeps results of ACS lookups such as
+``get_call_properties`` for a short time and lets concurrent callers share
+one in-flight lookup.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from metrics import CALLBACK_EVENTS, CALLBACK_LATENCY, CALLBACK_QUEUE_DEPTH, ACS_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+def event_name(event):
+    """Short event type, e.g. "CallConnected" for "Microsoft.Communication.CallConnected"."""
+    return str(event.get("type", "unknown")).rsplit(".", 1)[-1]
+
+
+class CallbackDispatcher:
+    def __init__(self, handle, seen_size=10000, idle_timeout=30.0):
+        self.handle = handle  # async handle(call_key, event)
+        self.seen_size = seen_size
+        self.idle_timeout = idle_timeout
+        self._seen = OrderedDict()
+        self._queues = {}
+        self._workers = {}
+        CALLBACK_QUEUE_DEPTH.set_function(self.pending)
+
+    def pending(self):
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def is_duplicate(self, event_id):
+        """Record ``event_id``; True if it was already recorded. Events without an id are never duplicates."""
+        if not event_id:
+            return False
+        if event_id in self._seen:
+            self._seen.move_to_end(event_id)
+            return True
+        self._seen[event_id] = None
+        if len(self._seen) > self.seen_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def submit(self, call_key, events):
+        """Queue new events for ``call_key`` without waiting for them. Returns how many were queued."""
+        queued = 0
+        for event in events:
+            if self.is_duplicate(event.get("id")):
+                CALLBACK_EVENTS.labels(event_name(event), "duplicate").inc()
+                logger.info(f"Ignoring duplicate {event_name(event)} event {event.get('id')} for call {call_key}")
+                continue
+            queue = self._queues.get(call_key)
+            if queue is None:
+                queue = self._queues[call_key] = asyncio.Queue()
+                self._workers[call_key] = asyncio.create_task(self._work(call_key, queue))
+            queue.put_nowait((event, time.perf_counter()))
+            CALLBACK_EVENTS.labels(event_name(event), "queued").inc()
+            queued += 1
+        return queued
+
+    async def _work(self, call_key, queue):
+        try:
+            while True:
+                try:
+                    event, received = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    return
+                try:
+                    await self.handle(call_key, event)
+                    CALLBACK_EVENTS.labels(event_name(event), "processed").inc()
+                except Exception as e:
+                    CALLBACK_EVENTS.labels(event_name(event), "failed").inc()
+                    logger.error(f"Error handling {event_name(event)} event for call {call_key}: {str(e)}")
+                finally:
+                    queue.task_done()
+                CALLBACK_LATENCY.observe(time.perf_counter() - received)
+        finally:
+            # No await between the idle timeout and here, so no event can slip into the queue
+            if self._workers.get(call_key) is asyncio.current_task():
+                del self._workers[call_key]
+                del self._queues[call_key]
+
+    async def join(self):
+        """Wait until every queued event has been handled."""
+        queues = list(self._queues.values())
+        while queues:
+            await asyncio.gather(*(queue.join() for queue in queues))
+            # Handlers may have queued more events meanwhile
+            queues = [queue for queue in self._queues.values() if queue.qsize()]
+
+    async def stop(self):
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def stats(self):
+        return {"calls": len(self._queues), "pending": self.pending(), "seen": len(self._seen)}
+
+
+class AsyncTTLCache:
+    def __init__(self, ttl=30.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, task)
+
+    async def get(self, key, factory):
+        """Cached result of ``await factory()``; failures are not cached."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            ACS_CACHE_LOOKUPS.labels("hit").inc()
+            return await asyncio.shield(entry[1])
+        ACS_CACHE_LOOKUPS.labels("miss").inc()
+        task = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda done: self._evict_failed(key, done))
+        self._entries[key] = (time.monotonic() + self.ttl, task)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return await asyncio.shield(task)
+
+    def _evict_failed(self, key, task):
+        if (task.cancelled() or task.exception() is not None) and self._entries.get(key, (None, None))[1] is task:
+            del self._entries[key]
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
@@ -0,0 +1,277 @@
+"""Backpressure and overload protection for audio ingest.
+
+Each audio socket gets an ``IngestPipeline`` with two bounded queues so the
+receive loop never waits on a slow consumer:
+
+    socket receive --> recognizer queue --> VAD / jitter buffer / push stream
+                   \\-> fan-out queue    --> UI broadcast
+
+Pressure (the fuller of the two queues) raises the pipeline's degradation
+level as soon as it crosses a watermark, and the level steps back down one
+step at a time once both queues drain:
+
+- level 0 (NORMAL): everything flows;
+- level 1 (NO_AUDIO_MIRROR): audio mirroring to the agent UI is shed;
+- level 2 (NO_INTERIM): interim recognition results are shed as well;
+- level 3 (DROPPING_AUDIO): the recognizer queue is full even so, and its
+  oldest audio is dropped. This is data loss for the transcript, so it is
+  the last resort and is logged.
+
+A full fan-out queue drops its oldest mirror message.
+
+Final transcripts reach the UI through ``TranscriptQueue``, a bounded
+thread-safe queue shared by all calls: above its watermark interims are shed,
+and only when it is full is the oldest final transcript dropped (agents can
+re-fetch the transcript with ``getTranscription``).
+
+``AdmissionController`` rejects new calls when the instance is saturated,
+either by call count or by event loop lag (see ``LoopLagMonitor``).
+"""
+import asyncio
+import logging
+import time
+from queue import Empty, Full, Queue
+
+from metrics import INGEST_DROPS, INGEST_DEGRADATIONS, ADMISSION_REJECTIONS, EVENT_LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+NORMAL = 0
+NO_AUDIO_MIRROR = 1
+NO_INTERIM = 2
+DROPPING_AUDIO = 3
+LEVEL_NAMES = {NORMAL: "normal", NO_AUDIO_MIRROR: "no_audio_mirror", NO_INTERIM: "no_interim",
+               DROPPING_AUDIO: "dropping_audio"}
+
+
+class IngestPipeline:
+    def __init__(self, call_id, broadcast, recognizer_queue_size=200, fanout_queue_size=100,
+                 mirror_watermark=0.5, interim_watermark=0.75, low_watermark=0.25, step_interval=1.0):
+        self.call_id = call_id
+        self.broadcast = broadcast
+        self.recognizer_queue = asyncio.Queue(maxsize=recognizer_queue_size)
+        self.fanout_queue = asyncio.Queue(maxsize=fanout_queue_size)
+        self.mirror_watermark = mirror_watermark
+        self.interim_watermark = interim_watermark
+        self.low_watermark = low_watermark
+        self.step_interval = step_interval
+        self.level = NORMAL
+        self._last_step = 0.0
+        self._tasks = []
+        self.dropped = {"recognizer": 0, "fanout": 0, "mirror": 0, "interim": 0}
+        self.errors = 0
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._run_recognizer()),
+            asyncio.create_task(self._run_fanout()),
+        ]
+
+    async def stop(self, drain_timeout=1.0):
+        """Give queued work a moment to finish, then cancel the stage tasks."""
+        try:
+            await asyncio.wait_for(self._drained(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingest pipeline for call {self.call_id} stopped with work pending")
+        for task in self._tasks:
+            task.cancel()
+
+    async def _drained(self):
+        await self.recognizer_queue.join()
+        await self.fanout_queue.join()
+
+    def _fill(self, queue):
+        return queue.qsize() / queue.maxsize if queue.maxsize else 0.0
+
+    def _raise_level(self, level, pressure):
+        # Degrade at once, passing through every level below, so shedding always goes in order
+        now = time.monotonic()
+        while self.level < level:
+            self.level += 1
+            self._last_step = now
+            INGEST_DEGRADATIONS.labels(LEVEL_NAMES[self.level]).inc()
+            log = logger.error if self.level == DROPPING_AUDIO else logger.warning
+            log(f"Call {self.call_id} ingest degraded to {LEVEL_NAMES[self.level]} (pressure {pressure:.2f})")
+
+    def _update_level(self):
+        pressure = max(self._fill(self.recognizer_queue), self._fill(self.fanout_queue))
+        if pressure >= self.interim_watermark:
+            self._raise_level(NO_INTERIM, pressure)
+        elif pressure >= self.mirror_watermark:
+            self._raise_level(NO_AUDIO_MIRROR, pressure)
+        now = time.monotonic()
+        # Recovery is one step per interval so the level doesn't flap
+        if pressure <= self.low_watermark and self.level > NORMAL and now - self._last_step >= self.step_interval:
+            self.level -= 1
+            self._last_step = now
+            logger.info(f"Call {self.call_id} ingest recovered to {LEVEL_NAMES[self.level]}")
+
+    def _drop_oldest(self, queue, stage):
+        try:
+            queue.get_nowait()
+            queue.task_done()
+        except asyncio.QueueEmpty:
+            return
+        self.dropped[stage] += 1
+        INGEST_DROPS.labels(stage).inc()
+
+    def submit_audio(self, write):
+        """Queue a zero-argument callable that feeds audio towards the recognizer."""
+        self._update_level()
+        if self.recognizer_queue.full():
+            # Mirror and interims are already shed by now; losing audio is the last resort
+            self._raise_level(DROPPING_AUDIO, 1.0)
+            self._drop_oldest(self.recognizer_queue, "recognizer")
+        self.recognizer_queue.put_nowait(write)
+
+    def submit_mirror(self, message):
+        """Queue an audio mirror message for the UI; shed first under pressure."""
+        self._update_level()
+        if self.level >= NO_AUDIO_MIRROR:
+            self.dropped["mirror"] += 1
+            INGEST_DROPS.labels("mirror").inc()
+            return False
+        if self.fanout_queue.full():
+            self._drop_oldest(self.fanout_queue, "fanout")
+        self.fanout_queue.put_nowait(message)
+        return True
+
+    def allows_interim(self):
+        if self.level >= NO_INTERIM:
+            self.dropped["interim"] += 1
+            INGEST_DROPS.labels("interim").inc()
+            return False
+        return True
+
+    async def _run_recognizer(self):
+        while True:
+            write = await self.recognizer_queue.get()
+            try:
+                write()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error writing audio for call {self.call_id}: {str(e)}")
+            finally:
+                self.recognizer_queue.task_done()
+
+    async def _run_fanout(self):
+        while True:
+            message = await self.fanout_queue.get()
+            try:
+                await self.broadcast(message)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error fanning out audio for call {self.call_id}: {str(e)}")
+            finally:
+                self.fanout_queue.task_done()
+
+    def stats(self):
+        return {
+            "level": LEVEL_NAMES[self.level],
+            "recognizerQueue": self.recognizer_queue.qsize(),
+            "fanoutQueue": self.fanout_queue.qsize(),
+            "dropped": dict(self.dropped),
+            "errors": self.errors,
+        }
+
+
+class TranscriptQueue(Queue):
+    """Bounded hand-off of final transcript messages from Speech SDK threads to the sender thread."""
+
+    def __init__(self, maxsize=1000, interim_watermark=0.75):
+        super().__init__(maxsize=maxsize)
+        self.interim_watermark = interim_watermark
+        self.dropped = 0
+        self._dropping = False
+
+    def offer(self, item):
+        """Queue without blocking the caller; drops the oldest message when full."""
+        while True:
+            try:
+                self.put_nowait(item)
+                break
+            except Full:
+                try:
+                    self.get_nowait()
+                except Empty:
+                    continue
+                self.task_done()
+                self.dropped += 1
+                INGEST_DROPS.labels("transcript").inc()
+                if not self._dropping:
+                    self._dropping = True
+                    logger.error(f"Transcript queue full ({self.maxsize}); dropping the oldest final transcripts")
+        if self._dropping and not self.under_pressure():
+            self._dropping = False
+            logger.info("Transcript queue recovered")
+
+    def under_pressure(self):
+        return bool(self.maxsize) and self.qsize() >= self.maxsize * self.interim_watermark
+
+    def allows_interim(self):
+        if self.under_pressure():
+            INGEST_DROPS.labels("interim").inc()
+            return False
+        return True
+
+    def stats(self):
+        return {"queued": self.qsize(), "maxSize": self.maxsize, "dropped": self.dropped}
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a short sleep."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.lag = 0.0
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            # Smooth so a single hiccup doesn't flip admission decisions
+            self.lag = 0.8 * self.lag + 0.2 * lag
+            EVENT_LOOP_LAG.observe(lag)
+
+
+class AdmissionController:
+    def __init__(self, max_calls=50, max_loop_lag_ms=250, lag_monitor=None):
+        self.max_calls = max_calls
+        self.max_loop_lag = max_loop_lag_ms / 1000
+        self.lag_monitor = lag_monitor
+        self.calls = {}
+        self.draining = False  # set while the pod drains for a deployment
+
+    def check(self, call_id):
+        """Return a rejection reason for a new call, or None if it can be admitted."""
+        if call_id in self.calls:
+            return None
+        if self.draining:
+            reason = "draining"
+        elif self.max_calls and len(self.calls) >= self.max_calls:
+            reason = "max_calls"
+        elif self.lag_monitor and self.max_loop_lag and self.lag_monitor.lag > self.max_loop_lag:
+            reason = "event_loop_lag"
+        else:
+            return None
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        return reason
+
+    def admit(self, call_id):
+        self.calls[call_id] = self.calls.get(call_id, 0) + 1
+
+    def release(self, call_id):
+        remaining = self.calls.get(call_id, 0) - 1
+        if remaining > 0:
+            self.calls[call_id] = remaining
+        else:
+            self.calls.pop(call_id, None)
+
+    def stats(self):
+        return {
+            "activeCalls": len(self.calls),
+            "maxCalls": self.max_calls,
+            "draining": self.draining,
+            "loopLagMs": round(self.lag_monitor.lag * 1000, 2) if self.lag_monitor else None,
+        }
@@ -0,0 +1,139 @@
+"""Throttled streaming of interim (partial) recognition results to agents.
+
+The recognizer fires ``recognizing`` several times a second per speaker, from
+Speech SDK threads. ``InterimStreamer`` keeps only the latest hypothesis per
+(call, speaker) and a pump task on the event loop sends it out:
+
+- coalesced: a newer hypothesis replaces one that has not been sent yet;
+- one in flight: a key is not sent again until its previous send finished;
+- throttled: at most ``rate_hz`` updates per second per key.
+
+Each utterance has a segment id. Interim messages carry it with
+``"replaceable": true`` and the final ``transcription`` message carries the
+same id, so the UI replaces the partial line instead of appending a new one.
+``finalize()`` also discards any pending hypothesis for the segment, and a
+hypothesis whose segment was finalized while queued is never sent.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+
+from metrics import INTERIM_UPDATES
+
+logger = logging.getLogger(__name__)
+
+
+class InterimStreamer:
+    def __init__(self, send, rate_hz=4.0, tick_ms=25, send_timeout=1.0):
+        self.send = send
+        self.min_interval = 1.0 / rate_hz if rate_hz > 0 else 0.0
+        self.tick = tick_ms / 1000
+        self.send_timeout = send_timeout
+        self._lock = threading.Lock()
+        # Segment numbers are unique across calls so a reconnect never reuses one
+        self._segment_numbers = itertools.count(1)
+        self._segments = {}   # (call_id, speaker) -> current segment number
+        self._pending = {}    # (call_id, speaker) -> (segment, text)
+        self._in_flight = set()
+        self._last_sent = {}
+        self._tasks = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.superseded = 0
+
+    def _segment(self, key):
+        segment = self._segments.get(key)
+        if segment is None:
+            segment = self._segments[key] = next(self._segment_numbers)
+        return segment
+
+    def offer(self, call_id, speaker, text):
+        """Record the latest hypothesis for a speaker. Safe to call from any thread."""
+        if not text:
+            return
+        key = (call_id, speaker)
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+                INTERIM_UPDATES.labels("coalesced").inc()
+            self._pending[key] = (self._segment(key), text)
+
+    def finalize(self, call_id, speaker):
+        """Close the current segment and return its id for the final message."""
+        key = (call_id, speaker)
+        with self._lock:
+            segment = self._segment(key)
+            if self._pending.pop(key, None) is not None:
+                self.superseded += 1
+                INTERIM_UPDATES.labels("superseded").inc()
+            self._segments[key] = next(self._segment_numbers)
+        return f"{speaker}-{segment}"
+
+    def discard_call(self, call_id):
+        with self._lock:
+            for key in [key for key in self._segments if key[0] == call_id]:
+                self._segments.pop(key, None)
+                self._pending.pop(key, None)
+                self._last_sent.pop(key, None)
+
+    def _take_due(self, now):
+        due = []
+        with self._lock:
+            for key in list(self._pending):
+                if key in self._in_flight or now - self._last_sent.get(key, 0.0) < self.min_interval:
+                    continue
+                segment, text = self._pending.pop(key)
+                self._in_flight.add(key)
+                self._last_sent[key] = now
+                due.append((key, segment, text))
+        return due
+
+    async def _deliver(self, key, segment, text):
+        call_id, speaker = key
+        try:
+            with self._lock:
+                if self._segments.get(key) != segment:
+                    self.superseded += 1
+                    INTERIM_UPDATES.labels("superseded").inc()
+                    return
+            message = json.dumps({
+                "type": "interimTranscription",
+                "callId": call_id,
+                "speaker": speaker,
+                "segmentId": f"{speaker}-{segment}",
+                "text": text,
+                "replaceable": True,
+            })
+            await asyncio.wait_for(self.send(message), timeout=self.send_timeout)
+            self.sent += 1
+            INTERIM_UPDATES.labels("sent").inc()
+        except asyncio.TimeoutError:
+            INTERIM_UPDATES.labels("timeout").inc()
+            logger.debug(f"Interim update for call {call_id} timed out")
+        except Exception as e:
+            INTERIM_UPDATES.labels("error").inc()
+            logger.debug(f"Error sending interim update for call {call_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    async def run(self):
+        while True:
+            for key, segment, text in self._take_due(time.monotonic()):
+                # The loop only keeps weak references to tasks
+                task = asyncio.create_task(self._deliver(key, segment, text))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            await asyncio.sleep(self.tick)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "superseded": self.superseded,
+            "rateHz": round(1.0 / self.min_interval, 2) if self.min_interval else None,
+        }
@@ -0,0 +1,174 @@
+"""Per-call jitter buffer for inbound ACS media frames.
+
+ACS delivers each ``AudioData`` frame with a media ``timestamp`` and a
+``silent`` flag, but network bursts mean frames arrive unevenly and sometimes
+out of order. The buffer orders frames by timestamp and releases them on a
+fixed playout schedule (arrival of the first frame plus ``target_delay_ms``),
+one frame slot at a time:
+
+- frames that arrive after their slot was played out are late: dropped by the
+  "drop" policy, or released immediately by "passthrough";
+- slots whose frame never arrived (while later frames did) are lost: filled
+  with silence by the "silence" policy, or skipped by "skip";
+- frames flagged ``silent`` are released as zeros of the slot length.
+
+Statistics include an RFC 3550 style interarrival jitter estimate.
+"""
+import heapq
+from datetime import datetime
+
+LATE_POLICIES = ("drop", "passthrough")
+GAP_POLICIES = ("silence", "skip")
+
+
+def parse_media_timestamp(value):
+    """Convert an ACS ISO-8601 timestamp to seconds, or None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class JitterBuffer:
+    def __init__(self, sample_rate=24000, frame_ms=20, target_delay_ms=60, max_delay_ms=400,
+                 late_policy="drop", gap_policy="silence", max_gap_fill_ms=500):
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"Unsupported late frame policy: {late_policy}")
+        if gap_policy not in GAP_POLICIES:
+            raise ValueError(f"Unsupported gap policy: {gap_policy}")
+        self.sample_rate = sample_rate
+        self.frame_duration = frame_ms / 1000
+        self.target_delay = target_delay_ms / 1000
+        self.max_delay = max_delay_ms / 1000
+        self.late_policy = late_policy
+        self.gap_policy = gap_policy
+        self.max_gap_fill = max_gap_fill_ms / 1000
+        self._heap = []
+        self._seq = 0
+        self._base_media = None
+        self._base_wall = None
+        self._next_ts = None
+        self._highest_ts = None
+        self._last_transit = None
+        self._jitter = 0.0
+        self._starved = False
+        self.received = 0
+        self.released = 0
+        self.late = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.lost = 0
+        self.silent = 0
+        self.underruns = 0
+        self.resyncs = 0
+
+    def _frame_bytes(self, duration):
+        return int(round(duration * self.sample_rate)) * 2
+
+    def _playout_time(self, media_ts):
+        return self._base_wall + (media_ts - self._base_media)
+
+    def _resync(self, media_ts, arrival):
+        self._base_media = media_ts
+        self._base_wall = arrival + self.target_delay
+        self._next_ts = media_ts
+
+    def push(self, media_ts, payload, silent=False, arrival=None):
+        """Queue a frame. Returns frames to release right away (late passthrough only)."""
+        arrival = arrival if arrival is not None else media_ts
+        media_ts = media_ts if media_ts is not None else arrival
+        self.received += 1
+
+        transit = arrival - media_ts
+        if self._last_transit is not None:
+            self._jitter += (abs(transit - self._last_transit) - self._jitter) / 16
+        self._last_transit = transit
+
+        if self._base_media is None:
+            self._resync(media_ts, arrival)
+        if self._highest_ts is not None and media_ts < self._highest_ts:
+            self.reordered += 1
+        self._highest_ts = media_ts if self._highest_ts is None else max(self._highest_ts, media_ts)
+
+        if silent:
+            self.silent += 1
+            payload = bytes(len(payload) or self._frame_bytes(self.frame_duration))
+        if payload:
+            self.frame_duration = len(payload) / 2 / self.sample_rate
+
+        if media_ts < self._next_ts - self.frame_duration / 2:
+            self.late += 1
+            return [payload] if self.late_policy == "passthrough" else []
+
+        if not self._heap and media_ts - self._next_ts > self.max_gap_fill:
+            # Stream restarted after a long pause; don't synthesize the whole gap
+            self.resyncs += 1
+            self._resync(media_ts, arrival)
+
+        heapq.heappush(self._heap, (media_ts, self._seq, payload))
+        self._seq += 1
+        return []
+
+    def pop_due(self, now):
+        """Release every frame whose playout slot has arrived by ``now``."""
+        released = []
+        if self._base_media is None:
+            return released
+        # A backlog beyond max_delay means the sender runs ahead of our clock; catch up
+        if self._heap and self._highest_ts - self._next_ts > self.max_delay:
+            self.resyncs += 1
+            self._base_wall = now + self.target_delay - (self._highest_ts - self._base_media)
+        while self._playout_time(self._next_ts) <= now:
+            if not self._heap:
+                if not self._starved:
+                    self.underruns += 1
+                    self._starved = True
+                # Slide the schedule so an idle sender doesn't count as loss
+                self._base_wall = now + self.frame_duration - (self._next_ts - self._base_media)
+                break
+            self._starved = False
+            media_ts, _, payload = self._heap[0]
+            half_frame = self.frame_duration / 2
+            if media_ts < self._next_ts - half_frame:
+                heapq.heappop(self._heap)
+                self.duplicates += 1
+                continue
+            if media_ts <= self._next_ts + half_frame:
+                heapq.heappop(self._heap)
+                released.append(payload)
+                self.released += 1
+                self._next_ts = media_ts + len(payload) / 2 / self.sample_rate
+                continue
+            # The expected frame is missing but later ones are here
+            self.lost += 1
+            if self.gap_policy == "silence":
+                released.append(bytes(self._frame_bytes(self.frame_duration)))
+            self._next_ts += self.frame_duration
+        return released
+
+    def flush(self):
+        """Drain whatever is buffered, in timestamp order."""
+        frames = [payload for _, _, payload in sorted(self._heap)]
+        self.released += len(frames)
+        self._heap = []
+        return frames
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "released": self.released,
+            "buffered": len(self._heap),
+            "late": self.late,
+            "duplicates": self.duplicates,
+            "reordered": self.reordered,
+            "lost": self.lost,
+            "lossRatio": self.lost / (self.released + self.lost) if self.released + self.lost else 0.0,
+            "silent": self.silent,
+            "underruns": self.underruns,
+            "resyncs": self.resyncs,
+            "jitterMs": round(self._jitter * 1000, 2),
+            "latePolicy": self.late_policy,
+            "gapPolicy": self.gap_policy,
+        }
@@ -0,0 +1,271 @@
+"""Local knowledge index: BM25 over an inverted index, optionally fused with embeddings.
+
+An offline alternative to Azure AI Search for ``fetch_relevant_documents_handler``
+(select it with RETRIEVAL_BACKEND=local). Build the index once from a directory
+of .txt/.md documents:
+
+    python knowledge.py build --docs ./knowledge --out ./knowledge_index [--embeddings]
+    python knowledge.py query --index ./knowledge_index "how do I return an item"
+
+Documents are split into overlapping word windows ("chunks"), the unit that is
+scored and returned, like the ``content`` field of the Azure index. Everything
+is stored as flat .npy arrays plus a UTF-8 blob, and ``KnowledgeIndex.load()``
+memory-maps them, so a worker starts without parsing or copying the index:
+
+- vocab.json:         term list; position = term id
+- term_offsets.npy:   int64 [n_terms + 1], slice of the postings for each term
+- postings_doc.npy:   int32 chunk ids, grouped by term
+- postings_tf.npy:    float32 term frequencies, parallel to postings_doc
+- doc_lengths.npy:    float32 chunk lengths in tokens
+- content.bin / content_offsets.npy: chunk text
+- sources.json:       source file of each chunk
+- embeddings.npy:     optional float32 [n_chunks, dim], L2-normalized
+
+With embeddings, BM25 and cosine rankings are merged by reciprocal rank
+fusion. Query embeddings come from an Azure OpenAI embedding deployment
+(AZURE_OPENAI_EMBEDDING_MODEL); without one, search is BM25 only.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its me my of on or our so that the "
+    "their there this to was we were what when where which will with you your".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=200, overlap_words=40):
+    words = text.split()
+    if not words:
+        return []
+    step = max(chunk_words - overlap_words, 1)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, max(len(words) - overlap_words, 1), step)]
+
+
+def read_documents(doc_dir):
+    """Yield (relative path, text) for every document under doc_dir, in a stable order."""
+    for root, dirs, files in os.walk(doc_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    yield os.path.relpath(path, doc_dir), f.read()
+
+
+def azure_openai_embedder(deployment=None):
+    """Return a texts -> float32 matrix function backed by Azure OpenAI, or None if unconfigured."""
+    deployment = deployment or os.getenv("AZURE_OPENAI_EMBEDDING_MODEL")
+    if not deployment:
+        return None
+    from openai import AzureOpenAI
+    client = AzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version="2024-12-01-preview",
+    )
+
+    def embed(texts, batch_size=64):
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            response = client.embeddings.create(model=deployment, input=texts[start:start + batch_size])
+            vectors.extend(item.embedding for item in response.data)
+        return np.asarray(vectors, dtype=np.float32)
+    return embed
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def build_index(doc_dir, out_dir, embed=None, chunk_words=200, overlap_words=40):
+    """Chunk, tokenize and write an index for doc_dir into out_dir. Returns the chunk count."""
+    chunks, sources = [], []
+    for source, text in read_documents(doc_dir):
+        for chunk in chunk_text(text, chunk_words, overlap_words):
+            chunks.append(chunk)
+            sources.append(source)
+
+    vocab = {}
+    postings = []  # per term: list of (chunk id, tf)
+    doc_lengths = np.zeros(len(chunks), dtype=np.float32)
+    for chunk_id, chunk in enumerate(chunks):
+        tokens = tokenize(chunk)
+        doc_lengths[chunk_id] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            term_id = vocab.setdefault(term, len(vocab))
+            if term_id == len(postings):
+                postings.append([])
+            postings[term_id].append((chunk_id, tf))
+
+    term_offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(p) for p in postings])
+    postings_doc = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(term_offsets[-1]))
+    postings_tf = np.fromiter((tf for p in postings for _, tf in p), dtype=np.float32, count=int(term_offsets[-1]))
+
+    encoded = [chunk.encode("utf-8") for chunk in chunks]
+    content_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    content_offsets[1:] = np.cumsum([len(e) for e in encoded])
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "term_offsets.npy"), term_offsets)
+    np.save(os.path.join(out_dir, "postings_doc.npy"), postings_doc)
+    np.save(os.path.join(out_dir, "postings_tf.npy"), postings_tf)
+    np.save(os.path.join(out_dir, "doc_lengths.npy"), doc_lengths)
+    np.save(os.path.join(out_dir, "content_offsets.npy"), content_offsets)
+    with open(os.path.join(out_dir, "content.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(out_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(sorted(vocab, key=vocab.get), f)
+    with open(os.path.join(out_dir, "sources.json"), "w", encoding="utf-8") as f:
+        json.dump(sources, f)
+    embeddings_path = os.path.join(out_dir, "embeddings.npy")
+    if embed is not None and chunks:
+        np.save(embeddings_path, _normalize_rows(embed(chunks)))
+    elif os.path.exists(embeddings_path):
+        os.remove(embeddings_path)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": FORMAT_VERSION,
+            "chunks": len(chunks),
+            "terms": len(vocab),
+            "chunkWords": chunk_words,
+            "overlapWords": overlap_words,
+            "embeddings": embed is not None,
+        }, f)
+    logger.info(f"Built knowledge index with {len(chunks)} chunks and {len(vocab)} terms in {out_dir}")
+    return len(chunks)
+
+
+class KnowledgeIndex:
+    def __init__(self, index_dir, embed=None, k1=1.2, b=0.75, rrf_k=60):
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported knowledge index version in {index_dir}: {self.meta.get('version')}")
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.term_offsets = load("term_offsets.npy")
+        self.postings_doc = load("postings_doc.npy")
+        self.postings_tf = load("postings_tf.npy")
+        self.doc_lengths = load("doc_lengths.npy")
+        self.content_offsets = load("content_offsets.npy")
+        content_path = os.path.join(index_dir, "content.bin")
+        self.content = np.memmap(content_path, dtype=np.uint8, mode="r") if os.path.getsize(content_path) else b""
+        with open(os.path.join(index_dir, "vocab.json"), encoding="utf-8") as f:
+            self.vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+        with open(os.path.join(index_dir, "sources.json"), encoding="utf-8") as f:
+            self.sources = json.load(f)
+        embeddings_path = os.path.join(index_dir, "embeddings.npy")
+        self.embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+        self.embed = embed if self.embeddings is not None else None
+        self.k1 = k1
+        self.b = b
+        self.rrf_k = rrf_k
+        self.n_chunks = len(self.doc_lengths)
+        self.avg_length = float(np.mean(self.doc_lengths)) if self.n_chunks else 0.0
+        # BM25 length normalization per chunk, computed once rather than per query
+        self._length_norm = k1 * (1 - b + b * np.asarray(self.doc_lengths) / max(self.avg_length, 1e-9))
+
+    @classmethod
+    def load(cls, index_dir, embed=None, **kwargs):
+        return cls(index_dir, embed=embed, **kwargs)
+
+    def chunk(self, chunk_id):
+        start, end = self.content_offsets[chunk_id], self.content_offsets[chunk_id + 1]
+        return bytes(self.content[start:end]).decode("utf-8")
+
+    def bm25_scores(self, query):
+        scores = np.zeros(self.n_chunks, dtype=np.float32)
+        if not self.n_chunks:
+            return scores
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            df = end - start
+            idf = np.log(1 + (self.n_chunks - df + 0.5) / (df + 0.5))
+            # Each chunk appears once per term, so plain fancy-index accumulation is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def vector_scores(self, query):
+        vector = _normalize_rows(np.asarray(self.embed([query]), dtype=np.float32))[0]
+        return np.asarray(self.embeddings @ vector)
+
+    def search(self, query, top=5):
+        """Return the top chunks as dicts with content, source, chunk id and score."""
+        bm25 = self.bm25_scores(query)
+        ranked = [chunk_id for chunk_id in _top_k(bm25, top * 4 if self.embed else top) if bm25[chunk_id] > 0]
+        scores = {chunk_id: float(bm25[chunk_id]) for chunk_id in ranked}
+        if self.embed is not None:
+            cosine = self.vector_scores(query)
+            fused = {}
+            for ranking in (ranked, _top_k(cosine, top * 4)):
+                for rank, chunk_id in enumerate(ranking):
+                    fused[int(chunk_id)] = fused.get(int(chunk_id), 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            scores = fused
+            ranked = sorted(fused, key=fused.get, reverse=True)
+        return [
+            {"content": self.chunk(chunk_id), "source": self.sources[chunk_id], "chunk": int(chunk_id), "score": scores[chunk_id]}
+            for chunk_id in ranked[:top]
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local knowledge index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build")
+    build.add_argument("--docs", required=True, help="directory of .txt/.md documents")
+    build.add_argument("--out", required=True, help="index directory to write")
+    build.add_argument("--chunk-words", type=int, default=200)
+    build.add_argument("--overlap-words", type=int, default=40)
+    build.add_argument("--embeddings", action="store_true", help="also embed chunks via AZURE_OPENAI_EMBEDDING_MODEL")
+    query = commands.add_parser("query")
+    query.add_argument("--index", required=True)
+    query.add_argument("--top", type=int, default=5)
+    query.add_argument("text")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "build":
+        embed = None
+        if args.embeddings:
+            embed = azure_openai_embedder()
+            if embed is None:
+                parser.error("--embeddings requires AZURE_OPENAI_EMBEDDING_MODEL")
+        build_index(args.docs, args.out, embed=embed, chunk_words=args.chunk_words, overlap_words=args.overlap_words)
+    else:
+        index = KnowledgeIndex.load(args.index, embed=azure_openai_embedder())
+        for hit in index.search(args.text, top=args.top):
+            print(f"{hit['score']:.4f}  {hit['source']}#{hit['chunk']}  {hit['content'][:120]}")
+
+
+if __name__ == "__main__":
+    main()
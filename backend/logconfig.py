@@ -0,0 +1,185 @@
+"""Non-blocking, sampled and rate-limited logging for the hot paths.
+
+``configure_logging()`` replaces the root handlers with a ``QueueHandler`` so
+the Speech SDK callback threads and the event loop only pay for a filter check
+and a ``put_nowait``; formatting and I/O happen on a ``QueueListener`` thread.
+When the queue is full, records are dropped rather than blocking the caller.
+
+Records are filtered per category (the logger name, matched by longest
+dotted prefix) before they are queued:
+
+- LOG_SAMPLING="transcript.interim=0.05,oai.tools=0.5" keeps that fraction;
+- LOG_RATE_LIMITS="transcript=20,llm=5" caps records per second (token bucket).
+
+Warnings and errors are never sampled or rate limited.
+
+LOG_FORMAT=json emits one JSON object per line. Transcript text, prompts, tool
+payloads and phone numbers are passed as ``extra`` fields (see SENSITIVE_FIELDS)
+rather than in the message, so LOG_REDACT_TRANSCRIPTS=1 can replace them with
+their length.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+
+from metrics import LOG_DROPS
+
+SENSITIVE_FIELDS = ("transcript", "conversation", "prompt", "response", "arguments", "phone_number", "caller_id")
+CONTEXT_FIELDS = ("call_id", "client_id", "speaker", "tool", "event", "turns", "duration_ms",
+                  "prompt_tokens", "cached_tokens") + SENSITIVE_FIELDS
+
+_listener = None
+
+
+def _parse_mapping(value):
+    mapping = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            key, _, number = item.partition("=")
+            mapping[key.strip()] = float(number)
+    return mapping
+
+
+def _category_setting(settings, name):
+    """Longest dotted-prefix match of a logger name against configured categories.
+
+    Returns ``(category, setting)``, or ``(None, None)`` when nothing matches.
+    """
+    while name:
+        if name in settings:
+            return name, settings[name]
+        name = name.rpartition(".")[0]
+    if "*" in settings:
+        return "*", settings["*"]
+    return None, None
+
+
+class CategoryFilter(logging.Filter):
+    def __init__(self, sampling=None, rate_limits=None):
+        super().__init__()
+        self.sampling = sampling or {}
+        self.rate_limits = rate_limits or {}
+        # category -> [tokens, last refill]; updates race benignly across threads
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        category, rate = _category_setting(self.sampling, record.name)
+        if rate is not None and random.random() >= rate:
+            LOG_DROPS.labels(category, "sampled").inc()
+            return False
+        # One bucket per configured category, shared by every logger beneath it
+        category, limit = _category_setting(self.rate_limits, record.name)
+        if limit is not None:
+            now = time.monotonic()
+            bucket = self._buckets.get(category)
+            if bucket is None:
+                bucket = self._buckets[category] = [limit, now]
+            bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            if bucket[0] < 1:
+                LOG_DROPS.labels(category, "rate_limited").inc()
+                return False
+            bucket[0] -= 1
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only merge args on the caller's thread; formatting happens on the listener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPS.labels(record.name, "queue_full").inc()
+
+
+def _redact(value):
+    return f"<redacted {len(str(value))} chars>"
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, redact=False):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            if hasattr(record, field):
+                value = getattr(record, field)
+                entry[field] = _redact(value) if self.redact and field in SENSITIVE_FIELDS else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, redact=False):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self.redact = redact
+
+    def format(self, record):
+        line = super().format(record)
+        context = []
+        for field in CONTEXT_FIELDS:
+            if hasattr(record, field):
+                value = getattr(record, field)
+                value = _redact(value) if self.redact and field in SENSITIVE_FIELDS else value
+                context.append(f"{field}={value!r}" if isinstance(value, str) else f"{field}={value}")
+        return f"{line} | {' '.join(context)}" if context else line
+
+
+def configure_logging(level=None, log_format=None, redact=None, sampling=None, rate_limits=None, queue_size=None):
+    """Install the queue-based pipeline on the root logger. Safe to call more than once."""
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    log_format = log_format or os.getenv("LOG_FORMAT", "text")
+    if redact is None:
+        redact = os.getenv("LOG_REDACT_TRANSCRIPTS", "0").lower() in ("1", "true", "yes")
+    sampling = sampling if sampling is not None else _parse_mapping(os.getenv("LOG_SAMPLING", "transcript.interim=0.05"))
+    rate_limits = rate_limits if rate_limits is not None else _parse_mapping(os.getenv("LOG_RATE_LIMITS", "transcript=50,llm=10,oai=20"))
+    queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    if _listener is not None:
+        _listener.stop()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter(redact) if log_format == "json" else TextFormatter(redact))
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(CategoryFilter(sampling, rate_limits))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
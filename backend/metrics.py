@@ -0,0 +1,342 @@
+"""Prometheus-style metrics for the realtime agent assist backend.
+
+The audio path updates counters for every frame from the event loop and the
+Speech SDK callback threads, so the primitives here avoid locks on update:
+each thread accumulates into its own cell and cells are only summed when
+``/metrics`` is scraped. Locks are taken once per thread (cell registration)
+and once per new label combination, never per observation.
+
+Usage:
+    from metrics import AUDIO_FRAMES
+    AUDIO_FRAMES.labels("customer", "in").inc()
+
+The text returned by ``REGISTRY.render()`` follows the Prometheus text
+exposition format (version 0.0.4).
+"""
+import bisect
+import itertools
+import math
+import threading
+import time
+import weakref
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _CellOwner:
+    """Keeps a thread's cell registered; collected with the thread's locals when the thread ends."""
+    __slots__ = ("__weakref__",)
+
+
+class _ThreadCells:
+    """Per-thread accumulator slots that are merged on read.
+
+    The cell of a thread that has ended is folded into ``_retired``, so short-lived
+    threads (to_thread, executors, SDK callbacks) don't leave a cell behind each.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._cells = {}
+        self._retired = [0] * size
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self._size
+            owner = _CellOwner()
+            key = next(self._ids)
+            with self._lock:
+                self._cells[key] = cell
+            weakref.finalize(owner, self._retire, key).atexit = False
+            self._local.owner = owner
+            self._local.cell = cell
+            return cell
+
+    def _retire(self, key):
+        with self._lock:
+            cell = self._cells.pop(key, None)
+            if cell is not None:
+                for i in range(self._size):
+                    self._retired[i] += cell[i]
+
+    def totals(self):
+        with self._lock:
+            cells = list(self._cells.values())
+            retired = list(self._retired)
+        return [retired[i] + sum(cell[i] for cell in cells) for i in range(self._size)]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = [(tuple(str(v) for v in key), child) for key, child in self._children.items()]
+        for key, child in sorted(children, key=lambda item: item[0]):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    def value(self):
+        return self._cells.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, key, child):
+        yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value())}"
+
+
+class _GaugeChild:
+    __slots__ = ("_cells", "_function")
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+        self._function = None
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    def dec(self, amount=1):
+        self._cells.cell()[0] -= amount
+
+    def set_function(self, function):
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._cells.totals()[0]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def _render_child(self, key, child):
+        yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value())}"
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "_cells")
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # one slot per bucket, one for +Inf, one for the running sum
+        self._cells = _ThreadCells(len(buckets) + 2)
+
+    def observe(self, value):
+        cell = self._cells.cell()
+        cell[bisect.bisect_left(self._buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        totals = self._cells.totals()
+        return totals[:-1], totals[-1]
+
+
+class _Timer:
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, key, child):
+        counts, total = child.snapshot()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(float(total))}"
+        yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Calls and sockets
+ACTIVE_CALLS = Gauge("agent_assist_active_calls", "Calls with an open audio WebSocket.")
+ACTIVE_SOCKETS = Gauge("agent_assist_active_sockets", "Open WebSocket connections.", ["kind"])
+
+# Audio hot path
+AUDIO_FRAMES = Counter("agent_assist_audio_frames_total", "Audio frames handled.", ["channel", "direction"])
+AUDIO_BYTES = Counter("agent_assist_audio_bytes_total", "Audio payload bytes handled.", ["channel", "direction"])
+RECOGNIZER_EVENTS = Counter("agent_assist_recognizer_events_total", "Speech recognizer events.", ["speaker", "event"])
+
+# UI fan-out
+MESSAGE_QUEUE_DEPTH = Gauge("agent_assist_message_queue_depth", "Messages waiting in message_queue.")
+MESSAGE_QUEUE_DWELL = Histogram("agent_assist_message_queue_dwell_seconds", "Time a message waits in message_queue.")
+WS_SEND_LATENCY = Histogram("agent_assist_ws_send_seconds", "WebSocket send latency.", ["path"])
+WS_SEND_FAILURES = Counter("agent_assist_ws_send_failures_total", "Failed WebSocket sends.", ["path", "reason"])
+INTERIM_UPDATES = Counter("agent_assist_interim_updates_total", "Interim transcript updates by outcome.", ["outcome"])
+
+# LLM and tools
+LLM_REQUESTS = Counter("agent_assist_llm_requests_total", "Chat completion requests.", ["outcome"])
+LLM_TOKENS = Counter("agent_assist_llm_tokens_total", "Chat completion tokens.", ["kind"])
+LLM_LATENCY = Histogram("agent_assist_llm_latency_seconds", "Chat completion latency.", ["stage"],
+                        buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+TOOL_LATENCY = Histogram("agent_assist_tool_latency_seconds", "Tool handler latency.", ["tool"])
+TOOL_CALLS = Counter("agent_assist_tool_calls_total", "Tool handler invocations.", ["tool", "outcome"])
+PREFETCH_EVENTS = Counter("agent_assist_prefetch_events_total", "Speculative tool prefetch events.", ["outcome"])
+ENTITIES_DETECTED = Counter("agent_assist_entities_detected_total", "Identifiers detected in transcripts.", ["kind"])
+LLM_QUEUE_TIME = Histogram("agent_assist_llm_queue_seconds", "Time a completion waits for a scheduler slot.", ["priority"])
+LLM_QUEUE_DEPTH = Gauge("agent_assist_llm_queue_depth", "Completions waiting for a scheduler slot.", ["priority"])
+LLM_SCHEDULED = Counter("agent_assist_llm_scheduled_total", "Scheduler decisions.", ["priority", "outcome"])
+LLM_DEDUPED = Counter("agent_assist_llm_deduplicated_total", "Requests served by an identical in-flight completion.")
+
+# Sentiment
+SENTIMENT_CALLS = Counter("agent_assist_sentiment_calls_total", "Sentiment analysis requests.", ["backend", "outcome"])
+
+# Ingest backpressure and admission control
+INGEST_DROPS = Counter("agent_assist_ingest_drops_total", "Items shed by the ingest pipeline.", ["stage"])
+INGEST_DEGRADATIONS = Counter("agent_assist_ingest_degradations_total", "Ingest degradation steps.", ["level"])
+ADMISSION_REJECTIONS = Counter("agent_assist_admission_rejections_total", "Calls rejected at admission.", ["reason"])
+EVENT_LOOP_LAG = Histogram("agent_assist_event_loop_lag_seconds", "Event loop wake-up lag.")
+
+# Logging pipeline
+LOG_DROPS = Counter("agent_assist_log_drops_total", "Log records dropped before output.", ["category", "reason"])
+
+# Post-call wrap-up
+WRAPUP_JOBS = Counter("agent_assist_wrapup_jobs_total", "Wrap-up job attempts by outcome.", ["outcome"])
+WRAPUP_DURATION = Histogram("agent_assist_wrapup_duration_seconds", "Time to produce a call wrap-up.",
+                            buckets=(1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+WRAPUP_QUEUE_DEPTH = Gauge("agent_assist_wrapup_queue_depth", "Wrap-up jobs waiting to run.")
+
+# Conversation analytics
+ANALYTICS_FRAMES = Counter("agent_assist_analytics_frames_total", "Audio frames analysed for conversation analytics.", ["speaker"])
+ANALYTICS_LATENCY = Histogram("agent_assist_analytics_seconds", "Conversation analytics time per audio chunk.",
+                              buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+
+# ACS callbacks
+CALLBACK_EVENTS = Counter("agent_assist_callback_events_total", "ACS callback events by outcome.", ["event", "outcome"])
+CALLBACK_LATENCY = Histogram("agent_assist_callback_latency_seconds", "Time from receiving a callback event to handling it.")
+CALLBACK_QUEUE_DEPTH = Gauge("agent_assist_callback_queue_depth", "Callback events waiting to be handled.")
+ACS_CACHE_LOOKUPS = Counter("agent_assist_acs_cache_lookups_total", "Cached ACS lookups.", ["outcome"])
+
+# Graceful drain
+DRAINING = Gauge("agent_assist_draining", "1 while the pod is draining for a deployment.")
+DRAIN_CHECKPOINTS = Counter("agent_assist_drain_checkpoints_total", "Call checkpoints saved while draining.", ["outcome"])
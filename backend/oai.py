@@ -2,17 +2,20 @@ import json
 import random
 from datetime import datetime, timedelta
 import asyncio
-from openai import AzureOpenAI, OpenAI
 import os
 import re
 import base64
+import time
 import logging
+from metrics import LLM_REQUESTS, LLM_TOKENS, LLM_LATENCY, TOOL_LATENCY, TOOL_CALLS
+from scheduler import estimate_tokens
 logging.basicConfig(  
     level=logging.INFO,  
     format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",  
     datefmt="%Y-%m-%d %H:%M:%S",  
 )  
 logger = logging.getLogger(__name__)  
+tool_logger = logging.getLogger(f"{__name__}.tools")
 model_provider = os.getenv("MODEL_PROVIDER", "aoai")
 
 # from azure.monitor.opentelemetry.exporter import AzureMonitorTraceExporter
@@ -40,6 +43,8 @@ model_provider = os.getenv("MODEL_PROVIDER", "aoai")
  
 class ChatClient:
     def __init__(self, language, out_queue, tools = []) -> None:
+        # Imported here so loading this module doesn't pull in the OpenAI SDK
+        from openai import AzureOpenAI
         self.out_queue = out_queue
         self.client = AzureOpenAI(
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
@@ -48,12 +53,78 @@ class ChatClient:
         )
         self.deployment_name = os.environ["AZURE_OPENAI_MODEL"]
         self.tools = tools if tools else []
-        logger.info(f"Tools: {self.tools} Type: {type(self.tools)}")
-        self.available_functions = []
+        logger.info("Chat client ready with %d tools", len(self.tools))
+        from tools import tools_mapping
+        self.available_functions = tools_mapping  # tool name -> handler, used when tools are configured
         self.messages = []
         self.system_prompt = ""
+        self.prefetcher = None  # optional prefetch.ToolPrefetcher
+        self.scheduler = None  # optional scheduler.LLMScheduler
+
+    def create_response_stream(self, temperature, messages=None):
+        """Start a streamed completion over messages (default self.messages) and return it with its start time."""
+        started = time.perf_counter()
+        try:
+            response_stream = self.client.chat.completions.create(
+                model=self.deployment_name,
+                messages=self.messages if messages is None else messages,
+                tools=self.tools,
+                parallel_tool_calls=False,
+                stream=True,
+                stream_options={"include_usage": True},
+                temperature=temperature
+            )
+        except Exception:
+            LLM_REQUESTS.labels("error").inc()
+            raise
+        LLM_REQUESTS.labels("ok").inc()
+        return response_stream, started
+
+    async def open_response_stream(self, temperature, priority="normal", call_id=None, messages=None):
+        """Wait for a scheduler slot (if any), then start a completion. Returns (stream, started, ticket)."""
+        messages = self.messages if messages is None else messages
+        ticket = None
+        if self.scheduler:
+            ticket = await self.scheduler.acquire(priority, call_id, estimate_tokens(messages))
+        try:
+            response_stream, started = self.create_response_stream(temperature, messages)
+        except Exception as e:
+            if ticket:
+                ticket.release()
+            if self.scheduler and getattr(e, "status_code", None) == 429:
+                self.scheduler.pause(self.retry_after(e))
+            raise
+        return response_stream, started, ticket
+
+    @staticmethod
+    def retry_after(error, default=1.0):
+        try:
+            return float(error.response.headers.get("retry-after", default))
+        except (AttributeError, TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def record_usage(usage, ticket=None, totals=None):
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels("prompt_cached").inc(cached)
+        LLM_TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+        if ticket:
+            ticket.used_tokens = usage.total_tokens or 0
+        if totals is not None:
+            totals["promptTokens"] = totals.get("promptTokens", 0) + (usage.prompt_tokens or 0)
+            totals["cachedTokens"] = totals.get("cachedTokens", 0) + cached
+            totals["completionTokens"] = totals.get("completionTokens", 0) + (usage.completion_tokens or 0)
+
+    def drain_usage(self, response_stream, ticket=None, totals=None):
+        # With include_usage the token counts arrive in a final chunk after finish_reason
+        for part in response_stream:
+            if getattr(part, "usage", None):
+                self.record_usage(part.usage, ticket, totals)
         
-    async def process_response_stream(self, response_stream, temperature=0):
+    async def process_response_stream(self, response_stream, temperature=0, started=None, call_id=None,
+                                      ticket=None, priority="normal", messages=None, usage=None):
         """
         Recursively process response streams to handle multiple sequential function calls.
         This function can call itself when a function call is completed to handle subsequent function calls.
@@ -63,10 +134,18 @@ class ChatClient:
         tool_call_id = ""
         is_collecting_function_args = False
         collected_messages = []
+        started = started or time.perf_counter()
+        first_token_seen = False
+        messages = self.messages if messages is None else messages
        
         for part in response_stream:
+            if getattr(part, "usage", None):
+                self.record_usage(part.usage, ticket, usage)
             if part.choices == []:
                 continue
+            if not first_token_seen:
+                first_token_seen = True
+                LLM_LATENCY.labels("first_token").observe(time.perf_counter() - started)
             delta = part.choices[0].delta
             finish_reason = part.choices[0].finish_reason
            
@@ -92,12 +171,15 @@ class ChatClient:
            
             # Check if we've reached the end of a tool call
             if finish_reason == "tool_calls" and is_collecting_function_args:
+                LLM_LATENCY.labels("total").observe(time.perf_counter() - started)
+                self.drain_usage(response_stream, ticket, usage)
+                if ticket:
+                    ticket.release()
                 # Process the current tool call
-                logger.info(f"function_arguments: {function_arguments}")
+                tool_logger.info("Tool call requested", extra={"tool": function_name, "arguments": function_arguments})
                 function_args = json.loads(function_arguments)
                 function_to_call = self.available_functions[function_name]
                 reply_to_customer = function_args.get('reply_to_customer')
-                logger.info(f"reply_to_customer: {reply_to_customer}")
                 # Output any replies to the customer
                 if reply_to_customer:
                     tokens = re.findall(r'\s+|\w+|[^\w\s]', reply_to_customer)
@@ -105,7 +187,7 @@ class ChatClient:
                         yield token
                
                 # Add the assistant message with tool call
-                self.messages.append({
+                messages.append({
                     "role": "assistant",
                     "content": reply_to_customer,
                     "tool_calls": [
@@ -120,14 +202,31 @@ class ChatClient:
                     ]
                 })
                
-                # Execute the function
+                # Execute the function, unless the transcript already warmed its result
                 function_args['out_queue'] = self.out_queue
-                logger.info(f"Function Name: {function_name} Function Args: {function_args}")
-                func_response = await function_to_call(**function_args)
-                logger.info(f"Function Response: {func_response}")
+                tool_started = time.perf_counter()
+                prefetched = self.prefetcher.lookup(call_id, function_name, function_args) if self.prefetcher else None
+                func_response = None
+                if prefetched is not None:
+                    try:
+                        func_response = await prefetched
+                        TOOL_LATENCY.labels(function_name).observe(time.perf_counter() - tool_started)
+                        TOOL_CALLS.labels(function_name, "prefetched").inc()
+                    except Exception as e:
+                        tool_logger.warning(f"Prefetched {function_name} failed, calling it directly: {str(e)}")
+                if func_response is None:
+                    try:
+                        func_response = await function_to_call(**function_args)
+                    except Exception:
+                        TOOL_CALLS.labels(function_name, "error").inc()
+                        raise
+                    finally:
+                        TOOL_LATENCY.labels(function_name).observe(time.perf_counter() - tool_started)
+                    TOOL_CALLS.labels(function_name, "ok").inc()
+                tool_logger.info("Tool call completed", extra={"tool": function_name, "response": func_response})
                
                 # Add the tool response
-                self.messages.append({
+                messages.append({
                     "tool_call_id": tool_call_id,
                     "role": "tool",
                     "name": function_name,
@@ -135,64 +234,104 @@ class ChatClient:
                 })
                
                 # Create a new stream to continue processing and potentially handle more function calls
-                new_response_stream = self.client.chat.completions.create(
-                    model=self.deployment_name,
-                    messages=self.messages,
-                    tools=self.tools,
-                    parallel_tool_calls=False,
-                    stream=True,
-                    temperature=temperature
-                )
+                # The follow-up completion continues the same turn, so it keeps its priority
+                new_response_stream, new_started, new_ticket = await self.open_response_stream(temperature, priority, call_id, messages)
                
                 # Recursively process the new stream to handle additional function calls
-                async for token in self.process_response_stream(new_response_stream, temperature):
-                    yield token
+                try:
+                    async for token in self.process_response_stream(new_response_stream, temperature, new_started, call_id,
+                                                                    new_ticket, priority, messages, usage):
+                        yield token
+                finally:
+                    if new_ticket:
+                        new_ticket.release()
                
                 # After recursive processing is complete, we're done
                 return
            
             # Check if we've reached the end of assistant's response
             if finish_reason == "stop":
+                LLM_LATENCY.labels("total").observe(time.perf_counter() - started)
                 # Add final assistant message if there's content
                 if collected_messages:
                     final_content = ''.join([msg for msg in collected_messages if msg is not None])
                     if final_content.strip():
-                        self.messages.append({"role": "assistant", "content": final_content})
+                        messages.append({"role": "assistant", "content": final_content})
+                self.drain_usage(response_stream, ticket, usage)
+                if ticket:
+                    ticket.release()
                 return
    
     # Main entry point that uses the recursive function
-    async def generate_response(self, human_input: str, system_prompt: str, language: str, frame = None, temperature = 0.7):
-        logger.info(f"human_input: {human_input}")
-        self.messages.append({"role": "user", "content": human_input})
-        if self.messages is None or self.messages == []:
-            self.messages = [{"role": "system", "content": system_prompt}]
+    async def generate_response(self, human_input: str, system_prompt: str, language: str, frame = None, temperature = 0.7, call_id = None,
+                                priority = "normal"):
+        logger.debug("Generating response", extra={"prompt": human_input})
+        # Keep one system message at the head and append the user turn exactly once
+        if self.messages and self.messages[0].get("role") == "system":
+            self.messages[0] = {"role": "system", "content": system_prompt}
         else:
-            self.messages =  [{"role": "system", "content": system_prompt}] + self.messages[1:]
+            self.messages.insert(0, {"role": "system", "content": system_prompt})
         if frame:
-            self.messages = self.messages + [{"role": "user", "content": [
+            self.messages.append({"role": "user", "content": [
                 {
                     "type": "text",
-                    "content": human_input},
+                    "text": human_input},
                 { 
                     "type": "image_url",
                     "image_url": {
                         "url": f"data:image/jpeg;base64,{frame}"
                     }
-                }]}]
+                }]})
         else:
-            self.messages = self.messages + [{"role": "user", "content": human_input}]
-        response_stream = self.client.chat.completions.create(
-            model=self.deployment_name,
-            messages=self.messages,
-            tools=self.tools,
-            parallel_tool_calls=False,
-            stream=True,
-            temperature=temperature
-        )
+            self.messages.append({"role": "user", "content": human_input})
+        async for token in self.stream_completion(self.messages, temperature, call_id, priority):
+            yield token
+
+    async def complete(self, messages, temperature=0, call_id=None, priority="background", executor=None, usage=None):
+        """
+        Return the full text of a completion, running the blocking SDK calls in ``executor`` so the
+        event loop is never held. Tool calls are not executed; use stream_completion for those.
+        """
+        ticket = None
+        if self.scheduler:
+            ticket = await self.scheduler.acquire(priority, call_id, estimate_tokens(messages))
+
+        def run():
+            response_stream, started = self.create_response_stream(temperature, messages)
+            content = []
+            for part in response_stream:
+                if getattr(part, "usage", None):
+                    self.record_usage(part.usage, ticket, usage)
+                if part.choices and part.choices[0].delta.content:
+                    content.append(part.choices[0].delta.content)
+            LLM_LATENCY.labels("total").observe(time.perf_counter() - started)
+            return "".join(content)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, run)
+        except Exception as e:
+            if self.scheduler and getattr(e, "status_code", None) == 429:
+                self.scheduler.pause(self.retry_after(e))
+            raise
+        finally:
+            if ticket:
+                ticket.release()
+
+    async def stream_completion(self, messages, temperature=0.7, call_id=None, priority="normal", usage=None):
+        """
+        Stream a completion over an explicit message list, which also collects any tool turns.
+        Pass a dict as usage to receive promptTokens, cachedTokens and completionTokens.
+        """
+        response_stream, started, ticket = await self.open_response_stream(temperature, priority, call_id, messages)
        
         # Process the initial stream with our recursive function
-        async for token in self.process_response_stream(response_stream, temperature):
-            yield token
+        try:
+            async for token in self.process_response_stream(response_stream, temperature, started, call_id, ticket, priority,
+                                                            messages, usage):
+                yield token
+        finally:
+            if ticket:
+                ticket.release()
                 
 if __name__ == "__main__":
     async def main():
@@ -0,0 +1,199 @@
+"""Speculative prefetch of read-only tool results from the live transcript.
+
+Customers read out phone numbers, order IDs and tracking numbers well before
+the LLM decides to call a tool. ``ToolPrefetcher.observe()`` runs a regex
+entity detector over every recognized utterance and, for each identifier
+that a read-only tool is keyed on (see PREFETCH_RULES), starts that handler
+on a small worker pool. Results are kept in a per-call cache with a TTL.
+
+Results are used in two places:
+- ``ready_results()`` gives the finished lookups of a call, which
+  get_recommendation adds to the prompt just before the instruction;
+- ``ChatClient.process_response_stream`` calls ``lookup()`` before executing
+  a tool, when the chat client is configured with tools; a hit (even one
+  still running) replaces the tool round-trip.
+Handlers run with their own event loop on the pool because the spreadsheet
+reads in tools.py block. They get ``out_queue=None``, like the chat client's
+own tool calls.
+
+Only tools without side effects may be listed in PREFETCH_RULES. Order IDs
+and tracking numbers are detected and reported, but no read-only handler in
+tools.py is keyed on them yet.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import PREFETCH_EVENTS, ENTITIES_DETECTED
+
+logger = logging.getLogger(__name__)
+
+# entity kind -> [(tool name, argument name)]
+PREFETCH_RULES = {
+    "phone_number": [
+        ("get_all_order_for_customer", "phone_number"),
+        ("get_all_refund_details_for_customer", "phone_number"),
+    ],
+}
+
+PHONE_PATTERN = re.compile(r"(?<![\w+])\+?\d[\d\s-]{8,15}\d(?!\w)")
+ORDER_ID_PATTERN = re.compile(
+    r"\border\s*(?:id|number|no\.?|#)?\s*(?:is\s*)?[:#]?\s*([A-Z]{0,4}-?\d{5,12})\b"
+    r"|\b(ORD-?\d{5,12})\b",
+    re.IGNORECASE,
+)
+TRACKING_PATTERN = re.compile(
+    r"\b(?:tracking|awb|shipment)\s*(?:id|number|no\.?|#)?\s*(?:is\s*)?[:#]?\s*([A-Z0-9]{8,22})\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_phone_number(value):
+    """Reduce a spoken/typed Indian mobile number to its 10 digits, or None."""
+    digits = re.sub(r"\D", "", str(value))
+    if len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    return digits if len(digits) == 10 and digits[0] in "6789" else None
+
+
+def detect_entities(text):
+    """Return (kind, value) pairs for identifiers mentioned in an utterance."""
+    entities = []
+    for match in PHONE_PATTERN.finditer(text):
+        phone_number = normalize_phone_number(match.group())
+        if phone_number:
+            entities.append(("phone_number", phone_number))
+    for match in ORDER_ID_PATTERN.finditer(text):
+        value = (match.group(1) or match.group(2)).upper()
+        if not normalize_phone_number(value):
+            entities.append(("order_id", value))
+    for match in TRACKING_PATTERN.finditer(text):
+        value = match.group(1).upper()
+        # Require a digit so words after "tracking" aren't taken as numbers
+        if any(c.isdigit() for c in value) and not normalize_phone_number(value):
+            entities.append(("tracking_number", value))
+    return entities
+
+
+def _cache_key(tool, arguments):
+    values = []
+    for name, value in sorted(arguments.items()):
+        if name in ("out_queue", "reply_to_customer"):
+            continue
+        if name == "phone_number":
+            value = normalize_phone_number(value) or value
+        values.append((name, str(value)))
+    return tool, tuple(values)
+
+
+class ToolPrefetcher:
+    def __init__(self, handlers=None, rules=PREFETCH_RULES, ttl=300, max_entries_per_call=32, workers=2):
+        self._handlers = handlers
+        self.rules = rules
+        self.ttl = ttl
+        self.max_entries_per_call = max_entries_per_call
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._cache = {}     # call_id -> {cache key: (future, started, tool, arguments)}
+        self._entities = {}  # call_id -> {(kind, value)}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def handlers(self):
+        if self._handlers is None:
+            from tools import tools_mapping
+            self._handlers = tools_mapping
+        return self._handlers
+
+    def observe(self, call_id, text):
+        """Detect identifiers in an utterance and warm matching tools. Safe from any thread."""
+        for kind, value in detect_entities(text):
+            with self._lock:
+                seen = self._entities.setdefault(call_id, set())
+                if (kind, value) in seen:
+                    continue
+                seen.add((kind, value))
+            ENTITIES_DETECTED.labels(kind).inc()
+            logger.info("Entity detected", extra={"call_id": call_id, "event": kind})
+            for tool, argument in self.rules.get(kind, []):
+                try:
+                    self.prefetch(call_id, tool, {argument: value})
+                except Exception as e:
+                    PREFETCH_EVENTS.labels("error").inc()
+                    logger.warning(f"Could not prefetch {tool}: {str(e)}")
+
+    def prefetch(self, call_id, tool, arguments):
+        handler = self.handlers.get(tool)
+        if handler is None:
+            return
+        key = _cache_key(tool, arguments)
+        with self._lock:
+            entries = self._cache.setdefault(call_id, {})
+            entry = entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                return
+            if len(entries) >= self.max_entries_per_call:
+                entries.pop(min(entries, key=lambda k: entries[k][1]))
+            # The coroutine is created on the worker, so a lookup cancelled while queued leaves none behind
+            future = self._executor.submit(lambda: asyncio.run(handler(**arguments, out_queue=None)))
+            entries[key] = (future, time.monotonic(), tool, dict(arguments))
+        PREFETCH_EVENTS.labels("started").inc()
+        future.add_done_callback(lambda f: PREFETCH_EVENTS.labels(
+            "cancelled" if f.cancelled() else "error" if f.exception() else "ready").inc())
+
+    def lookup(self, call_id, tool, arguments):
+        """Return an awaitable for a warmed result, or None if the tool must run normally."""
+        if not call_id:
+            return None
+        key = _cache_key(tool, arguments)
+        with self._lock:
+            entry = self._cache.get(call_id, {}).get(key)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl:
+            self.misses += 1
+            PREFETCH_EVENTS.labels("miss").inc()
+            return None
+        future = entry[0]
+        if future.cancelled() or (future.done() and future.exception() is not None):
+            self.misses += 1
+            PREFETCH_EVENTS.labels("miss").inc()
+            return None
+        self.hits += 1
+        PREFETCH_EVENTS.labels("hit").inc()
+        return asyncio.wrap_future(future)
+
+    def ready_results(self, call_id):
+        """(tool, arguments, result) for the call's finished, successful lookups, oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            entries = sorted(self._cache.get(call_id, {}).values(), key=lambda entry: entry[1])
+        return [(tool, arguments, future.result()) for future, started, tool, arguments in entries
+                if now - started < self.ttl and future.done() and not future.cancelled()
+                and future.exception() is None]
+
+    def discard_call(self, call_id):
+        with self._lock:
+            entries = self._cache.pop(call_id, {})
+            self._entities.pop(call_id, None)
+        for entry in entries.values():
+            entry[0].cancel()
+
+    def stats(self, call_id):
+        with self._lock:
+            entries = dict(self._cache.get(call_id, {}))
+            entities = sorted(kind for kind, _ in self._entities.get(call_id, ()))
+        return {
+            "entities": entities,
+            "cached": len(entries),
+            "ready": sum(1 for entry in entries.values() if entry[0].done()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,92 @@
+"""Prompt layout for recommendation requests that providers can prefix-cache.
+
+Azure OpenAI caches the longest previously seen prompt prefix (in blocks, from
+1024 tokens up), so a request is cheap only if it starts with exactly the
+same messages as an earlier one. Each agent's prompt is therefore laid out
+append-only:
+
+    [system prompt]                      fixed; tools are a fixed list too
+    [turn 1] [turn 2] ... [turn n]       one message per transcript entry
+    [context]                            optional, e.g. prefetched lookups
+    [instruction]                        fixed text, always last
+
+Transcript entries are converted to messages once, as they arrive, and the
+next request only adds turns after turn n, so everything up to turn n is
+served from cache. Very long calls are trimmed by dropping the oldest half of
+the turns at once, which changes the prefix rarely instead of on every turn.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_INSTRUCTION = (
+    "Given the conversation so far between the agent and the customer, "
+    "provide a concise and helpful recommendation for the customer."
+)
+
+
+class _Conversation:
+    def __init__(self):
+        self.turns = []
+        self.synced = 0      # transcript entries already converted
+        self.last_entry = None
+
+
+class PromptBuilder:
+    def __init__(self, system_prompt="", instruction=RECOMMENDATION_INSTRUCTION, max_turns=200):
+        self.system_prompt = system_prompt
+        self.instruction = instruction
+        self.max_turns = max_turns
+        self._conversations = {}
+
+    @staticmethod
+    def turn(entry):
+        return {"role": "user", "name": entry["speaker"], "content": entry["text"]}
+
+    def _sync(self, conversation, transcript):
+        # The transcript is append-only; anything else (cleared, replaced) starts over
+        if len(transcript) < conversation.synced or (
+                conversation.synced and transcript[conversation.synced - 1] is not conversation.last_entry):
+            conversation.__init__()
+        for entry in transcript[conversation.synced:]:
+            conversation.turns.append(self.turn(entry))
+        conversation.synced = len(transcript)
+        conversation.last_entry = transcript[-1] if transcript else None
+        if self.max_turns and len(conversation.turns) > self.max_turns:
+            del conversation.turns[:len(conversation.turns) - self.max_turns // 2]
+            logger.info(f"Trimmed prompt history to {len(conversation.turns)} turns")
+
+    def messages(self, key, transcript, context=None):
+        """Messages for a request over ``transcript``; callers may append to the returned list.
+
+        ``context`` goes after the turns, so it never changes the cached prefix.
+        """
+        conversation = self._conversations.setdefault(key, _Conversation())
+        self._sync(conversation, transcript)
+        extra = [{"role": "system", "content": context}] if context else []
+        return ([{"role": "system", "content": self.system_prompt}]
+                + conversation.turns
+                + extra
+                + [{"role": "user", "content": self.instruction}])
+
+    def export(self, key):
+        """Turn state for ``key`` as plain data for a checkpoint, or None."""
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return None
+        return {"turns": list(conversation.turns), "synced": conversation.synced}
+
+    def restore(self, key, state, transcript):
+        """Reinstate exported turn state over ``transcript``, the entries it was built from.
+
+        The turns are kept as they were (trimming included) rather than rebuilt,
+        so the restored prompt has the same prefix as before.
+        """
+        conversation = self._conversations[key] = _Conversation()
+        if state and state["synced"] <= len(transcript):
+            conversation.turns = list(state["turns"])
+            conversation.synced = state["synced"]
+            conversation.last_entry = transcript[conversation.synced - 1] if conversation.synced else None
+
+    def discard(self, key):
+        self._conversations.pop(key, None)
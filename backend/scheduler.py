@@ -0,0 +1,218 @@
+"""Central scheduler for Azure OpenAI chat completions.
+
+Every completion asks for a slot with ``await scheduler.acquire(priority,
+call_id, estimated_tokens)`` and hands it back with ``ticket.release()`` once
+the stream is finished. The scheduler enforces:
+
+- priority classes, served strictly in order: "live" (a customer turn or its
+  tool follow-ups) > "normal" > "background" (post-call work);
+- request-per-minute and token-per-minute budgets as token buckets. A request
+  is charged its estimated tokens up front and corrected to the reported
+  usage on release;
+- a reserve of concurrency and budget that background requests never dip
+  into, so bulk work cannot push live suggestions into a 429;
+- round-robin between calls within a priority class, so one busy call can't
+  starve the others;
+- a pause after the service answers 429, honouring Retry-After.
+
+``deduplicate(key, factory)`` lets identical prompts that are already in
+flight share one completion instead of queueing a second one.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+
+from metrics import LLM_QUEUE_TIME, LLM_QUEUE_DEPTH, LLM_SCHEDULED, LLM_DEDUPED
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("live", "normal", "background")
+
+
+def estimate_tokens(messages, completion_tokens=500):
+    """Rough prompt size (about 4 characters per token) plus an allowance for the completion."""
+    return len(json.dumps(messages, default=str)) // 4 + completion_tokens
+
+
+def prompt_key(*parts):
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def available(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def wait_time(self, amount, now, floor=0.0):
+        """Seconds until ``amount`` can be taken while leaving ``floor`` in the bucket."""
+        needed = min(amount, self.capacity - floor) + floor - self.available(now)
+        return max(needed, 0.0) / self.rate if self.rate else float("inf")
+
+    def take(self, amount):
+        # May go negative when actual usage exceeds the estimate; refill pays it back
+        self.tokens -= amount
+
+
+class Ticket:
+    def __init__(self, scheduler, priority, call_id, estimated_tokens):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.call_id = call_id
+        self.estimated_tokens = estimated_tokens
+        self.used_tokens = 0
+        self.enqueued = time.perf_counter()
+        self.granted = asyncio.get_running_loop().create_future()
+        self.released = False
+
+    def release(self):
+        if not self.released and self.granted.done() and not self.granted.cancelled():
+            self.released = True
+            self.scheduler._release(self)
+
+
+class LLMScheduler:
+    def __init__(self, tokens_per_minute=60000, requests_per_minute=300, max_concurrency=16, background_reserve=0.2):
+        self.tpm = TokenBucket(tokens_per_minute)
+        self.rpm = TokenBucket(requests_per_minute)
+        self.max_concurrency = max_concurrency
+        self.background_reserve = background_reserve
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # call -> deque of tickets
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._pump_task = None
+        self._dedupe = {}
+        for priority in PRIORITIES:
+            LLM_QUEUE_DEPTH.labels(priority).set_function(lambda priority=priority: self.queued(priority))
+
+    def queued(self, priority):
+        return sum(len(tickets) for tickets in self._queues[priority].values())
+
+    async def acquire(self, priority="normal", call_id=None, estimated_tokens=1000):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+        ticket = Ticket(self, priority, call_id, estimated_tokens)
+        self._queues[priority].setdefault(call_id or "", deque()).append(ticket)
+        self._ensure_pump()
+        self._wakeup.set()
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                ticket.release()
+            else:
+                self._discard(ticket)
+            raise
+        waited = time.perf_counter() - ticket.enqueued
+        LLM_QUEUE_TIME.labels(priority).observe(waited)
+        LLM_SCHEDULED.labels(priority, "granted").inc()
+        if waited > 1.0:
+            logger.info(f"LLM {priority} request for call {call_id} waited {waited:.2f}s for capacity")
+        return ticket
+
+    def pause(self, seconds):
+        """Stop granting slots for a while, e.g. after a 429 from the service."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        LLM_SCHEDULED.labels("all", "throttled").inc()
+        logger.warning(f"LLM requests paused for {seconds:.1f}s after rate limiting")
+
+    async def deduplicate(self, key, factory):
+        """Await ``factory()``, sharing the result with identical requests already in flight."""
+        task = self._dedupe.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._dedupe[key] = task
+            task.add_done_callback(lambda _: self._dedupe.pop(key, None))
+        else:
+            LLM_DEDUPED.inc()
+        return await asyncio.shield(task)
+
+    def _ensure_pump(self):
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump())
+
+    def _discard(self, ticket):
+        calls = self._queues[ticket.priority]
+        tickets = calls.get(ticket.call_id or "")
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del calls[ticket.call_id or ""]
+        LLM_SCHEDULED.labels(ticket.priority, "cancelled").inc()
+
+    def _release(self, ticket):
+        self._in_flight -= 1
+        if ticket.used_tokens:
+            self.tpm.take(ticket.used_tokens - ticket.estimated_tokens)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _wait_time(self, ticket, now):
+        """0 if the ticket can go now, seconds to wait, or None to wait for a release."""
+        background = ticket.priority == "background"
+        if now < self._paused_until:
+            return self._paused_until - now
+        limit = self.max_concurrency
+        if background:
+            limit = max(int(self.max_concurrency * (1 - self.background_reserve)), 1)
+        if self._in_flight >= limit:
+            return None
+        reserve = self.background_reserve if background else 0.0
+        return max(self.rpm.wait_time(1, now, reserve * self.rpm.capacity),
+                   self.tpm.wait_time(ticket.estimated_tokens, now, reserve * self.tpm.capacity))
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            calls = self._queues[priority]
+            while calls:
+                call = next(iter(calls))
+                ticket = calls[call][0]
+                if ticket.granted.done():  # cancelled while queued
+                    calls[call].popleft()
+                else:
+                    wait = self._wait_time(ticket, now)
+                    # Strict priority: lower classes wait while a higher one is blocked
+                    if wait is None or wait > 0:
+                        return wait
+                    calls[call].popleft()
+                    self.rpm.take(1)
+                    self.tpm.take(ticket.estimated_tokens)
+                    self._in_flight += 1
+                    ticket.granted.set_result(None)
+                # Round-robin: the call goes to the back of its class
+                calls.move_to_end(call)
+                if not calls[call]:
+                    del calls[call]
+        return None
+
+    async def _pump(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "queued": {priority: self.queued(priority) for priority in PRIORITIES},
+            "inFlight": self._in_flight,
+            "tokensAvailable": int(self.tpm.available(now)),
+            "requestsAvailable": int(self.rpm.available(now)),
+            "pausedFor": round(max(self._paused_until - now, 0.0), 2),
+            "deduplicating": len(self._dedupe),
+        }
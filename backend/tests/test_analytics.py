@@ -0,0 +1,107 @@
+import numpy as np
+
+from analytics import CallAnalytics
+
+RATE = 1000  # 20 ms frames of 20 samples
+FRAME_SAMPLES = 20
+
+
+def pcm(pattern):
+    """One frame per character: "1" is a loud square wave, "0" is silence."""
+    loud = np.tile(np.array([8000, -8000], dtype="<i2"), FRAME_SAMPLES // 2)
+    quiet = np.zeros(FRAME_SAMPLES, dtype="<i2")
+    return b"".join((loud if flag == "1" else quiet).tobytes() for flag in pattern)
+
+
+def analytics(**options):
+    options.setdefault("hangover_ms", 0)
+    call = CallAnalytics("call-1", **options)
+    # Both channels from the start, as when the audio metadata arrives
+    for speaker in ("agent", "customer"):
+        call.set_sample_rate(speaker, RATE)
+    return call
+
+
+def feed(call, agent, customer):
+    call.process("agent", pcm(agent), sample_rate=RATE)
+    call.process("customer", pcm(customer), sample_rate=RATE)
+
+
+def test_talk_ratio_overtalk_and_interruptions():
+    call = analytics()
+    feed(call, "1111110000", "0000111100")
+    call.add_words("agent", 3)
+
+    snapshot = call.snapshot()
+    total = snapshot["total"]
+    assert total["seconds"] == 0.2
+    assert total["agentTalkSec"] == 0.12
+    assert total["customerTalkSec"] == 0.08
+    assert total["talkRatio"] == 0.6
+    assert total["overtalkSec"] == 0.04
+    assert total["interruptions"] == {"agent": 0, "customer": 1}
+    assert total["deadAirSec"] == 0.04
+    # 3 words in 0.12 s of talk
+    assert snapshot["speakingRate"] == {"agentWpm": 1500.0, "customerWpm": 0.0}
+
+
+def test_silent_call_has_no_talk_ratio():
+    call = analytics()
+    feed(call, "0000", "0000")
+    assert call.snapshot()["total"]["talkRatio"] is None
+
+
+def test_dead_air_run_carries_over_between_batches():
+    # Every chunk is accounted on its own (one-slot batches)
+    call = analytics(batch_ms=20, dead_air_ms=100)
+    feed(call, "1000", "0000")
+    assert call.totals["deadAirEvents"] == 0
+    # Three silent slots each side of the boundary form one six-slot event
+    feed(call, "0001", "0000")
+    total = call.snapshot()["total"]
+    assert total["deadAirEvents"] == 1
+    assert total["longestDeadAirSec"] == 0.12
+
+
+def test_carried_run_closes_at_the_start_of_the_next_batch():
+    call = analytics(batch_ms=20, dead_air_ms=60)
+    feed(call, "1000", "0000")
+    feed(call, "1000", "0000")
+    total = call.snapshot()["total"]
+    # The first run closes at the boundary; the second is still open, so it is not an event yet
+    assert total["deadAirEvents"] == 1
+    assert total["longestDeadAirSec"] == 0.06
+
+
+def test_runs_split_by_speech_are_separate():
+    call = analytics(batch_ms=20, dead_air_ms=100)
+    feed(call, "1000", "0000")
+    feed(call, "1000", "0000")
+    feed(call, "1", "0")
+    assert call.snapshot()["total"]["deadAirEvents"] == 0
+
+
+def test_stalled_channel_counts_as_silent_and_realigns():
+    call = analytics(ring_seconds=4)  # 200 slots; a channel may lag by half of them
+    feed(call, "1" * 10, "1" * 10)
+    call.process("agent", pcm("1" * 150), sample_rate=RATE)
+
+    total = call.snapshot()["total"]
+    assert total["seconds"] == 1.2
+    assert total["agentTalkSec"] == 1.2
+    assert total["customerTalkSec"] == 0.2
+    assert total["overtalkSec"] == 0.2
+    # The customer's skipped slots are filled, so its next frame lines up with the agent's
+    assert call.channels["customer"].next_slot == 60
+
+    call.process("customer", pcm("1" * 10), sample_rate=RATE)
+    assert call.snapshot()["total"]["overtalkSec"] == 0.4
+
+
+def test_completed_window_is_reported():
+    call = analytics(window_seconds=0.1, batch_ms=20)
+    feed(call, "11111" + "00000" + "11", "00000" + "11111" + "00")
+    window = call.snapshot()["window"]
+    assert window["seconds"] == 0.1
+    assert window["agentTalkSec"] == 0.0
+    assert window["customerTalkSec"] == 0.1
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import codec
+from codec import UpstreamDecoder, decode_alaw, decode_ulaw, negotiate_encoding
+
+audioop = pytest.importorskip("audioop")
+
+ALL_CODES = bytes(range(256))
+
+
+def speech_like_pcm(seconds=0.5, sample_rate=16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 8000 * np.sin(2 * np.pi * 220 * t) + 2000 * np.sin(2 * np.pi * 1800 * t)
+    return signal.astype("<i2").tobytes()
+
+
+def test_ulaw_table_matches_audioop():
+    assert decode_ulaw(ALL_CODES) == audioop.ulaw2lin(ALL_CODES, 2)
+
+
+def test_alaw_table_matches_audioop():
+    assert decode_alaw(ALL_CODES) == audioop.alaw2lin(ALL_CODES, 2)
+
+
+@pytest.mark.parametrize("encoding, encode", [("mulaw", "lin2ulaw"), ("alaw", "lin2alaw")])
+def test_g711_round_trip(encoding, encode):
+    pcm = speech_like_pcm()
+    encoded = getattr(audioop, encode)(pcm, 2)
+    decoded = UpstreamDecoder(encoding).decode(encoded)
+    assert len(decoded) == len(pcm)
+    # G.711 is lossy; the error stays within a few percent of full scale
+    error = np.abs(np.frombuffer(decoded, "<i2").astype(int) - np.frombuffer(pcm, "<i2"))
+    assert error.max() < 1100
+
+
+def test_g711_without_audioop_matches(monkeypatch):
+    encoded = audioop.lin2ulaw(speech_like_pcm(), 2)
+    expected = UpstreamDecoder("mulaw").decode(encoded)
+    monkeypatch.setattr(codec, "audioop", None)
+    assert UpstreamDecoder("mulaw").decode(encoded) == expected
+
+
+def test_adpcm_keeps_state_across_chunks():
+    pcm = speech_like_pcm()
+    encoded, _ = audioop.lin2adpcm(pcm, 2, None)
+    whole, _ = audioop.adpcm2lin(encoded, 2, None)
+    decoder = UpstreamDecoder("adpcm")
+    chunked = b"".join(decoder.decode(encoded[start:start + 160]) for start in range(0, len(encoded), 160))
+    assert chunked == whole
+
+
+def test_pcm16_passes_through():
+    pcm = speech_like_pcm()
+    assert UpstreamDecoder().decode(pcm) is pcm
+
+
+def test_negotiation_prefers_server_order_and_falls_back():
+    assert negotiate_encoding(["pcm16", "MULAW"], ("mulaw", "pcm16")) == "mulaw"
+    assert negotiate_encoding(["opus"]) == "pcm16"
+    assert negotiate_encoding(None) == "pcm16"
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        UpstreamDecoder("opus")
@@ -0,0 +1,189 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from analytics import CallAnalytics
+from drain import DrainController, SessionCheckpoints
+from prompts import PromptBuilder
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def entry(text, speaker="customer", call_id="call-1"):
+    return {"text": text, "speaker": speaker, "timestamp": 0, "callId": call_id}
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    store = SessionCheckpoints(str(tmp_path / "sessions.db"))
+    yield store
+    store.close()
+
+
+def test_checkpoints_round_trip(checkpoints):
+    checkpoints.save("call-1", {"transcript": [entry("hello")]})
+    assert checkpoints.load("call-1") == {"transcript": [entry("hello")]}
+    checkpoints.delete("call-1")
+    assert checkpoints.load("call-1") is None
+
+
+def test_prompt_turns_survive_export_and_restore():
+    builder = PromptBuilder(system_prompt="system", max_turns=4)
+    transcript = [entry(f"turn {index}") for index in range(5)]  # trimmed on the way
+    before = builder.messages("agent-1", transcript)
+    state = builder.export("agent-1")
+
+    restored_transcript = [dict(item) for item in transcript]  # as loaded from JSON
+    restored = PromptBuilder(system_prompt="system", max_turns=4)
+    restored.restore("agent-1", state, restored_transcript)
+    assert restored.messages("agent-1", restored_transcript) == before
+
+    # New turns extend the restored prefix instead of rebuilding it
+    restored_transcript.append(entry("turn 5"))
+    after = restored.messages("agent-1", restored_transcript)
+    assert after[:-1][:len(before) - 1] == before[:-1]
+    assert after[-2]["content"] == "turn 5"
+
+
+def test_prompt_restore_ignores_state_ahead_of_transcript():
+    builder = PromptBuilder(system_prompt="system")
+    builder.restore("agent-1", {"turns": [{"role": "user", "content": "lost"}], "synced": 3}, [entry("only")])
+    assert [message["content"] for message in builder.messages("agent-1", [entry("only")])][1:-1] == ["only"]
+
+
+def test_analytics_counters_carry_over():
+    tone = (6000 * np.sin(np.arange(24000) / 10)).astype("<i2").tobytes()
+    analytics = CallAnalytics("call-1")
+    analytics.process("agent", tone)
+    analytics.process("customer", bytes(len(tone)))
+    analytics.add_words("agent", 5)
+    before = analytics.snapshot()
+
+    restored = CallAnalytics("call-1")
+    restored.restore(analytics.export())
+    assert restored.snapshot() == before
+
+
+def test_drain_checkpoints_active_calls_then_flushes():
+    async def main():
+        calls = ["call-1", "call-2"]
+        checkpointed, flushed = [], []
+
+        async def checkpoint(call_id):
+            checkpointed.append(call_id)
+
+        async def flush():
+            flushed.append("messages")
+
+        controller = DrainController(lambda: calls, checkpoint, flushers={"messages": flush},
+                                     deadline=2, checkpoint_interval=0.05, flush_reserve=0.5, poll_interval=0.01)
+        progress = controller.begin("test")
+        await asyncio.sleep(0.1)
+        calls.remove("call-1")  # one call ends during the drain
+        await controller.wait()
+        return progress, controller.progress(), checkpointed, flushed
+
+    started, finished, checkpointed, flushed = run(main())
+    assert started["state"] == "draining" and started["callsAtStart"] == 2
+    assert finished["state"] == "drained" and finished["phase"] == "done"
+    assert finished["activeCalls"] == 1 and finished["checkpointedCalls"] == 2
+    assert checkpointed.count("call-1") >= 1 and checkpointed[-1] == "call-2"
+    assert flushed == ["messages"] and finished["errors"] == []
+
+
+def test_drain_reports_a_flush_that_overruns_the_deadline():
+    async def main():
+        async def stuck():
+            await asyncio.sleep(10)
+
+        controller = DrainController(lambda: [], None, flushers={"callbacks": stuck}, deadline=0.2,
+                                     flush_reserve=0, poll_interval=0.01)
+        controller.begin("test")
+        await controller.wait()
+        return controller.progress()
+
+    progress = run(main())
+    assert progress["state"] == "drained"
+    assert progress["errors"] == ["flush callbacks: timed out"]
+
+
+@pytest.fixture
+def app_module(checkpoints, monkeypatch):
+    app = pytest.importorskip("app")
+    monkeypatch.setattr(app, "session_checkpoints", checkpoints)
+    monkeypatch.setattr(app, "transcription_results", {})
+    manager = app.ConnectionManager()
+    monkeypatch.setattr(app, "manager", manager)
+    monkeypatch.setattr(app, "prompt_builder", PromptBuilder(system_prompt="system"))
+    yield app
+    manager.prefetcher.shutdown()
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+
+def test_call_checkpoint_restores_agent_history_on_another_pod(app_module):
+    app = app_module
+
+    async def main():
+        manager = app.manager
+        await manager.connect(FakeWebSocket(), "agent-1")
+        manager.add_transcription("call-1", "my refund is late", "customer")
+        manager.add_transcription("call-1", "let me check", "agent")
+        before = app.prompt_builder.messages("agent-1", manager.get_transcriptions("agent-1"))
+        await app.checkpoint_call("call-1")
+
+        saved = app.session_checkpoints.load("call-1")
+        assert [item["text"] for item in saved["transcript"]] == ["my refund is late", "let me check"]
+        assert saved["agents"]["agent-1"]["prompt"]["synced"] == 2
+
+        # Another pod: the call's audio reconnects before the agent does
+        app.transcription_results.clear()
+        app.manager = app.ConnectionManager()
+        app.prompt_builder.discard("agent-1")
+        await app.restore_call_checkpoint("call-1")
+        await app.manager.connect(FakeWebSocket(), "agent-1")
+        after = app.prompt_builder.messages("agent-1", app.manager.get_transcriptions("agent-1"))
+        app.manager.prefetcher.shutdown()
+        return before, after
+
+    before, after = run(main())
+    assert after == before
+    assert app.transcription_results["call-1"][0]["text"] == "my refund is late"
+
+
+def test_drain_endpoint_rejects_bad_deadlines(app_module, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(app_module, "DRAIN_TOKEN", "secret")
+    client = TestClient(app_module.app)
+    for deadline in ("soon", "0", "-5", "100000"):
+        response = client.post(f"/api/drain?deadlineSeconds={deadline}", headers={"Authorization": "Bearer secret"})
+        assert response.status_code == 422
+    assert not app_module.drain_controller.draining
+
+
+def test_drain_endpoint_requires_the_token(app_module, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    started = []
+    monkeypatch.setattr(app_module, "start_drain", lambda reason, deadline=None: started.append(deadline) or {})
+    client = TestClient(app_module.app)
+    # Disabled until a token is configured
+    assert client.post("/api/drain").status_code == 404
+
+    monkeypatch.setattr(app_module, "DRAIN_TOKEN", "secret")
+    assert client.post("/api/drain").status_code == 401
+    assert client.post("/api/drain", headers={"Authorization": "Bearer guess"}).status_code == 401
+    assert started == []
+    response = client.post("/api/drain?deadlineSeconds=30", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 202
+    assert started == [30]
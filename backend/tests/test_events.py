@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from events import AsyncTTLCache, CallbackDispatcher, event_name
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def event(event_id, kind="CallConnected"):
+    return {"id": event_id, "type": f"Microsoft.Communication.{kind}"}
+
+
+def test_event_name():
+    assert event_name(event("1", "CallDisconnected")) == "CallDisconnected"
+    assert event_name({}) == "unknown"
+
+
+def test_retried_batch_is_handled_once():
+    async def main():
+        handled = []
+
+        async def handle(call_key, event):
+            handled.append((call_key, event["id"]))
+
+        dispatcher = CallbackDispatcher(handle)
+        batch = [event("1"), event("2", "PlayCompleted")]
+        queued = [dispatcher.submit("call-1", batch), dispatcher.submit("call-1", batch)]
+        await dispatcher.join()
+        await dispatcher.stop()
+        return queued, handled
+
+    queued, handled = run(main())
+    assert queued == [2, 0]
+    assert handled == [("call-1", "1"), ("call-1", "2")]
+
+
+def test_events_without_id_are_not_deduplicated():
+    dispatcher = CallbackDispatcher(None)
+    assert not dispatcher.is_duplicate(None)
+    assert not dispatcher.is_duplicate(None)
+
+
+def test_seen_ids_are_bounded():
+    dispatcher = CallbackDispatcher(None, seen_size=2)
+    for event_id in ("a", "b", "c"):
+        assert not dispatcher.is_duplicate(event_id)
+    assert dispatcher.is_duplicate("c")
+    assert not dispatcher.is_duplicate("a")  # evicted, so seen as new
+
+
+def test_calls_are_ordered_and_isolated():
+    async def main():
+        handled = []
+        release_slow = asyncio.Event()
+
+        async def handle(call_key, event):
+            if event["id"] == "slow-1":
+                await release_slow.wait()
+            if event["id"] == "bad":
+                raise RuntimeError("handler failed")
+            handled.append(event["id"])
+
+        dispatcher = CallbackDispatcher(handle)
+        dispatcher.submit("slow", [event("slow-1"), event("slow-2")])
+        dispatcher.submit("fast", [event("bad"), event("fast-1")])
+        await asyncio.sleep(0.01)
+        handled_before_release = list(handled)
+        release_slow.set()
+        await dispatcher.join()
+        await dispatcher.stop()
+        return handled_before_release, handled
+
+    before, after = run(main())
+    # A slow call doesn't hold up another one, and a failing event doesn't stop its call's worker
+    assert before == ["fast-1"]
+    assert after == ["fast-1", "slow-1", "slow-2"]
+
+
+def test_idle_worker_exits():
+    async def main():
+        async def handle(call_key, event):
+            pass
+
+        dispatcher = CallbackDispatcher(handle, idle_timeout=0.01)
+        dispatcher.submit("call-1", [event("1")])
+        await dispatcher.join()
+        await asyncio.sleep(0.05)
+        return dispatcher.stats()
+
+    assert run(main()) == {"calls": 0, "pending": 0, "seen": 1}
+
+
+def test_cache_shares_one_lookup():
+    async def main():
+        cache = AsyncTTLCache(ttl=10)
+        lookups = []
+
+        async def factory():
+            lookups.append(1)
+            await asyncio.sleep(0.01)
+            return "properties"
+
+        results = await asyncio.gather(*(cache.get("connection-1", factory) for _ in range(3)))
+        results.append(await cache.get("connection-1", factory))
+        return results, len(lookups)
+
+    assert run(main()) == (["properties"] * 4, 1)
+
+
+def test_cache_does_not_keep_failures():
+    async def main():
+        cache = AsyncTTLCache(ttl=10)
+        attempts = []
+
+        async def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("ACS unavailable")
+            return "properties"
+
+        with pytest.raises(RuntimeError):
+            await cache.get("connection-1", factory)
+        return await cache.get("connection-1", factory), len(attempts)
+
+    assert run(main()) == ("properties", 2)
@@ -0,0 +1,216 @@
+import asyncio
+
+import pytest
+
+from ingest import (
+    DROPPING_AUDIO, NO_AUDIO_MIRROR, NO_INTERIM, NORMAL,
+    AdmissionController, IngestPipeline, TranscriptQueue,
+)
+from metrics import ADMISSION_REJECTIONS, INGEST_DROPS
+
+
+def pipeline(**options):
+    options.setdefault("recognizer_queue_size", 4)
+    options.setdefault("fanout_queue_size", 4)
+    return IngestPipeline("call-1", broadcast=None, **options)
+
+
+def queued(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+        queue.task_done()
+    return items
+
+
+def write(tag, log):
+    return lambda: log.append(tag)
+
+
+def test_pipeline_sheds_mirror_then_interims_before_audio():
+    ingest = pipeline()
+    written = []
+    drops = INGEST_DROPS.labels("recognizer").value()
+
+    ingest.submit_audio(write(1, written))
+    assert ingest.submit_mirror("mirror-1")
+    assert ingest.allows_interim()
+    queued(ingest.fanout_queue)
+
+    # Half full: the mirror goes first
+    ingest.submit_audio(write(2, written))
+    assert not ingest.submit_mirror("mirror-2")
+    assert ingest.level == NO_AUDIO_MIRROR
+    assert ingest.allows_interim()
+
+    # Three quarters full: interims go next, and no audio has been lost yet
+    ingest.submit_audio(write(3, written))
+    ingest.submit_audio(write(4, written))
+    assert ingest.level == NO_INTERIM
+    assert not ingest.allows_interim()
+    assert ingest.dropped["recognizer"] == 0
+
+    # Only a full recognizer queue drops audio, oldest first
+    ingest.submit_audio(write(5, written))
+    assert ingest.level == DROPPING_AUDIO
+    for item in queued(ingest.recognizer_queue):
+        item()
+    assert written == [2, 3, 4, 5]
+    assert ingest.dropped == {"recognizer": 1, "fanout": 0, "mirror": 1, "interim": 1}
+    assert INGEST_DROPS.labels("recognizer").value() == drops + 1
+
+
+def test_pipeline_recovers_one_level_per_interval():
+    ingest = pipeline(step_interval=60)
+    for tag in range(5):
+        ingest.submit_audio(lambda: None)
+    assert ingest.level == DROPPING_AUDIO
+    queued(ingest.recognizer_queue)
+
+    # Drained, but the level holds until the step interval has passed
+    ingest._update_level()
+    assert ingest.level == DROPPING_AUDIO
+
+    ingest.step_interval = 0
+    for level in (NO_INTERIM, NO_AUDIO_MIRROR, NORMAL, NORMAL):
+        ingest._update_level()
+        assert ingest.level == level
+
+
+def test_recovery_waits_for_the_low_watermark():
+    ingest = pipeline(step_interval=0)
+    for tag in range(3):
+        ingest.submit_audio(lambda: None)
+    assert ingest.level == NO_AUDIO_MIRROR
+
+    # Still above the low watermark
+    ingest.recognizer_queue.get_nowait()
+    ingest.recognizer_queue.task_done()
+    ingest._update_level()
+    assert ingest.level == NO_AUDIO_MIRROR
+
+    ingest.recognizer_queue.get_nowait()
+    ingest.recognizer_queue.task_done()
+    ingest._update_level()
+    assert ingest.level == NORMAL
+
+
+def test_full_fanout_queue_drops_its_oldest_mirror_message():
+    # Watermarks out of reach so only the fan-out queue's own bound applies
+    ingest = pipeline(mirror_watermark=2, interim_watermark=2)
+    for message in range(6):
+        assert ingest.submit_mirror(message)
+    assert queued(ingest.fanout_queue) == [2, 3, 4, 5]
+    assert ingest.dropped["fanout"] == 2
+    assert ingest.level == NORMAL
+
+
+def test_pipeline_stages_run_and_survive_errors():
+    sent, written = [], []
+
+    async def broadcast(message):
+        if message == "bad":
+            raise RuntimeError("socket closed")
+        sent.append(message)
+
+    def broken():
+        raise RuntimeError("stream closed")
+
+    async def main():
+        ingest = IngestPipeline("call-1", broadcast)
+        ingest.start()
+        ingest.submit_audio(broken)
+        ingest.submit_audio(write(1, written))
+        ingest.submit_mirror("bad")
+        ingest.submit_mirror("ok")
+        await ingest.stop()
+        return ingest
+
+    ingest = asyncio.run(asyncio.wait_for(main(), timeout=5))
+    assert written == [1]
+    assert sent == ["ok"]
+    assert ingest.errors == 2
+
+
+def test_transcript_queue_sheds_interims_then_oldest_transcripts():
+    transcripts = TranscriptQueue(maxsize=4)
+    drops = INGEST_DROPS.labels("transcript").value()
+    for item in range(2):
+        transcripts.offer(item)
+        assert transcripts.allows_interim()
+    # Three quarters full
+    transcripts.offer(2)
+    assert not transcripts.allows_interim()
+    transcripts.offer(3)
+    assert transcripts.dropped == 0
+
+    transcripts.offer(4)
+    transcripts.offer(5)
+    assert [transcripts.get_nowait() for _ in range(4)] == [2, 3, 4, 5]
+    assert transcripts.stats() == {"queued": 0, "maxSize": 4, "dropped": 2}
+    assert INGEST_DROPS.labels("transcript").value() == drops + 2
+    # Dropped items are marked done so join() still returns
+    for _ in range(4):
+        transcripts.task_done()
+    transcripts.join()
+
+
+def test_admission_rejects_over_capacity_and_while_draining():
+    admission = AdmissionController(max_calls=2)
+    rejections = ADMISSION_REJECTIONS.labels("max_calls").value()
+    for call_id in ("call-1", "call-2"):
+        assert admission.check(call_id) is None
+        admission.admit(call_id)
+    assert admission.check("call-3") == "max_calls"
+    assert ADMISSION_REJECTIONS.labels("max_calls").value() == rejections + 1
+    # A reconnect of an admitted call is never rejected
+    assert admission.check("call-1") is None
+
+    admission.release("call-2")
+    assert admission.check("call-3") is None
+    admission.draining = True
+    assert admission.check("call-3") == "draining"
+    assert admission.check("call-1") is None
+
+
+def test_admission_holds_a_call_until_every_socket_releases_it():
+    admission = AdmissionController(max_calls=1)
+    admission.admit("call-1")
+    admission.admit("call-1")
+    admission.release("call-1")
+    assert admission.check("call-2") == "max_calls"
+    admission.release("call-1")
+    assert admission.calls == {}
+    assert admission.stats()["activeCalls"] == 0
+
+
+def test_admission_rejects_on_event_loop_lag():
+    class Lag:
+        lag = 0.5
+
+    admission = AdmissionController(max_loop_lag_ms=250, lag_monitor=Lag())
+    assert admission.check("call-1") == "event_loop_lag"
+    Lag.lag = 0.1
+    assert admission.check("call-1") is None
+    assert admission.stats()["loopLagMs"] == 100
+
+
+def test_audio_socket_setup_failure_releases_admission(monkeypatch):
+    app = pytest.importorskip("app")
+    from fastapi.testclient import TestClient
+
+    manager = app.ConnectionManager()
+    monkeypatch.setattr(app, "manager", manager)
+
+    def no_credentials(*args, **kwargs):
+        raise RuntimeError("Speech key missing")
+
+    monkeypatch.setattr(manager, "setup_dual_speech_recognizers", no_credentials)
+    sockets = app.ACTIVE_SOCKETS.labels("audio").value()
+    try:
+        with TestClient(app.app).websocket_connect("/ws/audio/call-1"):
+            pass
+    finally:
+        manager.prefetcher.shutdown()
+    assert app.admission.calls == {}
+    assert app.ACTIVE_SOCKETS.labels("audio").value() == sockets
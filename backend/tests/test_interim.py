@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+from interim import InterimStreamer
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+class Recorder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+
+    async def __call__(self, message):
+        await asyncio.sleep(self.delay)
+        self.messages.append(json.loads(message))
+
+
+def deliver(streamer, due):
+    async def main():
+        for item in due:
+            await streamer._deliver(*item)
+    run(main())
+
+
+def test_newer_hypothesis_replaces_an_unsent_one():
+    streamer = InterimStreamer(Recorder())
+    for text in ("my", "my refund", "my refund is late"):
+        streamer.offer("call-1", "customer", text)
+    streamer.offer("call-1", "customer", "")
+
+    due = streamer._take_due(10.0)
+    assert [text for _, _, text in due] == ["my refund is late"]
+    assert streamer.coalesced == 2
+    assert streamer.stats()["pending"] == 0
+
+
+def test_updates_are_throttled_per_speaker():
+    send = Recorder()
+    streamer = InterimStreamer(send, rate_hz=4)
+    streamer.offer("call-1", "customer", "hello")
+    deliver(streamer, streamer._take_due(10.0))
+
+    streamer.offer("call-1", "customer", "hello there")
+    streamer.offer("call-1", "agent", "hi")
+    # The agent has sent nothing yet; the customer must wait out the interval
+    due = streamer._take_due(10.1)
+    assert [key for key, _, _ in due] == [("call-1", "agent")]
+    deliver(streamer, due)
+    assert streamer._take_due(10.2) == []
+
+    deliver(streamer, streamer._take_due(10.25))
+    assert [message["text"] for message in send.messages] == ["hello", "hi", "hello there"]
+
+
+def test_a_speaker_has_one_update_in_flight():
+    streamer = InterimStreamer(Recorder(), rate_hz=0)
+    streamer.offer("call-1", "customer", "hello")
+    first = streamer._take_due(10.0)
+    streamer.offer("call-1", "customer", "hello there")
+    assert streamer._take_due(20.0) == []
+
+    deliver(streamer, first)
+    assert [text for _, _, text in streamer._take_due(20.0)] == ["hello there"]
+
+
+def test_finalize_discards_the_pending_hypothesis_and_opens_a_segment():
+    send = Recorder()
+    streamer = InterimStreamer(send)
+    streamer.offer("call-1", "customer", "my refund")
+    first = streamer.finalize("call-1", "customer")
+    assert streamer._take_due(10.0) == []
+    assert streamer.superseded == 1
+
+    streamer.offer("call-1", "customer", "thanks")
+    deliver(streamer, streamer._take_due(10.0))
+    second = streamer.finalize("call-1", "customer")
+    assert send.messages == [{
+        "type": "interimTranscription",
+        "callId": "call-1",
+        "speaker": "customer",
+        "segmentId": second,
+        "text": "thanks",
+        "replaceable": True,
+    }]
+    assert first != second and first.startswith("customer-")
+
+
+def test_update_finalized_while_queued_is_never_sent():
+    send = Recorder()
+    streamer = InterimStreamer(send)
+    streamer.offer("call-1", "agent", "let me check")
+    due = streamer._take_due(10.0)
+    streamer.finalize("call-1", "agent")
+    deliver(streamer, due)
+    assert send.messages == []
+    assert streamer.superseded == 1
+
+
+def test_slow_send_times_out_and_frees_the_speaker():
+    streamer = InterimStreamer(Recorder(delay=1.0), rate_hz=0, send_timeout=0.01)
+    streamer.offer("call-1", "agent", "one moment")
+    deliver(streamer, streamer._take_due(10.0))
+    assert streamer.sent == 0
+
+    streamer.offer("call-1", "agent", "one moment please")
+    assert len(streamer._take_due(10.0)) == 1
+
+
+def test_discard_call_forgets_only_that_call():
+    streamer = InterimStreamer(Recorder())
+    streamer.offer("call-1", "agent", "hello")
+    streamer.offer("call-2", "agent", "hi")
+    streamer.discard_call("call-1")
+    assert [key for key, _, _ in streamer._take_due(10.0)] == [("call-2", "agent")]
+
+
+def test_pump_sends_offered_updates():
+    send = Recorder()
+    streamer = InterimStreamer(send, rate_hz=0, tick_ms=1)
+
+    async def main():
+        pump = asyncio.create_task(streamer.run())
+        streamer.offer("call-1", "customer", "hello")
+        while not send.messages:
+            await asyncio.sleep(0.005)
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+
+    run(main())
+    assert [message["text"] for message in send.messages] == ["hello"]
+    assert streamer.sent == 1
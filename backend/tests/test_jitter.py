@@ -0,0 +1,120 @@
+import pytest
+
+from jitter import JitterBuffer, parse_media_timestamp
+
+RATE = 1000  # 20 ms frames of 20 samples keep payloads small
+FRAME = 0.02
+
+
+def frame(tag):
+    return bytes([tag]) * int(RATE * FRAME) * 2
+
+
+SILENCE = bytes(int(RATE * FRAME) * 2)
+
+
+def buffer(**options):
+    return JitterBuffer(sample_rate=RATE, target_delay_ms=60, **options)
+
+
+def test_parse_media_timestamp():
+    assert parse_media_timestamp("2024-01-01T00:00:00.020Z") == pytest.approx(1704067200.02)
+    assert parse_media_timestamp("yesterday") is None
+    assert parse_media_timestamp(None) is None
+
+
+def test_unknown_policies_are_rejected():
+    with pytest.raises(ValueError):
+        buffer(late_policy="keep")
+    with pytest.raises(ValueError):
+        buffer(gap_policy="repeat")
+
+
+def test_out_of_order_frames_play_in_timestamp_order():
+    jitter = buffer()
+    jitter.push(0.00, frame(1), arrival=0.00)
+    jitter.push(0.04, frame(3), arrival=0.01)
+    jitter.push(0.02, frame(2), arrival=0.02)
+    # Nothing plays before the target delay
+    assert jitter.pop_due(0.05) == []
+    assert jitter.pop_due(0.2) == [frame(1), frame(2), frame(3)]
+    assert jitter.stats()["reordered"] == 1
+
+
+@pytest.mark.parametrize("policy, released", [("drop", []), ("passthrough", [frame(9)])])
+def test_late_frame_policy(policy, released):
+    jitter = buffer(late_policy=policy)
+    jitter.push(0.00, frame(1), arrival=0.00)
+    jitter.push(0.02, frame(2), arrival=0.02)
+    jitter.pop_due(0.1)
+    assert jitter.push(0.00, frame(9), arrival=0.11) == released
+    assert jitter.stats()["late"] == 1
+
+
+@pytest.mark.parametrize("policy, released", [
+    ("silence", [frame(1), SILENCE, frame(3)]),
+    ("skip", [frame(1), frame(3)]),
+])
+def test_missing_frame_gap_policy(policy, released):
+    jitter = buffer(gap_policy=policy)
+    jitter.push(0.00, frame(1), arrival=0.00)
+    jitter.push(0.04, frame(3), arrival=0.04)
+    assert jitter.pop_due(0.2) == released
+    assert jitter.stats()["lost"] == 1
+
+
+def test_silent_frames_become_zeros():
+    jitter = buffer()
+    jitter.push(0.00, frame(1), silent=True, arrival=0.00)
+    assert jitter.pop_due(0.1) == [SILENCE]
+    assert jitter.stats()["silent"] == 1
+
+
+def test_duplicate_frame_is_dropped():
+    jitter = buffer()
+    jitter.push(0.00, frame(1), arrival=0.00)
+    jitter.push(0.00, frame(1), arrival=0.01)
+    jitter.push(0.02, frame(2), arrival=0.02)
+    assert jitter.pop_due(0.2) == [frame(1), frame(2)]
+    assert jitter.stats()["duplicates"] == 1
+
+
+def test_idle_sender_is_an_underrun_not_loss():
+    jitter = buffer()
+    jitter.push(0.00, frame(1), arrival=0.00)
+    assert jitter.pop_due(0.1) == [frame(1)]
+    assert jitter.pop_due(0.3) == []
+    # The sender stalled; its next frame carries on from the last timestamp
+    jitter.push(0.02, frame(2), arrival=0.30)
+    assert jitter.pop_due(0.33) == [frame(2)]
+    stats = jitter.stats()
+    assert (stats["underruns"], stats["lost"]) == (1, 0)
+
+
+def test_stream_restart_resyncs_instead_of_filling_the_gap():
+    jitter = buffer()
+    jitter.push(0.00, frame(1), arrival=0.00)
+    jitter.pop_due(0.1)
+    jitter.push(10.00, frame(2), arrival=0.2)
+    # Plays target_delay after its own arrival, with no silence for the 10 s gap
+    assert jitter.pop_due(0.25) == []
+    assert jitter.pop_due(0.27) == [frame(2)]
+    assert jitter.stats()["resyncs"] == 1
+
+
+def test_backlog_beyond_max_delay_catches_up():
+    jitter = buffer(max_delay_ms=100)
+    for index in range(10):
+        jitter.push(index * FRAME, frame(index + 1), arrival=0.0)
+    released = jitter.pop_due(0.0)
+    assert released and released[0] == frame(1)
+    assert jitter.stats()["resyncs"] == 1
+
+
+def test_flush_releases_what_is_left_in_order():
+    jitter = buffer()
+    jitter.push(0.00, frame(1), arrival=0.0)
+    jitter.push(0.04, frame(3), arrival=0.0)
+    jitter.push(0.02, frame(2), arrival=0.0)
+    assert jitter.flush() == [frame(1), frame(2), frame(3)]
+    assert jitter.stats()["buffered"] == 0
@@ -0,0 +1,54 @@
+import logging
+
+from logconfig import CategoryFilter, JsonFormatter, _category_setting
+from metrics import LOG_DROPS
+
+
+def record(name, level=logging.INFO, **extra):
+    entry = logging.LogRecord(name, level, __file__, 1, "message", None, None)
+    entry.__dict__.update(extra)
+    return entry
+
+
+def test_category_is_the_longest_matching_prefix():
+    settings = {"transcript": 20, "transcript.interim": 0.05, "*": 1}
+    assert _category_setting(settings, "transcript.interim.agent") == ("transcript.interim", 0.05)
+    assert _category_setting(settings, "transcript.final") == ("transcript", 20)
+    assert _category_setting(settings, "transcripts") == ("*", 1)
+    assert _category_setting({"llm": 5}, "oai") == (None, None)
+
+
+def test_loggers_in_a_category_share_one_rate_limit(monkeypatch):
+    monkeypatch.setattr("logconfig.time.monotonic", lambda: 100.0)
+    category_filter = CategoryFilter(rate_limits={"transcript": 2})
+    drops = LOG_DROPS.labels("transcript", "rate_limited").value()
+
+    assert category_filter.filter(record("transcript.final.agent"))
+    assert category_filter.filter(record("transcript.final.customer"))
+    assert not category_filter.filter(record("transcript.interim"))
+    assert list(category_filter._buckets) == ["transcript"]
+    assert LOG_DROPS.labels("transcript", "rate_limited").value() == drops + 1
+    # Warnings are never limited
+    assert category_filter.filter(record("transcript.final.agent", logging.WARNING))
+
+
+def test_sampling_drops_are_counted_by_category(monkeypatch):
+    monkeypatch.setattr("logconfig.random.random", lambda: 0.5)
+    category_filter = CategoryFilter(sampling={"transcript.interim": 0.1, "oai": 0.9})
+    drops = LOG_DROPS.labels("transcript.interim", "sampled").value()
+
+    assert not category_filter.filter(record("transcript.interim.agent"))
+    assert not category_filter.filter(record("transcript.interim.customer"))
+    assert category_filter.filter(record("oai.tools"))
+    assert category_filter.filter(record("app"))
+    assert LOG_DROPS.labels("transcript.interim", "sampled").value() == drops + 2
+
+
+def test_sensitive_fields_are_redacted():
+    formatter = JsonFormatter(redact=True)
+    line = formatter.format(record("transcript.final", transcript="my card is 4111", call_id="call-1"))
+    assert '"transcript": "<redacted 15 chars>"' in line
+    assert '"call_id": "call-1"' in line
+
+    line = formatter.format(record("app", phone_number="+15551234567", caller_id="+18772246445"))
+    assert "555" not in line and "877" not in line
@@ -0,0 +1,48 @@
+import gc
+import threading
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def run_threads(target, count=20):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+
+
+def test_ended_threads_fold_into_the_total():
+    registry = Registry()
+    counter = Counter("test_events_total", "Events.", registry=registry)
+    counter.inc(2)
+    run_threads(lambda: counter.inc(3))
+
+    assert counter._default.value() == 62
+    # Only the main thread still holds a cell
+    assert len(counter._default._cells._cells) == 1
+
+
+def test_gauges_and_histograms_keep_values_from_ended_threads():
+    registry = Registry()
+    gauge = Gauge("test_sockets", "Sockets.", registry=registry)
+    histogram = Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=registry)
+
+    def work():
+        gauge.inc()
+        histogram.observe(0.5)
+
+    run_threads(work, count=5)
+    gauge.dec(2)
+
+    assert gauge._default.value() == 3
+    counts, total = histogram._default.snapshot()
+    assert counts == [0, 5, 0] and total == 2.5
+
+
+def test_render_reads_labelled_children():
+    registry = Registry()
+    counter = Counter("test_frames_total", "Frames.", ["speaker"], registry=registry)
+    run_threads(lambda: counter.labels("agent").inc(), count=3)
+    assert 'test_frames_total{speaker="agent"} 3' in registry.render()
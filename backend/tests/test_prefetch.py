@@ -0,0 +1,92 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from prefetch import ToolPrefetcher, detect_entities, normalize_phone_number
+
+
+async def orders_handler(phone_number, out_queue):
+    # Same signature as the tools.py handlers: out_queue is required
+    return f"orders for {phone_number}"
+
+
+async def refunds_handler(phone_number, out_queue):
+    return f"refunds for {phone_number}"
+
+
+@pytest.fixture
+def prefetcher():
+    prefetcher = ToolPrefetcher(handlers={
+        "get_all_order_for_customer": orders_handler,
+        "get_all_refund_details_for_customer": refunds_handler,
+    })
+    yield prefetcher
+    prefetcher.shutdown()
+
+
+def wait_for_lookups(prefetcher, call_id):
+    futures = [entry[0] for entry in prefetcher._cache.get(call_id, {}).values()]
+    concurrent.futures.wait(futures, timeout=5)
+
+
+@pytest.mark.parametrize("spoken", ["98765 43210", "+91 98765-43210", "098765 43210"])
+def test_phone_numbers_are_normalized(spoken):
+    assert detect_entities(f"my number is {spoken} please") == [("phone_number", "9876543210")]
+
+
+def test_non_mobile_numbers_are_ignored():
+    assert normalize_phone_number("12345 67890") is None
+    assert detect_entities("the total was 1500 rupees") == []
+
+
+def test_phone_number_utterance_warms_read_only_tools(prefetcher):
+    prefetcher.observe("call-1", "Sure, my number is 98765 43210.")
+    wait_for_lookups(prefetcher, "call-1")
+
+    results = prefetcher.ready_results("call-1")
+    assert sorted((tool, arguments["phone_number"], result) for tool, arguments, result in results) == [
+        ("get_all_order_for_customer", "9876543210", "orders for 9876543210"),
+        ("get_all_refund_details_for_customer", "9876543210", "refunds for 9876543210"),
+    ]
+    assert prefetcher.stats("call-1")["entities"] == ["phone_number"]
+
+
+def test_lookup_hits_for_the_same_number_in_another_format(prefetcher):
+    prefetcher.observe("call-1", "it's 9876543210")
+    wait_for_lookups(prefetcher, "call-1")
+
+    async def look_up():
+        warmed = prefetcher.lookup("call-1", "get_all_order_for_customer", {"phone_number": "+91 98765 43210"})
+        return await warmed
+
+    assert asyncio.run(look_up()) == "orders for 9876543210"
+    assert prefetcher.lookup("call-2", "get_all_order_for_customer", {"phone_number": "9876543210"}) is None
+    assert (prefetcher.hits, prefetcher.misses) == (1, 1)
+
+
+def test_repeated_number_is_fetched_once(prefetcher):
+    prefetcher.observe("call-1", "98765 43210")
+    prefetcher.observe("call-1", "yes, 98765 43210")
+    assert prefetcher.stats("call-1")["cached"] == 2
+
+
+def test_failed_lookup_is_not_offered():
+    async def failing(phone_number, out_queue):
+        raise RuntimeError("sheet unavailable")
+
+    prefetcher = ToolPrefetcher(handlers={"get_all_order_for_customer": failing})
+    try:
+        prefetcher.observe("call-1", "98765 43210")
+        wait_for_lookups(prefetcher, "call-1")
+        assert prefetcher.ready_results("call-1") == []
+        assert prefetcher.lookup("call-1", "get_all_order_for_customer", {"phone_number": "9876543210"}) is None
+    finally:
+        prefetcher.shutdown()
+
+
+def test_discard_call_forgets_its_lookups(prefetcher):
+    prefetcher.observe("call-1", "98765 43210")
+    prefetcher.discard_call("call-1")
+    assert prefetcher.ready_results("call-1") == []
+    assert prefetcher.stats("call-1")["entities"] == []
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from scheduler import LLMScheduler
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+async def grant_order(scheduler, requests):
+    """Queue (priority, call_id) requests behind a held slot and return the order they are granted in."""
+    order = []
+
+    async def request(priority, call_id):
+        ticket = await scheduler.acquire(priority, call_id, estimated_tokens=10)
+        order.append((priority, call_id))
+        ticket.release()
+
+    held = await scheduler.acquire("live", "holder", estimated_tokens=10)
+    tasks = [asyncio.create_task(request(priority, call_id)) for priority, call_id in requests]
+    await asyncio.sleep(0.01)
+    held.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_higher_priorities_are_served_first():
+    async def main():
+        scheduler = LLMScheduler(max_concurrency=1)
+        return await grant_order(scheduler, [("background", "a"), ("normal", "a"), ("live", "a")])
+
+    assert run(main()) == [("live", "a"), ("normal", "a"), ("background", "a")]
+
+
+def test_calls_take_turns_within_a_priority():
+    async def main():
+        scheduler = LLMScheduler(max_concurrency=1)
+        return await grant_order(scheduler, [("live", "a"), ("live", "a"), ("live", "b")])
+
+    assert run(main()) == [("live", "a"), ("live", "b"), ("live", "a")]
+
+
+def test_pause_after_429_holds_every_priority():
+    async def main():
+        scheduler = LLMScheduler()
+        scheduler.pause(0.3)
+        started = time.monotonic()
+        ticket = await scheduler.acquire("live", "a")
+        waited = time.monotonic() - started
+        ticket.release()
+        return waited, scheduler.stats()["pausedFor"]
+
+    waited, paused_for = run(main())
+    assert 0.25 <= waited < 2
+    assert paused_for == 0
+
+
+def test_background_leaves_the_reserve_to_live_requests():
+    async def main():
+        scheduler = LLMScheduler(requests_per_minute=10, background_reserve=0.5)
+        granted = []
+        for _ in range(6):
+            try:
+                granted.append(await asyncio.wait_for(scheduler.acquire("background", "wrapup"), timeout=0.1))
+            except asyncio.TimeoutError:
+                break
+        live = await asyncio.wait_for(scheduler.acquire("live", "a"), timeout=0.1)
+        return len(granted), live
+
+    background_granted, live = run(main())
+    assert background_granted == 5
+    assert live.granted.done()
+
+
+def test_cancelled_request_leaves_the_queue():
+    async def main():
+        scheduler = LLMScheduler(max_concurrency=1)
+        held = await scheduler.acquire("live", "a")
+        waiting = asyncio.create_task(scheduler.acquire("normal", "b"))
+        await asyncio.sleep(0.01)
+        queued = scheduler.queued("normal")
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        held.release()
+        return queued, scheduler.queued("normal"), scheduler.stats()["inFlight"]
+
+    assert run(main()) == (1, 0, 0)
+
+
+def test_identical_requests_share_one_completion():
+    async def main():
+        scheduler = LLMScheduler()
+        calls = []
+
+        async def complete():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(scheduler.deduplicate("key", complete) for _ in range(3)))
+        return results, len(calls)
+
+    assert run(main()) == (["answer"] * 3, 1)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from vad import VoiceActivityDetector
+
+RATE = 16000
+FRAME = RATE // 100  # 10 ms analysis frames
+
+
+def quiet(value):
+    """A silent frame tagged with a small constant sample value (about -50 dBFS or lower)."""
+    return np.full(FRAME, value, dtype="<i2").tobytes()
+
+
+def tone(marker=0):
+    samples = 8000 * np.sin(2 * np.pi * 200 * np.arange(FRAME) / RATE)
+    samples[0] = 30000 + marker  # tags the frame; still speech
+    return samples.astype("<i2").tobytes()
+
+
+def tags(output):
+    """First sample of every forwarded frame."""
+    return [int(value) for value in np.frombuffer(output, dtype="<i2")[::FRAME]]
+
+
+def detector(**options):
+    options.setdefault("sample_rate", RATE)
+    return VoiceActivityDetector(**options)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        detector(mode="drop")
+
+
+def test_off_forwards_everything():
+    vad = detector(mode="off")
+    audio = b"".join(quiet(1) for _ in range(10)) + tone()
+    assert vad.process(audio) == audio
+    assert vad.stats()["speechFrameRatio"] == pytest.approx(1 / 11)
+
+
+def test_gate_sends_preroll_speech_and_hangover_only():
+    vad = detector(mode="gate", preroll_ms=50, hangover_ms=30)
+    audio = (b"".join(quiet(value) for value in range(1, 21))
+             + tone(1) + tone(2)
+             + b"".join(quiet(value) for value in range(101, 111)))
+    # The last five silent frames before the onset, both speech frames, three hangover frames
+    assert tags(vad.process(audio)) == [16, 17, 18, 19, 20, 30001, 30002, 101, 102, 103]
+
+
+def test_gate_suppresses_long_silence():
+    vad = detector(mode="gate", preroll_ms=50)
+    vad.process(b"".join(quiet(1) for _ in range(100)))
+    stats = vad.stats()
+    assert stats["forwardedBytes"] == 0
+    # Frames still held in the pre-roll are not counted as suppressed yet
+    assert stats["suppressedBytes"] == 95 * FRAME * 2
+
+
+def test_compress_forwards_aged_out_silence_in_order():
+    vad = detector(mode="compress", preroll_ms=50, hangover_ms=0, compress_ratio=4)
+    audio = b"".join(quiet(value) for value in range(1, 26)) + tone(1)
+    # 1 in 4 frames leaving the pre-roll, then the full pre-roll ahead of the onset
+    assert tags(vad.process(audio)) == [4, 8, 12, 16, 20, 21, 22, 23, 24, 25, 30001]
+
+
+def test_compress_without_preroll():
+    vad = detector(mode="compress", preroll_ms=0, hangover_ms=0, compress_ratio=4)
+    assert tags(vad.process(b"".join(quiet(value) for value in range(1, 13)))) == [4, 8, 12]
+
+
+def test_chunk_boundaries_do_not_change_the_output():
+    audio = (b"".join(quiet(value) for value in range(1, 21)) + tone(1) + tone(2)
+             + b"".join(quiet(value) for value in range(101, 111)))
+    whole = detector(mode="gate", preroll_ms=50, hangover_ms=30).process(audio)
+    vad = detector(mode="gate", preroll_ms=50, hangover_ms=30)
+    pieces = b"".join(vad.process(audio[start:start + 333]) for start in range(0, len(audio), 333))
+    assert pieces == whole
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+
+from wrapup import JobQueue, WrapUpWorker
+
+TRANSCRIPT = [
+    {"speaker": "customer", "text": "My refund hasn't arrived."},
+    {"speaker": "agent", "text": "I have raised it again, it will arrive in three days."},
+]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "wrapup.db"))
+    yield queue
+    queue.close()
+
+
+def test_duplicate_enqueue_is_ignored(queue):
+    assert queue.enqueue("wrapup", "call-1", {"transcript": TRANSCRIPT})
+    assert not queue.enqueue("wrapup", "call-1", {"transcript": []})
+    assert queue.pending_jobs == 1
+    assert queue.get("wrapup", "call-1")["payload"]["transcript"] == TRANSCRIPT
+
+
+def test_failed_job_is_retried_after_its_delay(queue):
+    queue.enqueue("wrapup", "call-1", {"transcript": TRANSCRIPT})
+    job = queue.claim()
+    assert job["attempts"] == 1 and queue.pending_jobs == 0
+
+    assert queue.fail(job["id"], "timeout", retry_delay=60) == "pending"
+    assert queue.pending_jobs == 1
+    assert queue.claim() is None  # not due yet
+
+    assert queue.fail(job["id"], "timeout", retry_delay=0) == "pending"
+    retried = queue.claim()
+    assert retried["id"] == job["id"] and retried["attempts"] == 2
+    assert retried["error"] == "timeout"
+
+
+def test_job_fails_once_out_of_attempts(queue):
+    queue.enqueue("wrapup", "call-1", {"transcript": TRANSCRIPT}, max_attempts=2)
+    statuses = []
+    for _ in range(2):
+        job = queue.claim()
+        statuses.append(queue.fail(job["id"], "bad completion", retry_delay=0))
+    assert statuses == ["pending", "failed"]
+    assert queue.claim() is None
+    assert queue.pending_jobs == 0
+    assert queue.counts() == {"failed": 1}
+
+
+def test_running_job_resumes_after_restart(tmp_path):
+    path = str(tmp_path / "wrapup.db")
+    queue = JobQueue(path)
+    queue.enqueue("wrapup", "call-1", {"transcript": TRANSCRIPT})
+    job = queue.claim()
+    queue.checkpoint(job["id"], {"sentiment_arc": []})
+    queue.close()
+
+    reopened = JobQueue(path)
+    try:
+        assert reopened.pending_jobs == 1
+        resumed = reopened.claim()
+        assert resumed["checkpoint"] == {"sentiment_arc": []}
+        assert resumed["attempts"] == 2
+    finally:
+        reopened.close()
+
+
+class FlakyChatClient:
+    """Fails the first completion, then answers with a summary."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def complete(self, messages, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("429 Too Many Requests")
+        return json.dumps({"summary": "Refund re-raised.", "disposition": "follow_up_required", "follow_up": ""})
+
+
+def test_worker_retries_a_failed_step(queue):
+    class TextAnalytics:
+        def analyze_sentiment(self, documents):
+            return []
+
+    async def main():
+        completed = asyncio.Event()
+        results = []
+
+        async def on_complete(result):
+            results.append(result)
+            completed.set()
+
+        chat_client = FlakyChatClient()
+        worker = WrapUpWorker(queue, lambda: chat_client, lambda: TextAnalytics(), poll_interval=0.01,
+                              retry_base_delay=0, on_complete=on_complete)
+        queue.enqueue("wrapup", "call-1", {"transcript": TRANSCRIPT})
+        worker.start()
+        try:
+            await asyncio.wait_for(completed.wait(), timeout=5)
+        finally:
+            await worker.stop()
+        return chat_client.calls, results
+
+    calls, results = asyncio.run(main())
+    assert calls == 2
+    assert results[0]["disposition"] == "follow_up_required"
+    job = queue.get("wrapup", "call-1")
+    assert job["status"] == "done" and job["attempts"] == 2
+    assert queue.pending_jobs == 0
@@ -1,10 +1,8 @@
 import json
 import random
-import pandas as pd
+import functools
 from datetime import datetime, timedelta
 import uuid
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
 import os
 
 import logging
@@ -15,14 +13,36 @@ logging.basicConfig(
 )  
 logger = logging.getLogger(__name__)  
  
-search_client = SearchClient(
-    endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
-    index_name=os.environ["INDEX_NAME"],
-    credential=AzureKeyCredential(os.environ["AZURE_SEARCH_KEY"]) 
-)
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "myntra_dummy_data.xlsx")
+
+@functools.lru_cache(maxsize=1)
+def get_search_client():
+    # Built on first retrieval so importing tools doesn't require search settings
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+    return SearchClient(
+        endpoint=os.environ["AZURE_SEARCH_ENDPOINT"],
+        index_name=os.environ["INDEX_NAME"],
+        credential=AzureKeyCredential(os.environ["AZURE_SEARCH_KEY"]) 
+    )
+
+# "azure" queries Azure AI Search; "local" uses the on-disk index built by knowledge.py
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "azure")
+KNOWLEDGE_INDEX_DIR = os.getenv("KNOWLEDGE_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_index"))
+
+@functools.lru_cache(maxsize=1)
+def get_local_index():
+    from knowledge import KnowledgeIndex, azure_openai_embedder
+    return KnowledgeIndex.load(KNOWLEDGE_INDEX_DIR, embed=azure_openai_embedder())
+
+def read_sheet(sheet_name):
+    import pandas as pd
+    return pd.read_excel(DATA_FILE, sheet_name=sheet_name)
 
 async def fetch_relevant_documents_handler(query, **args):
-    search_results = search_client.search(
+    if RETRIEVAL_BACKEND == "local":
+        return "\n".join(hit["content"] for hit in get_local_index().search(query, top=5))
+    search_results = get_search_client().search(
         search_text=query,
         top=5,
         select="content"
@@ -35,7 +55,7 @@ async def raise_ticket_handler(customer_id, issue, out_queue):
   
 
 async def track_refund_handler(phone_number, out_queue):
-    refund_status_df = pd.read_excel('myntra_dummy_data.xlsx', sheet_name='Sheet1')
+    refund_status_df = read_sheet('Sheet1')
     refund_status_df["Phone number"] = refund_status_df["Phone number"].astype(str)
     refund_status_df = refund_status_df[refund_status_df['Phone number'] == phone_number]
     if refund_status_df.empty:
@@ -54,9 +74,9 @@ async def schedule_callback_handler(customer_id, callback_time, out_queue):
   
 async def check_order_status_handler(phone_number, out_queue = None):
     logger.info("Checking order status")
-    order_status_df = pd.read_excel('myntra_dummy_data.xlsx', sheet_name='Sheet2')  
+    order_status_df = read_sheet('Sheet2')  
     order_status_df["Phone number"] = order_status_df["Phone number"].astype(str)
-    logger.info(f"phone_number: {phone_number}")
+    logger.info("Looking up orders", extra={"phone_number": phone_number})
     order_status_df = order_status_df[order_status_df['Phone number'] == phone_number]
     if order_status_df.empty:
         return f"No orders found for phone number {phone_number}"
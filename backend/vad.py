@@ -0,0 +1,146 @@
+"""Energy/zero-crossing voice activity detection for the recognizer push streams.
+
+Every audio chunk is split into short analysis frames and classified in one
+vectorized pass (RMS level in dBFS plus zero-crossing rate). Frames judged to
+be silence are withheld from the Speech service, except for:
+
+- a hangover period after speech, so trailing phonemes and the recognizer's
+  segmentation silence still reach the service;
+- a pre-roll buffer of the most recent silent frames, flushed ahead of the
+  first speech frame so utterance onsets are not clipped.
+
+Modes:
+- "gate": drop silence entirely.
+- "compress": forward one in every ``compress_ratio`` silent frames so the
+  push stream keeps a trickle of audio during long silences.
+- "off": forward everything (stats are still collected).
+"""
+from collections import deque
+
+import numpy as np
+
+VAD_MODES = ("off", "gate", "compress")
+
+
+def pcm16_frames(pcm_data, frame_samples):
+    """View 16-bit little-endian PCM as (n_frames, frame_samples) without copying."""
+    samples = np.frombuffer(pcm_data, dtype="<i2", count=len(pcm_data) // 2)
+    n_frames = len(samples) // frame_samples
+    return samples[: n_frames * frame_samples].reshape(n_frames, frame_samples)
+
+
+def frame_levels_db(frames):
+    """RMS level of each frame in dBFS."""
+    power = np.mean(np.square(frames, dtype=np.float32), axis=1)
+    return 10.0 * np.log10(power / (32768.0 ** 2) + 1e-12)
+
+
+def frame_zero_crossings(frames):
+    """Fraction of adjacent sample pairs that change sign, per frame."""
+    signs = np.signbit(frames)
+    return np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(frames.shape[1] - 1, 1)
+
+
+class VoiceActivityDetector:
+    def __init__(self, sample_rate=16000, mode="compress", frame_ms=10, threshold_db=-45.0,
+                 noise_margin_db=10.0, zcr_max=0.35, hangover_ms=400, preroll_ms=300,
+                 compress_ratio=10):
+        if mode not in VAD_MODES:
+            raise ValueError(f"Unsupported VAD mode: {mode}")
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.frame_samples = max(int(sample_rate * frame_ms / 1000), 1)
+        self.frame_bytes = self.frame_samples * 2
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(int(hangover_ms / frame_ms), 0)
+        self.compress_ratio = max(int(compress_ratio), 1)
+        # The noise floor drops instantly to quieter frames and creeps up ~3 dB/s
+        self.noise_floor_db = -90.0
+        self.noise_rise_db = 3.0 * frame_ms / 1000
+        self._preroll = deque(maxlen=max(int(preroll_ms / frame_ms), 0))
+        self._remainder = b""
+        self._hangover_left = 0
+        self._silent_run = 0
+        self._aged_out = 0
+        self.total_bytes = 0
+        self.forwarded_bytes = 0
+        self.speech_frames = 0
+        self.total_frames = 0
+
+    def classify(self, frames):
+        """Return a boolean speech mask for an (n_frames, frame_samples) array."""
+        levels = frame_levels_db(frames)
+        zcr = frame_zero_crossings(frames)
+        threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+        # High zero-crossing rates are only trusted as speech (fricatives) when clearly loud
+        speech = (levels > threshold) & ((zcr < self.zcr_max) | (levels > threshold + 15.0))
+        if len(levels):
+            self.noise_floor_db = min(float(levels.min()),
+                                      self.noise_floor_db + self.noise_rise_db * len(levels))
+        return speech
+
+    def process(self, chunk):
+        """Consume a PCM chunk and return the bytes that should reach the recognizer."""
+        self.total_bytes += len(chunk)
+        data = self._remainder + chunk if self._remainder else chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return b""
+        frames = pcm16_frames(data[:usable], self.frame_samples)
+        speech = self.classify(frames)
+        self.total_frames += len(speech)
+        self.speech_frames += int(np.count_nonzero(speech))
+
+        if self.mode == "off":
+            self.forwarded_bytes += usable
+            return data[:usable]
+
+        out = []
+        frame_bytes = self.frame_bytes
+        for index, is_speech in enumerate(speech.tolist()):
+            frame = data[index * frame_bytes:(index + 1) * frame_bytes]
+            if is_speech:
+                if self._preroll:
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                out.append(frame)
+                self._hangover_left = self.hangover_frames
+                self._silent_run = 0
+                self._aged_out = 0
+            elif self._hangover_left > 0:
+                self._hangover_left -= 1
+                out.append(frame)
+            else:
+                self._silent_run += 1
+                if self._preroll.maxlen:
+                    # Silence always passes through the pre-roll, as in gate mode; compress mode
+                    # keeps 1 in compress_ratio of the frames that age out of it, so output stays
+                    # in order and a full pre-roll is flushed when speech resumes
+                    if len(self._preroll) == self._preroll.maxlen:
+                        oldest = self._preroll.popleft()
+                        self._aged_out += 1
+                        if self.mode == "compress" and self._aged_out % self.compress_ratio == 0:
+                            out.append(oldest)
+                    self._preroll.append(frame)
+                elif self.mode == "compress" and self._silent_run % self.compress_ratio == 0:
+                    out.append(frame)
+        forwarded = b"".join(out)
+        self.forwarded_bytes += len(forwarded)
+        return forwarded
+
+    def stats(self):
+        # Bytes still waiting in the pre-roll or remainder are not counted as suppressed yet
+        pending = len(self._remainder) + sum(len(frame) for frame in self._preroll)
+        suppressed = max(self.total_bytes - self.forwarded_bytes - pending, 0)
+        return {
+            "mode": self.mode,
+            "totalBytes": self.total_bytes,
+            "forwardedBytes": self.forwarded_bytes,
+            "suppressedBytes": suppressed,
+            "suppressedRatio": suppressed / self.total_bytes if self.total_bytes else 0.0,
+            "speechFrameRatio": self.speech_frames / self.total_frames if self.total_frames else 0.0,
+            "noiseFloorDb": round(self.noise_floor_db, 1),
+        }
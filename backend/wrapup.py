@@ -0,0 +1,295 @@
+"""Post-call wrap-up: a durable job queue and a background worker pool.
+
+When a call disconnects, ``JobQueue.enqueue()`` stores a snapshot of its
+transcript in a local SQLite database (WAL mode), so the job survives a
+restart. ``WrapUpWorker`` picks jobs up and produces, for each ended call:
+
+- a sentiment arc: customer sentiment per window of turns, from Azure Text
+  Analytics when configured, otherwise from the LLM;
+- a summary and a disposition (resolved, follow_up_required, escalated,
+  unresolved, other) from one LLM completion.
+
+Each step is checkpointed, so a retried or resumed job skips finished steps.
+Failed jobs are retried with exponential backoff up to ``max_attempts``.
+
+The wrap-up work never takes capacity from live calls:
+- LLM requests go through the scheduler at "background" priority, which
+  can't use the reserved share of budget and concurrency;
+- blocking work (SQLite, Text Analytics and the OpenAI SDK calls) runs on
+  the worker's own small thread pool, never on the event loop and not on
+  its default executor;
+- workers don't start a step while ``busy()`` reports pressure on the live
+  path (event loop lag, live completions waiting).
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import WRAPUP_JOBS, WRAPUP_DURATION, WRAPUP_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+DISPOSITIONS = ("resolved", "follow_up_required", "escalated", "unresolved", "other")
+
+SUMMARY_INSTRUCTION = (
+    "The call above has ended. Reply with a JSON object only, with keys: "
+    '"summary" (3-5 sentences for the agent\'s wrap-up notes), '
+    '"disposition" (one of: ' + ", ".join(DISPOSITIONS) + "), "
+    '"follow_up" (next actions, or an empty string).'
+)
+SENTIMENT_INSTRUCTION = (
+    "For each numbered window of customer turns above, rate the customer's sentiment. "
+    'Reply with a JSON object only: {"arc": [{"window": <number>, "sentiment": '
+    '"positive" | "neutral" | "negative", "score": <-1.0 to 1.0>}]}.'
+)
+
+
+class JobQueue:
+    """SQLite-backed queue of wrap-up jobs, one per (kind, call_id)."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                call_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                next_run_at REAL NOT NULL,
+                checkpoint TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (kind, call_id)
+            )""")
+        # Jobs left running by a previous process resume from their checkpoint
+        self._db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        # Kept in memory so the queue-depth gauge never touches the database
+        self.pending_jobs = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+    def enqueue(self, kind, call_id, payload, max_attempts=5):
+        """Add a job; returns False if one already exists for this call (duplicate events)."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (kind, call_id, payload, max_attempts, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, call_id, json.dumps(payload), max_attempts, now, now, now))
+            self.pending_jobs += cursor.rowcount
+        return cursor.rowcount == 1
+
+    def claim(self):
+        """Mark the oldest due job as running and return it, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'pending' AND next_run_at <= ? ORDER BY id LIMIT 1) "
+                "RETURNING *", (now, now)).fetchone()
+            if row:
+                self.pending_jobs -= 1
+        return self._to_job(row) if row else None
+
+    def checkpoint(self, job_id, checkpoint):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET checkpoint = ?, updated_at = ? WHERE id = ?",
+                             (json.dumps(checkpoint), time.time(), job_id))
+
+    def complete(self, job_id, result):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                             (json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error, retry_delay):
+        """Schedule a retry, or mark the job failed once it is out of attempts. Returns the new status."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+                "error = ?, next_run_at = ?, updated_at = ? WHERE id = ? RETURNING status",
+                (error, now + retry_delay, now, job_id)).fetchone()
+            if row and row["status"] == "pending":
+                self.pending_jobs += 1
+        return row["status"] if row else None
+
+    def get(self, kind, call_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE kind = ? AND call_id = ?", (kind, call_id)).fetchone()
+        return self._to_job(row) if row else None
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _to_job(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["checkpoint"] = json.loads(job["checkpoint"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+def _parse_json(text):
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object in completion")
+    return json.loads(text[start:end + 1])
+
+
+def _windows(transcript, speaker="customer", size=4):
+    turns = [entry["text"] for entry in transcript if entry.get("speaker") == speaker and entry.get("text")]
+    return [" ".join(turns[start:start + size]) for start in range(0, len(turns), size)]
+
+
+class WrapUpWorker:
+    def __init__(self, queue, get_chat_client, get_text_analytics_client=None, system_prompt=None,
+                 concurrency=1, busy=None, poll_interval=1.0, retry_base_delay=5.0, on_complete=None):
+        self.queue = queue
+        self.get_chat_client = get_chat_client
+        self.get_text_analytics_client = get_text_analytics_client or (lambda: None)
+        self.system_prompt = system_prompt or (lambda: "")
+        self.concurrency = concurrency
+        self.busy = busy or (lambda: False)
+        self.poll_interval = poll_interval
+        self.retry_base_delay = retry_base_delay
+        self.on_complete = on_complete
+        # Separate from the default executor that the live path uses for to_thread
+        self._executor = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="wrapup")
+        self._tasks = []
+        self._wakeup = None
+        WRAPUP_QUEUE_DEPTH.set_function(lambda: self.queue.pending_jobs)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def _yield_to_live_calls(self):
+        while self.busy():
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._yield_to_live_calls()
+                job = await self._blocking(self.queue.claim)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval * 5)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Wrap-up worker error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, job):
+        started = time.perf_counter()
+        call_id = job["call_id"]
+        checkpoint = job["checkpoint"]
+        try:
+            transcript = job["payload"]["transcript"]
+            if "sentiment_arc" not in checkpoint:
+                await self._yield_to_live_calls()
+                checkpoint["sentiment_arc"] = await self._sentiment_arc(call_id, transcript)
+                await self._blocking(self.queue.checkpoint, job["id"], checkpoint)
+            if "summary" not in checkpoint:
+                await self._yield_to_live_calls()
+                checkpoint["summary"] = await self._summarize(call_id, transcript)
+                await self._blocking(self.queue.checkpoint, job["id"], checkpoint)
+            result = dict(checkpoint["summary"], sentimentArc=checkpoint["sentiment_arc"], callId=call_id)
+            await self._blocking(self.queue.complete, job["id"], result)
+        except Exception as e:
+            delay = self.retry_base_delay * 2 ** (job["attempts"] - 1)
+            status = await self._blocking(self.queue.fail, job["id"], str(e), delay)
+            WRAPUP_JOBS.labels("failed" if status == "failed" else "retried").inc()
+            logger.warning(f"Wrap-up for call {call_id} failed (attempt {job['attempts']}, now {status}): {str(e)}")
+            return
+        WRAPUP_JOBS.labels("completed").inc()
+        WRAPUP_DURATION.observe(time.perf_counter() - started)
+        logger.info("Wrap-up completed", extra={"call_id": call_id, "duration_ms": round((time.perf_counter() - started) * 1000)})
+        if self.on_complete:
+            await self.on_complete(result)
+
+    async def _complete_json(self, call_id, transcript, instruction):
+        chat_client = self.get_chat_client()
+        if chat_client is None:
+            raise RuntimeError("Chat client is not ready")
+        messages = [{"role": "system", "content": self.system_prompt()}]
+        messages += [{"role": "user", "name": entry["speaker"], "content": entry["text"]} for entry in transcript]
+        messages.append({"role": "user", "content": instruction})
+        # The SDK calls block, so they run on this worker's pool rather than the event loop
+        text = await chat_client.complete(messages, temperature=0, call_id=call_id, priority="background",
+                                          executor=self._executor)
+        return _parse_json(text)
+
+    async def _sentiment_arc(self, call_id, transcript):
+        windows = _windows(transcript)
+        if not windows:
+            return []
+        client = self.get_text_analytics_client()
+        if client is not None:
+            return await self._blocking(self._text_analytics_arc, client, windows)
+        numbered = [{"speaker": "customer", "text": f"Window {index + 1}: {text}"} for index, text in enumerate(windows)]
+        arc = await self._complete_json(call_id, numbered, SENTIMENT_INSTRUCTION)
+        return arc.get("arc", [])
+
+    @staticmethod
+    def _text_analytics_arc(client, windows):
+        arc = []
+        # The service accepts at most 10 documents per request
+        for start in range(0, len(windows), 10):
+            documents = [{"id": str(start + index + 1), "language": "en", "text": text}
+                         for index, text in enumerate(windows[start:start + 10])]
+            for document in client.analyze_sentiment(documents=documents):
+                if document.is_error:
+                    continue
+                scores = document.confidence_scores
+                arc.append({"window": int(document.id), "sentiment": document.sentiment,
+                            "score": round(scores.positive - scores.negative, 3)})
+        return arc
+
+    async def _summarize(self, call_id, transcript):
+        summary = await self._complete_json(call_id, transcript, SUMMARY_INSTRUCTION)
+        disposition = str(summary.get("disposition", "other")).lower()
+        return {
+            "summary": str(summary.get("summary", "")),
+            "disposition": disposition if disposition in DISPOSITIONS else "other",
+            "followUp": str(summary.get("follow_up", "")),
+        }
@@ -19,7 +19,9 @@ function App() {
   const [connected, setConnected] = useState(false);
   const [recommendation, setRecommendation] = useState('');
   const [sentiment, setSentiment] = useState({ score: 0, magnitude: 0 });
+  const [analytics, setAnalytics] = useState(null);
   const wsRef = useRef(null);
+  const lastSentimentTextRef = useRef('');
   const fetchRecommendation = useCallback(() => {
     if (!currentCall?.id) return;
 
@@ -55,12 +57,14 @@ function App() {
     if (callStatus === 'connected' && transcriptions.length > 0) {
       // Get the last 5 customer transcriptions (or fewer if there aren't 5)
       const recentTranscriptions = transcriptions
-        .filter(t => t.speaker === 'customer')
+        .filter(t => t.speaker === 'customer' && !t.interim)
         .slice(-5)
         .map(t => t.text)
         .join(' ');
       
-      if (recentTranscriptions) {
+      // Interim updates change the list without changing the final text
+      if (recentTranscriptions && recentTranscriptions !== lastSentimentTextRef.current) {
+        lastSentimentTextRef.current = recentTranscriptions;
         sentimentWorker.postMessage({
           apiUrl: `${API_BASE_URL}/api/sentiment`,
           transcriptionText: recentTranscriptions
@@ -99,9 +103,15 @@ function App() {
         case 'transcription':
           handleTranscription(message);
           break;
+        case 'interimTranscription':
+          handleInterimTranscription(message);
+          break;
         case 'transcriptions':
           setTranscriptions(message.data);
           break;
+        case 'callAnalytics':
+          setAnalytics(message);
+          break;
         case 'error':
           toast.error(message.message);
           break;
@@ -171,11 +181,43 @@ function App() {
   };
 
   const handleTranscription = (message) => {
-    setTranscriptions(prev => [...prev, {
+    const entry = {
       timestamp: message.timestamp,
       text: message.text,
-      speaker: message.speaker
-    }]);
+      speaker: message.speaker,
+      segmentId: message.segmentId
+    };
+    setTranscriptions(prev => {
+      // The final text supersedes the interim line for the same segment
+      const index = message.segmentId ? prev.findIndex(t => t.segmentId === message.segmentId) : -1;
+      if (index === -1) {
+        return [...prev, entry];
+      }
+      const next = [...prev];
+      next[index] = entry;
+      return next;
+    });
+  };
+
+  const handleInterimTranscription = (message) => {
+    setTranscriptions(prev => {
+      const index = prev.findIndex(t => t.segmentId === message.segmentId);
+      if (index === -1) {
+        return [...prev, {
+          text: message.text,
+          speaker: message.speaker,
+          segmentId: message.segmentId,
+          interim: true
+        }];
+      }
+      // Ignore a partial that arrives after its segment was finalized
+      if (!prev[index].interim) {
+        return prev;
+      }
+      const next = [...prev];
+      next[index] = { ...prev[index], text: message.text };
+      return next;
+    });
   };
 
   const initiateCall = async (phoneNumber, botId) => {
@@ -265,6 +307,7 @@ function App() {
             currentCall={currentCall}
             recommendation={recommendation}
             sentiment={sentiment}
+            analytics={analytics}
           />
 
         </div>
@@ -12,6 +12,8 @@ function AgentAudioPanel({ callId, wsBaseUrl }) {
   const audioContextRef = useRef(null);
   const mediaStreamSourcesRef = useRef(new Map());
   const gainNodeRef = useRef(null);
+  // Upstream encoding agreed with the server via AudioMetadataAck
+  const encodingRef = useRef('pcm16');
   
   // Move getRawMicrophoneStream BEFORE startStreaming
   const getRawMicrophoneStream = useCallback(async () => {
@@ -120,8 +122,14 @@ function AgentAudioPanel({ callId, wsBaseUrl }) {
             // Convert to format suitable for WebSocket (e.g., 16-bit PCM)
             const pcmData = convertFloatToInt16(inputData);
             
-            // Send audio data
-            wsRef.current.send(pcmData.buffer);
+            // Compress with the negotiated codec before sending
+            if (encodingRef.current === 'mulaw') {
+              wsRef.current.send(encodeMuLaw(pcmData).buffer);
+            } else if (encodingRef.current === 'alaw') {
+              wsRef.current.send(encodeALaw(pcmData).buffer);
+            } else {
+              wsRef.current.send(pcmData.buffer);
+            }
           }
         };
       }
@@ -142,6 +150,14 @@ function AgentAudioPanel({ callId, wsBaseUrl }) {
     // Establish WebSocket connection for audio
     console.log('Connecting to audio WebSocket:', `${wsBaseUrl}/ws/audio/${callId}`);
     const audioWs = new WebSocket(`${wsBaseUrl}/ws/audio/${callId}`);
+    let streamingStarted = false;
+    let negotiationTimer = null;
+    const startStreamingOnce = () => {
+      if (streamingStarted) return;
+      streamingStarted = true;
+      clearTimeout(negotiationTimer);
+      startStreaming();
+    };
     
     audioWs.onopen = () => {
       console.log('Audio WebSocket connection established');
@@ -153,20 +169,26 @@ function AgentAudioPanel({ callId, wsBaseUrl }) {
         audioMetadata: {
           sampleRate: sampleRate,
           channels: 1,
-          bitsPerSample: 16
+          bitsPerSample: 16,
+          encodings: ['mulaw', 'alaw', 'pcm16']
         }
       };
+      encodingRef.current = 'pcm16';
       audioWs.send(JSON.stringify(metadata));
       
-      // Start streaming audio once connection is established
-      startStreaming();
+      // Start streaming once the server picks an encoding; servers that
+      // never acknowledge get raw PCM
+      negotiationTimer = setTimeout(startStreamingOnce, 1000);
     };
     
     audioWs.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
         
-        if (data.type === "audioStream") {
+        if (data.kind === "AudioMetadataAck") {
+          encodingRef.current = data.encoding;
+          startStreamingOnce();
+        } else if (data.type === "audioStream") {
           console.log('Received audio stream data');
           playAudioStream(data.data, data.sampleRate);
         }
@@ -190,6 +212,7 @@ function AgentAudioPanel({ callId, wsBaseUrl }) {
     
     // Clean up on unmount
     return () => {
+      clearTimeout(negotiationTimer);
       stopStreaming();
       if (audioWs) {
         audioWs.close();
@@ -230,6 +253,48 @@ function AgentAudioPanel({ callId, wsBaseUrl }) {
     return int16Array;
   }
   
+  // G.711 mu-law: one byte per sample
+  function encodeMuLaw(int16Array) {
+    const out = new Uint8Array(int16Array.length);
+    for (let i = 0; i < int16Array.length; i++) {
+      let sample = int16Array[i];
+      const sign = (sample >> 8) & 0x80;
+      if (sign) sample = -sample;
+      if (sample > 32635) sample = 32635;
+      sample += 0x84;
+      let exponent = 7;
+      for (let mask = 0x4000; (sample & mask) === 0 && exponent > 0; mask >>= 1) {
+        exponent--;
+      }
+      const mantissa = (sample >> (exponent + 3)) & 0x0F;
+      out[i] = ~(sign | (exponent << 4) | mantissa) & 0xFF;
+    }
+    return out;
+  }
+  
+  // G.711 A-law: one byte per sample
+  function encodeALaw(int16Array) {
+    const out = new Uint8Array(int16Array.length);
+    for (let i = 0; i < int16Array.length; i++) {
+      let sample = int16Array[i];
+      const sign = sample >= 0 ? 0x80 : 0;
+      if (!sign) sample = -sample;
+      if (sample > 32635) sample = 32635;
+      let compressed;
+      if (sample >= 256) {
+        let exponent = 7;
+        for (let mask = 0x4000; (sample & mask) === 0 && exponent > 1; mask >>= 1) {
+          exponent--;
+        }
+        compressed = (exponent << 4) | ((sample >> (exponent + 3)) & 0x0F);
+      } else {
+        compressed = sample >> 4;
+      }
+      out[i] = compressed ^ (sign ^ 0x55);
+    }
+    return out;
+  }
+  
   // Helper function to create proper WAV headers
   function createWavHeader(pcmData, sampleRate, numChannels, bitsPerSample) {
     const dataLength = pcmData.length;
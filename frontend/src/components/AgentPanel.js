@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import './AgentPanel.css';
 
-const AgentPanel = ({ callStatus, currentCall, recommendation, sentiment }) => {
+const AgentPanel = ({ callStatus, currentCall, recommendation, sentiment, analytics }) => {
   const [notes, setNotes] = useState('');
   const [savedNotes, setSavedNotes] = useState({});
   
@@ -116,10 +116,24 @@ const AgentPanel = ({ callStatus, currentCall, recommendation, sentiment }) => {
           </div>
         </div>
       )}
-      
-
-      
 
+      {callStatus === 'connected' && analytics?.callId === currentCall?.id && (
+        <div className="conversation-analytics">
+          <h3>Conversation</h3>
+          <div className="analytics-grid">
+            <div>Agent talk ratio</div>
+            <div>{analytics.total.talkRatio === null ? '-' : `${Math.round(analytics.total.talkRatio * 100)}%`}</div>
+            <div>Overtalk</div>
+            <div>{analytics.total.overtalkSec}s</div>
+            <div>Interruptions (agent / customer)</div>
+            <div>{analytics.total.interruptions.agent} / {analytics.total.interruptions.customer}</div>
+            <div>Dead air (longest)</div>
+            <div>{analytics.total.deadAirSec}s ({analytics.total.longestDeadAirSec}s)</div>
+            <div>Words per minute (agent / customer)</div>
+            <div>{analytics.speakingRate.agentWpm ?? '-'} / {analytics.speakingRate.customerWpm ?? '-'}</div>
+          </div>
+        </div>
+      )}
 
       <div className="suggested-responses">
         <h3>AI Recommendation</h3>
@@ -35,7 +35,7 @@ const TranscriptionPanel = ({ transcriptions, clearTranscriptions }) => {
           transcriptions.map((item, index) => (
             <div 
               key={index} 
-              className={`transcription-item ${item.speaker === 'agent' ? 'agent-speech' : 'customer-speech'}`}
+              className={`transcription-item ${item.speaker === 'agent' ? 'agent-speech' : 'customer-speech'}${item.interim ? ' interim' : ''}`}
             >
               <span className="speaker-label">{item.speaker === 'agent' ? 'Agent' : 'Customer'}:</span>
               <span className="transcription-text">{item.text}</span>